@@ -0,0 +1,198 @@
+# Description: Features of many Xiangqi positions at once, worked out with NumPy over the whole batch instead of one
+# XiangqiGame at a time. Positions become one-hot piece planes, evaluations, move counts and check flags. Unlike the
+# rest of the game this module needs NumPy.
+
+from collections import namedtuple
+
+import numpy as np
+
+from game import Board, EMPTY, GENERAL, ADVISOR, ELEPHANT, KNIGHT, ROOK, CANON, SOLDIER, BLACK, RAYS, SQUARE_NAMES, \
+    SQUARE_VALUES, FEN_PIECES, General, Advisor, Elephant, Knight, Soldier, parse_fen
+
+# Plane p of an encoded position marks the points holding the piece code PLANE_CODES[p]: the seven red piece types
+# from general to soldier, then the seven black ones
+PLANE_CODES = [GENERAL, ADVISOR, ELEPHANT, KNIGHT, ROOK, CANON, SOLDIER]
+PLANE_CODES += [code | BLACK for code in PLANE_CODES]
+
+# Extra columns added after the 90 points of a batch: one that is always empty, for moves nothing can block, and one
+# marking the end of the board, for rays
+_ALWAYS_EMPTY = 90
+_OFF_BOARD = 91
+OFF_BOARD = 255
+
+# The piece code of every FEN letter
+_LETTER_CODES = {letter: piece_class('red', 'a1').get_code() for letter, piece_class in FEN_PIECES.items()}
+
+# The squares along each of the four rays from every square (see game.RAYS), padded to nine with _OFF_BOARD
+RAY_INDEX = np.full((90, 4, 9), _OFF_BOARD, dtype=np.intp)
+for _square in range(90):
+    for _direction, _ray in enumerate(RAYS[_square]):
+        RAY_INDEX[_square, _direction, :len(_ray)] = _ray
+
+SQUARE_VALUE_TABLE = np.array(SQUARE_VALUES, dtype=np.int32)
+
+BatchFeatures = namedtuple('BatchFeatures', ['evaluation', 'red_mobility', 'black_mobility', 'red_in_check',
+                                             'black_in_check'])
+
+
+def _neighbours(square):
+    """Returns the points next to the square, diagonals included"""
+    row, column = divmod(square, 9)
+    return [(row + row_step) * 9 + column + column_step for row_step in (-1, 0, 1) for column_step in (-1, 0, 1)
+            if (row_step or column_step) and 0 <= row + row_step < 10 and 0 <= column + column_step < 9]
+
+
+def _step_moves():
+    """Lists the moves of the pieces that step rather than slide (general, advisor, elephant, knight and soldier),
+    asking each piece class's can_move which moves it allows on an otherwise empty board. Every move comes with the
+    point that blocks it, found by trying a piece on each point next to the start (the elephant's eye, the knight's
+    leg), or _ALWAYS_EMPTY if nothing can. Returns arrays of the piece codes, starts, ends and blocking points."""
+    codes, starts, ends, blocks = [], [], [], []
+    board = Board()
+    blocker = Soldier('red', 'a1')
+    for piece_class in (General, Advisor, Elephant, Knight, Soldier):
+        for color in ('red', 'black'):
+            for start in range(90):
+                piece = piece_class(color, SQUARE_NAMES[start])
+
+                # A soldier standing across the river has crossed it
+                if piece.get_piece_type() == 'soldier':
+                    piece.set_crossed_river(start >= 45 if color == 'red' else start < 45)
+                board.place(piece, start)
+                for end in range(90):
+                    if end == start or not piece.can_move(start, end, board):
+                        continue
+                    block = _ALWAYS_EMPTY
+                    for neighbour in _neighbours(start):
+                        if neighbour == end:
+                            continue
+                        board.place(blocker, neighbour)
+                        if not piece.can_move(start, end, board):
+                            block = neighbour
+                        board.clear(neighbour)
+                    codes.append(piece.get_code())
+                    starts.append(start)
+                    ends.append(end)
+                    blocks.append(block)
+                board.clear(start)
+    return (np.array(codes, dtype=np.uint8), np.array(starts, dtype=np.intp), np.array(ends, dtype=np.intp),
+            np.array(blocks, dtype=np.intp))
+
+
+STEP_CODES, STEP_STARTS, STEP_ENDS, STEP_BLOCKS = _step_moves()
+_STEP_BLACK = (STEP_CODES & BLACK) != 0
+
+# A general may not step onto the file of the other general with nothing between them. For every general move, the
+# points from its end towards the other general, with the point it leaves counted as empty
+GENERAL_MOVES = np.flatnonzero((STEP_CODES & 7) == GENERAL)
+GENERAL_SIGHT = RAY_INDEX[STEP_ENDS[GENERAL_MOVES], _STEP_BLACK[GENERAL_MOVES].astype(np.intp)]
+GENERAL_SIGHT = np.where(GENERAL_SIGHT == STEP_STARTS[GENERAL_MOVES, None], _ALWAYS_EMPTY, GENERAL_SIGHT)
+
+
+def position_bytes(game):
+    """Returns the compact encoding of a game's position: the 90 piece codes of its board cells followed by a byte
+    that is 0 when red is to move and 1 when black is"""
+    return bytes(game.get_board().cells) + bytes([game.get_turn() == 'black'])
+
+
+def decode_positions(positions):
+    """Turns a list of positions, each a FEN string or the compact encoding of position_bytes, into an (N, 90) array
+    of piece codes and an (N,) array of the side to move (0 for red, 1 for black)"""
+    cells = np.zeros((len(positions), 90), dtype=np.uint8)
+    side = np.zeros(len(positions), dtype=np.uint8)
+    for index, position in enumerate(positions):
+        if isinstance(position, str):
+            placement, turn, halfmove, fullmove = parse_fen(position)
+            for square, letter in placement:
+                if letter.isupper():
+                    cells[index, square] = _LETTER_CODES[letter.lower()]
+                else:
+                    cells[index, square] = _LETTER_CODES[letter] | BLACK
+            side[index] = turn == 'black'
+        else:
+            if len(position) != 91:
+                raise ValueError('a compact position is 91 bytes, not ' + str(len(position)))
+            cells[index] = np.frombuffer(position, dtype=np.uint8, count=90)
+            side[index] = position[90]
+    return cells, side
+
+
+def encode_planes(cells):
+    """Turns an (N, 90) array of piece codes into an (N, 14, 10, 9) array of one-hot planes, one for each piece code
+    in PLANE_CODES, indexed by row (0 is red's side) and column"""
+    codes = np.array(PLANE_CODES, dtype=np.uint8)
+    planes = cells[:, None, :] == codes[None, :, None]
+    return planes.reshape(len(cells), 14, 10, 9).astype(np.uint8)
+
+
+def encode_positions(positions):
+    """Turns a list of positions (see decode_positions) into their (N, 14, 10, 9) one-hot planes and the (N,) side to
+    move"""
+    cells, side = decode_positions(positions)
+    return encode_planes(cells), side
+
+
+def evaluate_batch(cells, side):
+    """Returns the material and piece-square evaluation of every position from the point of view of the side to
+    move, the same as XiangqiGame.evaluate()"""
+    score = SQUARE_VALUE_TABLE[cells, np.arange(90)].sum(axis=1)
+    return np.where(side == 0, score, -score)
+
+
+def _chunk_features(cells):
+    """Counts the moves of each color and finds which generals are in check, for a chunk of positions"""
+    count = len(cells)
+    extended = np.concatenate([cells, np.full((count, 1), EMPTY, dtype=np.uint8),
+                               np.full((count, 1), OFF_BOARD, dtype=np.uint8)], axis=1)
+    kinds = cells & 7
+    black = (cells & BLACK) != 0
+    red_pieces = (cells != EMPTY) & ~black
+    black_pieces = (cells != EMPTY) & black
+
+    # Rooks and canons: walk every ray from every point. Points before the first piece are free moves, a rook may
+    # capture the first piece and a canon the second, if they belong to the other side
+    ray = extended[:, RAY_INDEX]
+    occupied = ray != EMPTY
+    seen = np.cumsum(occupied, axis=3, dtype=np.uint8)
+    enemy = occupied & (ray != OFF_BOARD) & (((ray & BLACK) != 0) != black[:, :, None, None])
+    first = occupied & (seen == 1) & enemy
+    second = occupied & (seen == 2) & enemy
+    free = (seen == 0).sum(axis=(2, 3))
+    general = (ray & 7) == GENERAL
+    rooks = kinds == ROOK
+    canons = kinds == CANON
+    slider_moves = np.where(rooks, free + first.sum(axis=(2, 3)), 0) + \
+        np.where(canons, free + second.sum(axis=(2, 3)), 0)
+    slider_checks = (rooks & (first & general).any(axis=(2, 3))) | (canons & (second & general).any(axis=(2, 3)))
+
+    # Pieces that step: a move is possible if the piece is on its start, the blocking point is empty and the end
+    # is empty or holds an enemy
+    targets = cells[:, STEP_ENDS]
+    possible = (cells[:, STEP_STARTS] == STEP_CODES) & (extended[:, STEP_BLOCKS] == EMPTY) & \
+        ((targets == EMPTY) | (((targets & BLACK) != 0) != _STEP_BLACK))
+    sight = extended[:, GENERAL_SIGHT]
+    sight_occupied = sight != EMPTY
+    facing = sight_occupied & (np.cumsum(sight_occupied, axis=2) == 1) & ((sight & 7) == GENERAL) & \
+        (sight != OFF_BOARD)
+    possible[:, GENERAL_MOVES] &= ~facing.any(axis=2)
+    step_checks = possible & (targets != EMPTY) & ((targets & 7) == GENERAL)
+
+    red_mobility = (slider_moves * red_pieces).sum(axis=1) + (possible & ~_STEP_BLACK).sum(axis=1)
+    black_mobility = (slider_moves * black_pieces).sum(axis=1) + (possible & _STEP_BLACK).sum(axis=1)
+    red_in_check = (slider_checks & black_pieces).any(axis=1) | (step_checks & _STEP_BLACK).any(axis=1)
+    black_in_check = (slider_checks & red_pieces).any(axis=1) | (step_checks & ~_STEP_BLACK).any(axis=1)
+    return red_mobility, black_mobility, red_in_check, black_in_check
+
+
+def batch_features(cells, side, chunk_size=1024):
+    """Works out the features of every position in an (N, 90) array of piece codes with the (N,) side to move, and
+    returns them as BatchFeatures of (N,) arrays: the evaluation for the side to move, the number of moves each
+    color could make by the pieces' movement rules (without checking that the move leaves its general safe), and
+    whether each color's general is in check. Positions are handled chunk_size at a time to bound memory."""
+    parts = [_chunk_features(cells[start:start + chunk_size]) for start in range(0, len(cells), chunk_size)]
+    if parts:
+        red_mobility, black_mobility, red_in_check, black_in_check = [np.concatenate(part) for part in zip(*parts)]
+    else:
+        red_mobility = black_mobility = np.zeros(0, dtype=np.int64)
+        red_in_check = black_in_check = np.zeros(0, dtype=bool)
+    return BatchFeatures(evaluate_batch(cells, side), red_mobility, black_mobility, red_in_check, black_in_check)
@@ -0,0 +1,374 @@
+# Description: A bitboard engine for XiangqiGame. Each piece type and color is kept as a 90-bit Python integer where
+# bit n stands for square n (the same numbering as game.SQUARES), and moves come from tables built once at import.
+# It is a second, independent move generator for cross-checking the piece classes (perft and the tests run both).
+# The game keeps its own board and pieces up to date as well, so it is slower than the default engine, not faster.
+
+from game import EMPTY, GENERAL, ADVISOR, ELEPHANT, KNIGHT, ROOK, CANON, SOLDIER, BLACK, PALACE, ADVISOR_POINTS, \
+    ELEPHANT_POINTS, OWN_HALF
+
+RANK_MASK = (1 << 9) - 1
+FILE_MASK = (1 << 10) - 1
+
+
+def _line_tables(length):
+    """Builds the slider tables for a line of the given length (9 for a row, 10 for a column). For every position
+    on the line and every occupancy of the line, returns the rook moves (the squares up to and including the first
+    piece each way) and the canon reach (the squares behind that first piece, the screen, up to and including the
+    next piece), both as bitmasks of positions on the line."""
+    rook = []
+    canon = []
+    for position in range(length):
+        rook_row = []
+        canon_row = []
+        for occupancy in range(1 << length):
+            rook_moves = 0
+            canon_reach = 0
+            for step in (1, -1):
+                index = position + step
+                screen = False
+                while 0 <= index < length:
+                    if screen:
+                        canon_reach |= 1 << index
+                        if occupancy >> index & 1:
+                            break
+                    else:
+                        rook_moves |= 1 << index
+                        if occupancy >> index & 1:
+                            screen = True
+                    index += step
+            rook_row.append(rook_moves)
+            canon_row.append(canon_reach)
+        rook.append(rook_row)
+        canon.append(canon_row)
+    return rook, canon
+
+
+RANK_ROOK, RANK_CANON = _line_tables(9)
+FILE_ROOK, FILE_CANON = _line_tables(10)
+
+# Spreads a 10-bit mask of rows into a bitmask of the squares in column a. Shift left by the column for the others
+FILE_SPREAD = []
+for _rows in range(1 << 10):
+    _squares = 0
+    for _row in range(10):
+        if _rows >> _row & 1:
+            _squares |= 1 << _row * 9
+    FILE_SPREAD.append(_squares)
+
+
+def _on_board(col, row):
+    """Returns True if the column and row indices are on the board"""
+    return 0 <= col < 9 and 0 <= row < 10
+
+
+def _bit(col, row):
+    """Returns the bit of the square at the column and row indices"""
+    return 1 << row * 9 + col
+
+
+# Step tables, indexed by square (and by side for the pieces that depend on it)
+KNIGHT_LEGS = []         # (leg bit, bitmask of the two jumps through that leg) for each leg
+KNIGHT_CHECKS = []       # (origin bit, leg bit) for each square a knight could attack this square from
+ELEPHANT_STEPS = [[], []]  # (eye bit, target bit) for each diagonal on the elephant's own side of the river
+ADVISOR_STEPS = [[], []]   # bitmask of the diagonal neighbours inside the palace
+GENERAL_STEPS = [[], []]   # bitmask of the orthogonal neighbours inside the palace
+SOLDIER_STEPS = [[], []]   # bitmask of forward, plus sideways once across the river
+SOLDIER_CHECKS = [[], []]  # bitmask of the squares a soldier of that side could attack this square from
+for _square in range(90):
+    _row, _col = divmod(_square, 9)
+    _legs = []
+    for _leg_col, _leg_row in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+        if not _on_board(_col + _leg_col, _row + _leg_row):
+            continue
+        if _leg_col == 0:
+            _jumps = ((1, 2 * _leg_row), (-1, 2 * _leg_row))
+        else:
+            _jumps = ((2 * _leg_col, 1), (2 * _leg_col, -1))
+        _targets = 0
+        for _col_step, _row_step in _jumps:
+            if _on_board(_col + _col_step, _row + _row_step):
+                _targets |= _bit(_col + _col_step, _row + _row_step)
+        _legs.append((_bit(_col + _leg_col, _row + _leg_row), _targets))
+    KNIGHT_LEGS.append(_legs)
+
+    # A knight attacks this square from two steps along one axis and one along the other, and its leg is the
+    # square next to the knight on the long axis
+    _checks = []
+    for _col_step, _row_step in ((1, 2), (-1, 2), (1, -2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)):
+        _origin_col = _col + _col_step
+        _origin_row = _row + _row_step
+        if not _on_board(_origin_col, _origin_row):
+            continue
+        if abs(_row_step) == 2:
+            _leg = _bit(_origin_col, _origin_row - _row_step // 2)
+        else:
+            _leg = _bit(_origin_col - _col_step // 2, _origin_row)
+        _checks.append((_bit(_origin_col, _origin_row), _leg))
+    KNIGHT_CHECKS.append(_checks)
+
+    for _side in (0, 1):
+        _steps = []
+        for _col_step, _row_step in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+            _target_col = _col + 2 * _col_step
+            _target_row = _row + 2 * _row_step
+            if _on_board(_target_col, _target_row) and _bit(_target_col, _target_row) & OWN_HALF[_side]:
+                _steps.append((_bit(_col + _col_step, _row + _row_step), _bit(_target_col, _target_row)))
+        ELEPHANT_STEPS[_side].append(_steps)
+
+        _diagonals = 0
+        _orthogonals = 0
+        for _col_step, _row_step in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+            if _on_board(_col + _col_step, _row + _row_step):
+                _diagonals |= _bit(_col + _col_step, _row + _row_step)
+        for _col_step, _row_step in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            if _on_board(_col + _col_step, _row + _row_step):
+                _orthogonals |= _bit(_col + _col_step, _row + _row_step)
+        ADVISOR_STEPS[_side].append(_diagonals & PALACE[_side])
+        GENERAL_STEPS[_side].append(_orthogonals & PALACE[_side])
+
+        _forward = 1 if _side == 0 else -1
+        _steps = 0
+        if _on_board(_col, _row + _forward):
+            _steps |= _bit(_col, _row + _forward)
+        if not 1 << _square & OWN_HALF[_side]:
+            for _col_step in (1, -1):
+                if _on_board(_col + _col_step, _row):
+                    _steps |= _bit(_col + _col_step, _row)
+        SOLDIER_STEPS[_side].append(_steps)
+
+for _side in (0, 1):
+    SOLDIER_CHECKS[_side] = [0] * 90
+    for _square in range(90):
+        _targets = SOLDIER_STEPS[_side][_square]
+        while _targets:
+            _low = _targets & -_targets
+            SOLDIER_CHECKS[_side][_low.bit_length() - 1] |= 1 << _square
+            _targets ^= _low
+
+
+def squares(mask):
+    """Yields the square of every bit set in the mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitboardEngine:
+    """Keeps the position as one bitboard per piece code plus occupancy bitboards, and answers the move generation
+    and check questions XiangqiGame asks, with the same results as the piece classes' move methods, so that either
+    can be checked against the other. It is kept up to date alongside the game's board, not instead of it. A second,
+    column-major occupancy bitboard (bit col * 10 + row) makes a column's occupancy a single shift and mask."""
+
+    def __init__(self, cells):
+        """Initializes the engine from a board's cells (a sequence of 90 piece codes)"""
+        self.cells = bytearray(cells)
+        self.pieces = [0] * 16
+        self.colors = [0, 0]
+        self.occupied = 0
+        self.occupied_by_file = 0
+        self._history = []
+        for square, code in enumerate(self.cells):
+            if code != EMPTY:
+                self._toggle(square, code)
+
+    def _toggle(self, square, code):
+        """Adds or removes the piece code on the square in every bitboard"""
+        bit = 1 << square
+        row, col = divmod(square, 9)
+        self.pieces[code] ^= bit
+        self.colors[code >> 3] ^= bit
+        self.occupied ^= bit
+        self.occupied_by_file ^= 1 << col * 10 + row
+
+    def place(self, square, code):
+        """Puts the piece code on an empty square, for setting up a position"""
+        self.cells[square] = code
+        self._toggle(square, code)
+
+    def clear(self, square):
+        """Takes the piece off the square, for setting up a position"""
+        self._toggle(square, self.cells[square])
+        self.cells[square] = EMPTY
+
+    def push(self, start, end):
+        """Moves the piece on start to end, capturing whatever is there"""
+        cells = self.cells
+        code = cells[start]
+        captured = cells[end]
+        if captured != EMPTY:
+            self._toggle(end, captured)
+        self._toggle(start, code)
+        self._toggle(end, code)
+        cells[start] = EMPTY
+        cells[end] = code
+        self._history.append((start, end, captured))
+
+    def pop(self):
+        """Takes back the last move made with push()"""
+        start, end, captured = self._history.pop()
+        cells = self.cells
+        code = cells[end]
+        self._toggle(end, code)
+        self._toggle(start, code)
+        if captured != EMPTY:
+            self._toggle(end, captured)
+        cells[start] = code
+        cells[end] = captured
+
+    def rook_moves(self, square, occupied=None, occupied_by_file=None):
+        """Returns the squares a rook on the square reaches: each ray up to and including the first piece"""
+        if occupied is None:
+            occupied = self.occupied
+            occupied_by_file = self.occupied_by_file
+        row, col = divmod(square, 9)
+        rank = RANK_ROOK[col][occupied >> row * 9 & RANK_MASK] << row * 9
+        file = FILE_SPREAD[FILE_ROOK[row][occupied_by_file >> col * 10 & FILE_MASK]] << col
+        return rank | file
+
+    def canon_reach(self, square, occupied=None, occupied_by_file=None):
+        """Returns the squares behind the first piece on each ray from the square, up to and including the next
+        piece. The pieces in this mask are the ones a canon on the square can capture"""
+        if occupied is None:
+            occupied = self.occupied
+            occupied_by_file = self.occupied_by_file
+        row, col = divmod(square, 9)
+        rank = RANK_CANON[col][occupied >> row * 9 & RANK_MASK] << row * 9
+        file = FILE_SPREAD[FILE_CANON[row][occupied_by_file >> col * 10 & FILE_MASK]] << col
+        return rank | file
+
+    def destinations(self, square):
+        """Returns the bitmask of every square the piece on the square can move to, exactly as its move method
+        would accept. Like the move methods, this ignores whether the move leaves its own general in check"""
+        code = self.cells[square]
+        kind = code & 7
+        side = code >> 3
+        own = self.colors[side]
+        occupied = self.occupied
+        if kind == ROOK:
+            return self.rook_moves(square) & ~own
+        elif kind == CANON:
+            return (self.rook_moves(square) & ~occupied) | (self.canon_reach(square) & self.colors[side ^ 1])
+        elif kind == KNIGHT:
+            targets = 0
+            for leg, jumps in KNIGHT_LEGS[square]:
+                if not occupied & leg:
+                    targets |= jumps
+            return targets & ~own
+        elif kind == ELEPHANT:
+            targets = 0
+            for eye, target in ELEPHANT_STEPS[side][square]:
+                if not occupied & eye:
+                    targets |= target
+            return targets & ELEPHANT_POINTS[side] & ~own
+        elif kind == ADVISOR:
+            return ADVISOR_STEPS[side][square] & ADVISOR_POINTS[side] & ~own
+        elif kind == SOLDIER:
+            return SOLDIER_STEPS[side][square] & ~own
+        elif kind == GENERAL:
+            targets = GENERAL_STEPS[side][square] & ~own
+
+            # The general may not step into a column where it would face the enemy general with nothing between
+            enemy_general = self.pieces[GENERAL | (side ^ 1) << 3]
+            if enemy_general:
+                enemy_square = enemy_general.bit_length() - 1
+                for target in squares(targets):
+                    if target % 9 == enemy_square % 9 and self._clear_between(target, enemy_square, square):
+                        targets ^= 1 << target
+            return targets
+        return 0
+
+    def _clear_between(self, low, high, ignore):
+        """Returns True if no piece other than the one on ignore stands between two squares of the same column"""
+        if low > high:
+            low, high = high, low
+        between = self.occupied & ~(1 << ignore)
+        for square in range(low + 9, high, 9):
+            if between >> square & 1:
+                return False
+        return True
+
+    def destination_squares(self, square):
+        """Returns the list of squares in destinations(square)"""
+        return list(squares(self.destinations(square)))
+
+    def can_move(self, start, end):
+        """Returns True if the piece on start can move to end"""
+        return self.destinations(start) >> end & 1 == 1
+
+    def moves(self, color):
+        """Returns every (start, end) move for the color's pieces, ignoring checks"""
+        side = 0 if color == 'red' else 1
+        result = []
+        for start in squares(self.colors[side]):
+            for end in squares(self.destinations(start)):
+                result.append((start, end))
+        return result
+
+    def general_square(self, color):
+        """Returns the square of the color's general, or None if it has been captured"""
+        general = self.pieces[GENERAL | (0 if color == 'red' else BLACK)]
+        if not general:
+            return None
+        return general.bit_length() - 1
+
+    def attackers(self, square, color, occupied=None, occupied_by_file=None):
+        """Returns the bitmask of the color's rooks, canons, knights and soldiers that attack the square, optionally
+        for a different occupancy. Elephants, advisors and generals can never reach the enemy general"""
+        if occupied is None:
+            occupied = self.occupied
+            occupied_by_file = self.occupied_by_file
+        side = 0 if color == 'red' else 1
+        offset = side << 3
+        pieces = self.pieces
+        found = self.rook_moves(square, occupied, occupied_by_file) & pieces[ROOK | offset]
+        found |= self.canon_reach(square, occupied, occupied_by_file) & occupied & pieces[CANON | offset]
+        found |= SOLDIER_CHECKS[side][square] & pieces[SOLDIER | offset]
+        knights = pieces[KNIGHT | offset]
+        if knights:
+            for origin, leg in KNIGHT_CHECKS[square]:
+                if knights & origin and not occupied & leg:
+                    found |= origin
+        return found
+
+    def in_check(self, color):
+        """Returns True if the color's general is attacked"""
+        square = self.general_square(color)
+        if square is None:
+            return False
+        return self.attackers(square, 'black' if color == 'red' else 'red') != 0
+
+    def generals_facing(self):
+        """Returns True if the two generals stand in the same column with nothing between them"""
+        red = self.general_square('red')
+        black = self.general_square('black')
+        if red is None or black is None or red % 9 != black % 9:
+            return False
+        return self._clear_between(red, black, red)
+
+    def attacked(self, color):
+        """Returns the bitmask of every square attacked by the color, with the same meaning as Pieces.attacks"""
+        side = 0 if color == 'red' else 1
+        offset = side << 3
+        pieces = self.pieces
+        occupied = self.occupied
+        attacked = 0
+        for square in squares(pieces[ROOK | offset]):
+            attacked |= self.rook_moves(square)
+        for square in squares(pieces[CANON | offset]):
+            attacked |= self.canon_reach(square)
+        for square in squares(pieces[KNIGHT | offset]):
+            for leg, jumps in KNIGHT_LEGS[square]:
+                if not occupied & leg:
+                    attacked |= jumps
+        for square in squares(pieces[ELEPHANT | offset]):
+            for eye, target in ELEPHANT_STEPS[side][square]:
+                if not occupied & eye:
+                    attacked |= target
+        for square in squares(pieces[ADVISOR | offset]):
+            attacked |= ADVISOR_STEPS[side][square]
+        for square in squares(pieces[GENERAL | offset]):
+            attacked |= GENERAL_STEPS[side][square]
+        for square in squares(pieces[SOLDIER | offset]):
+            attacked |= SOLDIER_STEPS[side][square]
+        return attacked
@@ -0,0 +1,152 @@
+# Description: An opening book for XiangqiGame. A builder counts the moves played from every position in the opening
+# of a collection of games and writes them to a sorted binary file, which the reader memory-maps and binary-searches
+# without reading it in.
+
+import argparse
+import mmap
+import random
+import struct
+
+from game import XiangqiGame
+from notation import NOTATIONS, parse_move, to_iccs
+from replay import read_games, split_moves
+from transposition import pack_move, unpack_move
+
+# Every record is the position hash, the move packed as in transposition.pack_move, its weight and the number of
+# games it was played in, little-endian. Records are sorted by hash and then move
+RECORD = struct.Struct('<QHHI')
+
+# What a game's result is worth to the player who made a move: a win counts twice as much as a draw, a loss not at
+# all. Games without a result, or with one not listed here such as '*', count as draws
+RESULT_POINTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+DRAW_POINTS = (1, 1)
+
+
+def build_book(games, path, notation='iccs', plies=20):
+    """Writes an opening book to path from the games, each a list or string of moves (see replay.replay_game) or a
+    (moves, result) pair with a result of '1-0', '0-1' or '1/2-1/2', any other result counting as a draw. The first
+    plies moves of every game are counted, stopping early at a move that cannot be read or is illegal. Returns the
+    number of records written."""
+    entries = {}
+    game = XiangqiGame()
+    for moves in games:
+        result = None
+        if isinstance(moves, tuple):
+            moves, result = moves
+        points = RESULT_POINTS.get(result, DRAW_POINTS)
+        game.reset()
+        for move in split_moves(moves)[:plies]:
+            try:
+                if isinstance(move, str):
+                    move = parse_move(game, move, notation)
+            except ValueError:
+                break
+            key = (game.get_hash(), pack_move(move))
+            if game.get_turn() == 'red':
+                weight = points[0]
+            else:
+                weight = points[1]
+            if not game.make_move(*move):
+                break
+            total_weight, count = entries.get(key, (0, 0))
+            entries[key] = (total_weight + weight, count + 1)
+
+    with open(path, 'wb') as book:
+        for (position_hash, move), (weight, count) in sorted(entries.items()):
+            book.write(RECORD.pack(position_hash, move, min(weight, 0xFFFF), min(count, 0xFFFFFFFF)))
+    return len(entries)
+
+
+class OpeningBook:
+    """An opening book file (see build_book) opened for lookups. The file is memory-mapped, so opening it costs
+    nothing however big it is, and each lookup is a binary search over the records."""
+
+    def __init__(self, path):
+        """Opens the book at path"""
+        self._file = open(path, 'rb')
+        self._records = 0
+        self._map = None
+        size = self._file.seek(0, 2)
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._records = size // RECORD.size
+
+    def __len__(self):
+        """Returns the number of records in the book"""
+        return self._records
+
+    def close(self):
+        """Closes the book file"""
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def _first(self, position_hash):
+        """Returns the index of the first record with the hash, or of the first one after where it would be"""
+        low = 0
+        high = self._records
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<Q', self._map, middle * RECORD.size)[0] < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def moves(self, position_hash):
+        """Returns the book moves of the position with the hash, as (move, weight, count) tuples where move is a
+        (start, end) pair of integer squares"""
+        moves = []
+        index = self._first(position_hash)
+        while index < self._records:
+            record_hash, move, weight, count = RECORD.unpack_from(self._map, index * RECORD.size)
+            if record_hash != position_hash:
+                break
+            moves.append((unpack_move(move), weight, count))
+            index += 1
+        return moves
+
+    def choose(self, game, chooser=None):
+        """Picks a book move for the game's position, or returns None if the book has none. Moves are picked at
+        random in proportion to their weight using chooser (a random.Random, or the random module if not given).
+        Moves that are not legal in the game, which can only come from a hash collision, are never picked."""
+        legal = game.legal_moves()
+        moves = [(move, weight) for move, weight, count in self.moves(game.get_hash()) if move in legal and weight]
+        if not moves:
+            return None
+        if chooser is None:
+            chooser = random
+        return chooser.choices([move for move, weight in moves], [weight for move, weight in moves])[0]
+
+
+def cli(argv=None):
+    """Builds an opening book from a file of games, one per line, or lists the book moves of a position in ICCS"""
+    parser = argparse.ArgumentParser(description='Build or look into a XiangQi opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from a file of games, one per line')
+    build.add_argument('games', help='file with one game per line')
+    build.add_argument('book', help='book file to write')
+    build.add_argument('--notation', choices=NOTATIONS, default='iccs',
+                       help='notation of the moves (default iccs)')
+    build.add_argument('--plies', type=int, default=20, help='moves of each game to count (default 20)')
+    show = commands.add_parser('show', help='list the book moves of a position')
+    show.add_argument('book', help='book file to read')
+    show.add_argument('--fen', help='position to look up (default the start position)')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        print(build_book(read_games(args.games), args.book, args.notation, args.plies), 'records')
+    else:
+        game = XiangqiGame(fen=args.fen)
+        with OpeningBook(args.book) as book:
+            for move, weight, count in book.moves(game.get_hash()):
+                print(to_iccs(move), weight, count)
+
+
+if __name__ == '__main__':
+    cli()
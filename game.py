@@ -2,884 +2,1072 @@
 # Date: 3/4/20
 # Description: Portfolio project where a working version of XiangQi (chinese chess) is made
 
+import argparse
+import random
+import sys
+import time
+
+
+COLUMNS = 'abcdefghi'
+COLUMN_INDEX = {letter: index for index, letter in enumerate(COLUMNS)}
+
+# The 90 points of the board are numbered row by row starting from red's side, so a1 is 0, i1 is 8, a2 is 9 and
+# i10 is 89. The row of a square is square // 9 and its column is square % 9
+SQUARE_NAMES = [letter + str(row + 1) for row in range(10) for letter in COLUMNS]
+SQUARES = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
+# Integer piece codes stored in the board cells. Black pieces have the BLACK bit set, and 0 is an empty point
+EMPTY = 0
+GENERAL = 1
+ADVISOR = 2
+ELEPHANT = 3
+KNIGHT = 4
+ROOK = 5
+CANON = 6
+SOLDIER = 7
+BLACK = 8
+PIECE_CODES = {'general': GENERAL, 'advisor': ADVISOR, 'elephant': ELEPHANT, 'knight': KNIGHT, 'rook': ROOK,
+               'canon': CANON, 'soldier': SOLDIER}
+PIECE_TYPES = {code: piece_type for piece_type, code in PIECE_CODES.items()}
+
+# Pieces keep their color as a side number, 0 for red and 1 for black, which is also the color bit of their code
+COLORS = ('red', 'black')
+SIDES = {'red': 0, 'black': 1}
+
+# For each square, the squares along each of the four orthogonal rays leading away from it, nearest first
+RAYS = []
+for _square in range(90):
+    _row, _col = divmod(_square, 9)
+    RAYS.append((tuple(range(_square + 9, 90, 9)), tuple(range(_square - 9, -1, -9)),
+                 tuple(range(_square + 1, _row * 9 + 9)), tuple(range(_square - 1, _row * 9 - 1, -1))))
+del _square, _row, _col
+
+
+def _on_board(col, row):
+    """Returns True if the column and row indices are on the board"""
+    return 0 <= col < 9 and 0 <= row < 10
+
+
+def _mirror(squares):
+    """Returns black's squares for a list of red's, by turning the board around the river"""
+    return [(9 - square // 9) * 9 + square % 9 for square in squares]
+
+
+def _mask(squares):
+    """Returns the bitmask of a list of squares"""
+    mask = 0
+    for square in squares:
+        mask |= 1 << square
+    return mask
+
+
+# The points of the palace, the advisors and the elephants, and the half of the board on each side of the river, for
+# red (index 0) and black (index 1), as bitmasks where bit n stands for square n
+_RED_PALACE = [row * 9 + col for row in range(3) for col in (3, 4, 5)]
+_RED_ADVISOR_POINTS = [3, 5, 13, 21, 23]
+_RED_ELEPHANT_POINTS = [2, 6, 18, 22, 26, 38, 42]
+PALACE = [_mask(_RED_PALACE), _mask(_mirror(_RED_PALACE))]
+ADVISOR_POINTS = [_mask(_RED_ADVISOR_POINTS), _mask(_mirror(_RED_ADVISOR_POINTS))]
+ELEPHANT_POINTS = [_mask(_RED_ELEPHANT_POINTS), _mask(_mirror(_RED_ELEPHANT_POINTS))]
+OWN_HALF = [(1 << 45) - 1, ((1 << 90) - 1) ^ ((1 << 45) - 1)]
+
+# Move tables, indexed by square and by side for the pieces that depend on it. The knight's and the elephant's map
+# every square they can reach to the square that blocks the move (the knight's leg, the elephant's eye). The others
+# list the squares one step away: diagonally on the advisor points, orthogonally inside the palace, a soldier's step
+# forward (None at the last row) and the steps sideways it may take once across the river
+KNIGHT_MOVES = []
+ELEPHANT_MOVES = [[], []]
+ADVISOR_MOVES = [[], []]
+GENERAL_MOVES = [[], []]
+SOLDIER_FORWARD = [[], []]
+SIDEWAYS = []
+for _square in range(90):
+    _row, _col = divmod(_square, 9)
+    _jumps = {}
+    for _col_step, _row_step in ((1, 2), (-1, 2), (1, -2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)):
+        if _on_board(_col + _col_step, _row + _row_step):
+            if abs(_row_step) == 2:
+                _leg = _square + 9 * (_row_step // 2)
+            else:
+                _leg = _square + _col_step // 2
+            _jumps[_square + _row_step * 9 + _col_step] = _leg
+    KNIGHT_MOVES.append(_jumps)
+    SIDEWAYS.append(tuple(_square + _col_step for _col_step in (1, -1) if _on_board(_col + _col_step, _row)))
+    _diagonals = [_square + _row_step * 9 + _col_step for _col_step, _row_step in ((1, 1), (1, -1), (-1, 1), (-1, -1))
+                  if _on_board(_col + _col_step, _row + _row_step)]
+    _orthogonals = [_square + _row_step * 9 + _col_step for _col_step, _row_step in ((0, 1), (0, -1), (1, 0), (-1, 0))
+                    if _on_board(_col + _col_step, _row + _row_step)]
+    for _side in (0, 1):
+        _eyes = {}
+        for _col_step, _row_step in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+            if _on_board(_col + 2 * _col_step, _row + 2 * _row_step):
+                _target = _square + 2 * (_row_step * 9 + _col_step)
+                if ELEPHANT_POINTS[_side] >> _target & 1:
+                    _eyes[_target] = _square + _row_step * 9 + _col_step
+        ELEPHANT_MOVES[_side].append(_eyes)
+        ADVISOR_MOVES[_side].append(tuple(_end for _end in _diagonals if ADVISOR_POINTS[_side] >> _end & 1))
+        GENERAL_MOVES[_side].append(tuple(_end for _end in _orthogonals if PALACE[_side] >> _end & 1))
+        _forward = _square + (9 if _side == 0 else -9)
+        SOLDIER_FORWARD[_side].append(_forward if 0 <= _forward < 90 else None)
+del _square, _row, _col, _jumps, _leg, _diagonals, _orthogonals, _side, _eyes, _target, _forward
+
+# For every square, the (origin, leg) pairs of the knights that could jump onto it
+KNIGHT_ORIGINS = [[] for _square in range(90)]
+for _square in range(90):
+    for _end, _leg in KNIGHT_MOVES[_square].items():
+        KNIGHT_ORIGINS[_end].append((_square, _leg))
+del _square, _end, _leg
+
+# For every square and side, the squares a soldier of that side could step onto it from
+SOLDIER_ORIGINS = [[[] for _square in range(90)] for _side in (0, 1)]
+for _side in (0, 1):
+    for _square in range(90):
+        if SOLDIER_FORWARD[_side][_square] is not None:
+            SOLDIER_ORIGINS[_side][SOLDIER_FORWARD[_side][_square]].append(_square)
+        if not OWN_HALF[_side] >> _square & 1:
+            for _end in SIDEWAYS[_square]:
+                SOLDIER_ORIGINS[_side][_end].append(_square)
+del _side, _square, _end
+
+# The legality of every move is tested by playing it when the player is in check from a canon or from two pieces
+ALL_SQUARES = (1 << 90) - 1
+
+# Zobrist keys: a random 64-bit number for every piece code on every square, and one for black to move. The hash of
+# a position is the XOR of the keys of its pieces, plus the black to move key when it is black's turn. The seed is
+# fixed so hashes are the same from run to run and can be stored
+_zobrist_random = random.Random(20200304)
+ZOBRIST = [[_zobrist_random.getrandbits(64) for square in range(90)] for code in range(16)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+del _zobrist_random
+
+# Material values by piece type. The general is never traded, so it is not counted
+PIECE_VALUES = {GENERAL: 0, ADVISOR: 200, ELEPHANT: 200, KNIGHT: 400, ROOK: 900, CANON: 450, SOLDIER: 100}
+
+# Bonuses for where a red piece stands, added to its material value. Each table lists the rows from row 10 (black's
+# side) down to row 1 (red's side), so it reads like the board from red's seat. A soldier across the river is worth
+# about twice as much, rooks and knights like open central points, and canons like the central file at home
+PIECE_SQUARE_TABLES = {
+    GENERAL: [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, -10, -12, -10, 0, 0, 0],
+        [0, 0, 0, -5, -4, -5, 0, 0, 0],
+        [0, 0, 0, -2, 2, -2, 0, 0, 0],
+    ],
+    ADVISOR: [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, -2, 0, -2, 0, 0, 0],
+        [0, 0, 0, 0, 4, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    ELEPHANT: [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, -2, 0, 0, 0, -2, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [-3, 0, 0, 0, 4, 0, 0, 0, -3],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    KNIGHT: [
+        [2, 2, 2, 8, 2, 8, 2, 2, 2],
+        [2, 8, 15, 9, 6, 9, 15, 8, 2],
+        [4, 10, 11, 15, 11, 15, 11, 10, 4],
+        [5, 20, 12, 19, 12, 19, 12, 20, 5],
+        [2, 12, 11, 15, 16, 15, 11, 12, 2],
+        [2, 10, 13, 14, 15, 14, 13, 10, 2],
+        [4, 6, 10, 7, 10, 7, 10, 6, 4],
+        [5, 4, 6, 7, 4, 7, 6, 4, 5],
+        [-3, 2, 4, 5, -10, 5, 4, 2, -3],
+        [0, -3, 2, 0, 2, 0, 2, -3, 0],
+    ],
+    ROOK: [
+        [6, 8, 7, 13, 14, 13, 7, 8, 6],
+        [6, 12, 9, 16, 33, 16, 9, 12, 6],
+        [6, 8, 7, 14, 16, 14, 7, 8, 6],
+        [6, 13, 13, 16, 16, 16, 13, 13, 6],
+        [8, 11, 11, 14, 15, 14, 11, 11, 8],
+        [8, 12, 12, 14, 15, 14, 12, 12, 8],
+        [4, 9, 4, 12, 14, 12, 4, 9, 4],
+        [-2, 8, 4, 12, 12, 12, 4, 8, -2],
+        [5, 8, 6, 12, 0, 12, 6, 8, 5],
+        [-6, 6, 4, 12, 0, 12, 4, 6, -6],
+    ],
+    CANON: [
+        [4, 4, 0, -5, -6, -5, 0, 4, 4],
+        [2, 2, 0, -4, -7, -4, 0, 2, 2],
+        [1, 1, 0, -5, -4, -5, 0, 1, 1],
+        [0, 3, 3, 2, 4, 2, 3, 3, 0],
+        [-1, 0, 3, 0, 4, 0, 3, 0, -1],
+        [0, 0, 0, 0, 4, 0, 0, 0, 0],
+        [-1, 0, 3, 0, 4, 0, 3, 0, -1],
+        [0, 1, 2, 2, 6, 2, 2, 1, 0],
+        [0, 0, 1, 1, 1, 1, 1, 0, 0],
+        [0, 0, 1, 3, 3, 3, 1, 0, 0],
+    ],
+    SOLDIER: [
+        [0, 0, 0, 10, 20, 10, 0, 0, 0],
+        [90, 90, 110, 120, 120, 120, 110, 90, 90],
+        [90, 90, 110, 120, 120, 120, 110, 90, 90],
+        [70, 90, 110, 110, 110, 110, 110, 90, 70],
+        [70, 70, 70, 70, 70, 70, 70, 70, 70],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, -10, 0, 10, 0, -10, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+}
+
+# SQUARE_VALUES[code][square] is the material plus position value of the piece with that code on that square,
+# positive for red and negative for black. A black piece's table is red's turned upside down
+SQUARE_VALUES = [[0] * 90 for code in range(16)]
+for _kind, _table in PIECE_SQUARE_TABLES.items():
+    for _square in range(90):
+        _row, _col = divmod(_square, 9)
+        SQUARE_VALUES[_kind][_square] = PIECE_VALUES[_kind] + _table[9 - _row][_col]
+        SQUARE_VALUES[_kind | BLACK][_square] = -(PIECE_VALUES[_kind] + _table[_row][_col])
+del _kind, _table, _square, _row, _col
+
+
+class Board:
+    """The game board. The 90 points are stored as a flat bytearray of integer piece codes, with the piece objects
+    kept in a parallel list, so that the game logic works on integer square indices. Indexing the board by column
+    letter returns a view of that column, so board['e'][0] is still the red general and empty points are ' '."""
+
+    def __init__(self):
+        """Initializes an empty board"""
+        self.cells = bytearray(90)
+        self.pieces = [None] * 90
+
+    def get(self, square):
+        """Returns the piece on the square, or None if the square is empty"""
+        return self.pieces[square]
+
+    def place(self, piece, square):
+        """Puts the piece on the square"""
+        self.cells[square] = piece.get_code()
+        self.pieces[square] = piece
+
+    def clear(self, square):
+        """Empties the square"""
+        self.cells[square] = EMPTY
+        self.pieces[square] = None
+
+    def __getitem__(self, column):
+        return _Column(self, COLUMN_INDEX[column])
+
+    def __iter__(self):
+        return iter(COLUMNS)
+
+    def __len__(self):
+        return len(COLUMNS)
+
+    def __contains__(self, column):
+        return column in COLUMN_INDEX
+
+    def keys(self):
+        """Returns the column letters, like the keys of the original dictionary board"""
+        return list(COLUMNS)
+
+    def values(self):
+        """Returns a view of every column"""
+        return [self[column] for column in COLUMNS]
+
+    def items(self):
+        """Returns (letter, column view) pairs"""
+        return [(column, self[column]) for column in COLUMNS]
+
+
+class _Column:
+    """A view of one column of the board that behaves like the list of ten points the board used to store."""
+
+    def __init__(self, board, column):
+        self._board = board
+        self._column = column
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += 10
+        if not 0 <= row < 10:
+            raise IndexError('row out of range')
+        piece = self._board.pieces[row * 9 + self._column]
+        if piece is None:
+            return ' '
+        return piece
+
+    def __setitem__(self, row, value):
+        if row < 0:
+            row += 10
+        if not 0 <= row < 10:
+            raise IndexError('row out of range')
+        if value == ' ' or value is None:
+            self._board.clear(row * 9 + self._column)
+        else:
+            self._board.place(value, row * 9 + self._column)
+
+    def __len__(self):
+        return 10
+
+    def __iter__(self):
+        for row in range(10):
+            yield self[row]
+
+    def __repr__(self):
+        return repr(list(self))
+
 
 class Pieces:
-    """A parent class for all of the pieces in the game."""
+    """A parent class for all of the pieces in the game. A piece keeps only small integers: its side (see SIDES),
+    its code as stored in the board cells and its square, in slots rather than a __dict__. The get methods still
+    return the color, position and type names."""
+
+    __slots__ = ('_side', '_code', '_square', '_possible_moves', '_game', '_moves_key')
+
+    # The piece type code, set by each subclass
+    _kind = EMPTY
 
     def __init__(self, color, position):
-        self._color = color
-        self._position = position
-        self._piece_type = None
-        self._possible_moves = []
+        self._side = SIDES[color]
+        self._code = self._kind | self._side << 3
+        self._square = SQUARES.get(position)
+        self._possible_moves = None
+        self._game = None
+        self._moves_key = None
 
     def get_color(self):
         """A get method for piece color"""
-        return self._color
+        return COLORS[self._side]
+
+    def get_side(self):
+        """A get method for the side of the piece, 0 for red and 1 for black"""
+        return self._side
 
     def get_position(self):
         """A get method for the position of the piece"""
-        return self._position
+        if self._square is None:
+            return 'DEAD'
+        return SQUARE_NAMES[self._square]
+
+    def get_square(self):
+        """A get method for the integer square index of the piece. Returns None once the piece is captured"""
+        return self._square
 
     def get_piece_type(self):
         """A get method for the piece type"""
-        return self._piece_type
+        return PIECE_TYPES[self._kind]
+
+    def get_code(self):
+        """Returns the integer code stored in the board cell of this piece"""
+        return self._code
 
     def get_possible_moves(self):
-        """A get method to get a piece's possible moves"""
+        """A get method to get a piece's possible moves. For a piece in a game they are only worked out when asked
+        for, and kept until the position changes."""
+        if self._game is not None:
+            key = self._game.get_hash()
+            if key != self._moves_key:
+                self._possible_moves = self._game.legal_destinations(self)
+                self._moves_key = key
+        if self._possible_moves is None:
+            return []
         return self._possible_moves
 
     def set_possible_moves(self, lst):
-        """A set method that sets a piece's possible moves to lst"""
+        """A set method that sets a piece's possible moves to lst, which are kept until the position changes"""
         self._possible_moves = lst
+        if self._game is not None:
+            self._moves_key = self._game.get_hash()
+
+    def set_game(self, game):
+        """A set method for the game the piece belongs to, which works out its possible moves"""
+        self._game = game
+        self._moves_key = None
 
     def update_position(self, col, row):
         """Updates the position of the piece"""
         possible_col = 'abcdefghi'
         if col not in possible_col:
-            self._position = 'DEAD'
+            self._square = None
         else:
-            new_pos = col + str(row+1)
-            self._position = new_pos
-
-
-class Rook(Pieces):
-    """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
+            self._square = row * 9 + COLUMN_INDEX[col]
 
-    def __init__(self, color, position):
-        """Initializes the Rook. Updates the attribute piece_type, which is just the name of the class."""
-        super().__init__(color, position)
-        self._piece_type = 'rook'
+    def set_square(self, square):
+        """Updates the position of the piece from an integer square index. None marks the piece as captured"""
+        self._square = square
 
     def move(self, start, end, board):
-        """This function moves the rook if possible. Takes as parameters the start position, the end position, and
-        the current board."""
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
+        """Checks whether the piece can move from start to end on the board. start and end may be square names
+        such as 'e1' or integer square indices."""
+        if isinstance(start, str):
+            start = SQUARES[start]
+        if isinstance(end, str):
+            end = SQUARES[end]
+        return self.can_move(start, end, board)
+
+    def can_move(self, start, end, board):
+        """Checks whether the piece can move between two integer squares. Each subclass checks its own movement
+        rules."""
+        return False
+
+    def candidate_moves(self, board):
+        """A generator that yields the squares this piece could move to on the board, ignoring whether the move
+        would leave its own general in check. Each subclass yields the destinations for its own movement rules."""
+        return iter(())
+
+    def attacks(self, board):
+        """Returns the squares this piece attacks (could capture an enemy on) and the squares whose occupancy those
+        attacks depend on, as two bitmasks where bit n stands for square n. Each subclass works these out for its
+        own movement rules."""
+        return 0, 0
+
+    def _is_friend(self, board, square):
+        """Returns True if the square holds a piece of the same color as this piece"""
+        code = board.cells[square]
+        return code != EMPTY and code >> 3 == self._side
 
-        # Check if the piece staying in the same column
-        if start_col == end_col:
 
-            # If the row also does not change, return False
-            if start_row == end_row:
-                return False
-
-            # If moving forward (for red) or backward (for black)
-            elif start_row < end_row:
-
-                # Checking if piece is blocked on the way to desired location
-                for index in range(start_row+1, end_row):
-                    if board[end_col][index] != ' ':
-                        return False
-
-                # If the new position is empty, return True
-                if board[end_col][end_row] == ' ':
-                    return True
-
-                # Otherwise, check whose piece is there
-                else:
-
-                    # If same team, can't move, return False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Otherwise, return True
-                    else:
-                        return True
-
-            # If moving backwards (for red) or forwards (for black)
-            elif start_row > end_row:
-
-                # Checking if piece is blocked on the way to desired location
-                for index in range(start_row-1, end_row, -1):
-                    if board[end_col][index] != ' ':
-                        return False
+class Rook(Pieces):
+    """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
-                # If the new position is empty, return True
-                if board[end_col][end_row] == ' ':
-                    return True
+    __slots__ = ()
+    _kind = ROOK
 
-                else:
-                    # Otherwise, check which color the piece is. If same, can't move
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
+    def can_move(self, start, end, board):
+        """This function checks if the rook can move. Takes as parameters the start square, the end square, and
+        the current board."""
+        start_row, start_col = divmod(start, 9)
+        end_row, end_col = divmod(end, 9)
+        cells = board.cells
 
-                    # Otherwise, return True
-                    else:
-                        return True
+        # The rook has to stay in the same column or the same row, and has to move
+        if start == end or (start_col != end_col and start_row != end_row):
+            return False
 
-        # If the piece is moving by staying in the same row (left to right)
+        # Squares are 9 apart along a column and 1 apart along a row
+        if start_col == end_col:
+            step = 9 if end > start else -9
         else:
+            step = 1 if end > start else -1
 
-            # Ensures that rows are different
-            if start_row != end_row:
+        # Checking if piece is blocked on the way to desired location
+        for square in range(start + step, end, step):
+            if cells[square] != EMPTY:
                 return False
 
-            # If moving to the right
-            elif start_col < end_col:
-                for index in board:
-
-                    # Ignore columns to the left of the starting column since we are moving to the right
-                    if index <= start_col:
-                        continue
-
-                    # Ensure that the columns leading up to the desired position are empty
-                    elif index < end_col:
-                        if board[index][end_row] != ' ':
-                            return False
-
-                    # Ignore columns beyond the ending column
-                    elif index > end_col:
-                        break
-
-                # If the position is empty, return True
-                if board[end_col][start_row] == ' ':
-                    return True
-
-                else:
-
-                    # Otherwise, if the occupying piece is a friendly piece, Rook is blocked and returns False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # If it is enemy piece, return True
-                    else:
-                        return True
-
-            # If moving to the left
-            elif start_col > end_col:
-                for index in board:
-
-                    # Ignore columns "greater than" the start column
-                    if index >= start_col:
-                        break
-
-                    # Ignore columns beyond the ending column
-                    elif index <= end_col:
-                        continue
-
-                    # Ensure that path is not blocked by any piece
-                    elif end_col < index < start_col:
-                        if board[index][end_row] != ' ':
-                            return False
-
-                # If space is empty, return True
-                if board[end_col][end_row] == ' ':
-                    return True
-
+        # If the new position is empty or holds an enemy, return True
+        return not self._is_friend(board, end)
+
+    def candidate_moves(self, board):
+        """Yields every square the rook can slide to. Walks each of the four rays until it reaches the edge of the
+        board or a piece, yielding the piece's square if it is an enemy."""
+        row, col = divmod(self._square, 9)
+        cells = board.cells
+        for col_step, row_step in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            next_col = col + col_step
+            next_row = row + row_step
+            while 0 <= next_col < 9 and 0 <= next_row < 10:
+                square = next_row * 9 + next_col
+                if cells[square] == EMPTY:
+                    yield square
                 else:
-
-                    # If not, check if it is a friend piece. If so, rook is blocked. return False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Otherwise, return True
-                    else:
-                        return True
+                    if not self._is_friend(board, square):
+                        yield square
+                    break
+                next_col += col_step
+                next_row += row_step
+
+    def attacks(self, board):
+        """Returns the squares the rook attacks and the squares they depend on. Both are the squares on each of the
+        four rays up to and including the first piece."""
+        cells = board.cells
+        targets = 0
+        for ray in RAYS[self._square]:
+            for square in ray:
+                targets |= 1 << square
+                if cells[square] != EMPTY:
+                    break
+        return targets, targets
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str('\u001b[41m R \u001b[0m')
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m R \u001b[0m')
 
 
 class Knight(Pieces):
     """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
-    def __init__(self, color, position):
-        """Initializes the Knight piece. Updates the attribute piece_type, which is set to the name of the class."""
-        super().__init__(color, position)
-        self._piece_type = 'knight'
+    __slots__ = ()
+    _kind = KNIGHT
 
-    def move(self, start, end, board):
-        """A move function for the knight. Takes as parameters the start position, the end position and the
-        board. The knight first moves one space orthogonally and then one space diagonally, in that order. It can be
-        blocked if there is a piece blocking its orthogonal move."""
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
-        letter_to_num = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        num_to_letter = {1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f', 7: 'g', 8: 'h', 9: 'i'}
-
-        column_diff = letter_to_num[start_col] - letter_to_num[end_col]
-
-        # If the column changes by only one value, the orthogonal move is either forward or back
-        if abs(column_diff) == 1:
-
-            # Ensures that the move is legal
-            if abs(start_row - end_row) != 2:
-                return False
-
-            # If moving forward (for red) or backwards (for black)
-            elif start_row < end_row:
-
-                # Check if orthogonal move is blocked
-                if board[start_col][start_row+1] != ' ':
-                    return False
-
-                else:
-                    # If not blocked and space empty, return True
-                    if board[end_col][end_row] == ' ':
-                        return True
-
-                    # If blocked by teammate, return False
-                    elif board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Otherwise, return True
-                    else:
-                        return True
-
-            # Orthogonal move backwards (for red) or forwards (for black)
-            elif start_row > end_row:
-
-                # Check if orthogonal move is blocked
-                if board[start_col][start_row - 1] != ' ':
-                    return False
+    def can_move(self, start, end, board):
+        """A move check for the knight. Takes as parameters the start square, the end square and the board. The
+        knight first moves one space orthogonally and then one space diagonally, in that order. It can be blocked if
+        there is a piece blocking its orthogonal move. The jumps and their legs come from KNIGHT_MOVES."""
+        leg = KNIGHT_MOVES[start].get(end)
 
-                else:
-
-                    # If not blocked and end space empty, return True
-                    if board[end_col][end_row] == ' ':
-                        return True
-
-                    # If end space has teammate, return False
-                    elif board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Otherwise, return True
-                    else:
-                        return True
-
-        # When orthogonal move is left/right
-        else:
-
-            # Ensures that the move is legal
-            if abs(column_diff) != 2:
-                return False
-
-            elif abs(start_row - end_row) != 1:
-                return False
-
-            # If the orthogonal move is to the left
-            elif column_diff > 0:
-
-                # If that space is not empty, return False
-                if board[num_to_letter[letter_to_num[start_col] - 1]][start_row] != ' ':
-                    return False
-
-                # If not blocked
-                else:
-
-                    # And final space is empty, return True
-                    if board[end_col][end_row] == ' ':
-                        return True
-
-                    # If blocked by teammate, return False
-                    elif board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Otherwise, return True
-                    else:
-                        return True
-
-            else:
-                # If that space is not empty, return False
-                if board[num_to_letter[letter_to_num[start_col] + 1]][start_row] != ' ':
-                    return False
-
-                # If not blocked
-                else:
-
-                    # And final space is empty, return True
-                    if board[end_col][end_row] == ' ':
-                        return True
+        # If the end is not a knight's jump away, the move is not legal
+        if leg is None:
+            return False
 
-                    # If blocked by teammate, return False
-                    elif board[end_col][end_row].get_color() == self.get_color():
-                        return False
+        # Check if orthogonal move is blocked
+        if board.cells[leg] != EMPTY:
+            return False
 
-                    # Otherwise, return True
-                    else:
-                        return True
+        # If the final space is empty or holds an enemy, return True
+        return not self._is_friend(board, end)
+
+    def candidate_moves(self, board):
+        """Yields every square the knight can jump to. Each jump is one orthogonal step (the leg) followed by one
+        diagonal step, so a piece on the leg blocks both jumps that go through it."""
+        cells = board.cells
+        for end, leg in KNIGHT_MOVES[self._square].items():
+            if cells[leg] == EMPTY and not self._is_friend(board, end):
+                yield end
+
+    def attacks(self, board):
+        """Returns the squares the knight attacks and the leg squares they depend on."""
+        cells = board.cells
+        targets = 0
+        legs = 0
+        for end, leg in KNIGHT_MOVES[self._square].items():
+            legs |= 1 << leg
+            if cells[leg] == EMPTY:
+                targets |= 1 << end
+        return targets, legs
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str('\u001b[41m K \u001b[0m')
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m K \u001b[0m')
 
 
 class Elephant(Pieces):
     """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
-    def __init__(self, color, position):
-        """Initializes the elephant piece. Updates the attribute piece_type, which is set to the name of the
-        class."""
-        super().__init__(color, position)
-        self._piece_type = 'elephant'
+    __slots__ = ()
+    _kind = ELEPHANT
 
-    def move(self, start, end, board):
-        """The move function for the elephant. Takes in as parameters the start position, the end position, and the
+    def can_move(self, start, end, board):
+        """The move check for the elephant. Takes in as parameters the start square, the end square, and the
         board. The elephant moves two points diagonally. It cannot jump over other pieces, so it is possible to
-        block the elephant from moving. The elephant cannot cross the river."""
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
-        letter_to_num = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        num_to_letter = {1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f', 7: 'g', 8: 'h', 9: 'i'}
-
-        # Set the list of possible move locations based on color
-        if self.get_color() == 'red':
-            possible_moves = ['c1', 'a3', 'c5', 'e3', 'g1', 'i3', 'g5']
-        else:
-            possible_moves = ['c10', 'a8', 'c6', 'e8', 'g10', 'i8', 'g6']
-
-        # These middle variables are used to check if the elephant is blocked. It calculates the middle column
-        # By converting the letters to numbers, finding the average, and converting back to letter. It finds the
-        # middle row by simply taking the average
-        middle_col = num_to_letter[int(abs(letter_to_num[start_col] + letter_to_num[end_col]) / 2)]
-        middle_row = int((start_row + end_row) / 2)
+        block the elephant from moving. The elephant cannot cross the river. The moves and their eyes come from
+        ELEPHANT_MOVES."""
+        eye = ELEPHANT_MOVES[self._side][start].get(end)
 
         # If the move requested is not possible, return False
-        if end not in possible_moves:
+        if eye is None:
             return False
 
-        # If the move is not diagonal and within two spaces, return False
-        elif abs(start_row - end_row) != 2 or abs(letter_to_num[start_col] - letter_to_num[end_col]) != 2:
-            return False
-
-        # If the first diagonal move is not empty, the elephant is blocked. Return false
-        elif board[middle_col][middle_row] != ' ':
+        # If the middle point (halfway between start and end) is not empty, the elephant is blocked
+        elif board.cells[eye] != EMPTY:
             return False
 
+        # If the desired location is empty or holds an enemy, return True
         else:
-
-            # If the desired location is empty, return True
-            if board[end_col][end_row] == ' ':
-                return True
-
-            # If blocked by teammate, return False
-            elif board[end_col][end_row].get_color() == self.get_color():
-                return False
-
-            # Otherwise, return True
-            else:
-                return True
+            return not self._is_friend(board, end)
+
+    def candidate_moves(self, board):
+        """Yields every square the elephant can move to. It moves two points diagonally, cannot be blocked at the
+        midpoint (the eye) and stays on its own side of the river."""
+        cells = board.cells
+        for end, eye in ELEPHANT_MOVES[self._side][self._square].items():
+            if cells[eye] == EMPTY and not self._is_friend(board, end):
+                yield end
+
+    def attacks(self, board):
+        """Returns the squares the elephant attacks and the eye squares they depend on."""
+        cells = board.cells
+        targets = 0
+        eyes = 0
+        for end, eye in ELEPHANT_MOVES[self._side][self._square].items():
+            eyes |= 1 << eye
+            if cells[eye] == EMPTY:
+                targets |= 1 << end
+        return targets, eyes
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str('\u001b[41m E \u001b[0m')
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m E \u001b[0m')
 
 
 class Advisor(Pieces):
     """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
-    def __init__(self, color, position):
-        """Initializes the advisor piece. Updates the attribute piece_type, which is set to the name of the class."""
-        super().__init__(color, position)
-        self._piece_type = 'advisor'
+    __slots__ = ()
+    _kind = ADVISOR
 
-    def move(self, start, end, board):
-        """A move method for the advisor. Takes as a parameter the stand position, the end position, and the board.
-        The advisor must stay within the castle and can only move one space diagonally."""
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
-        letter_to_num = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-
-        # Possible positions by piece color
-        if self.get_color() == 'red':
-            possible_pos = ['d1', 'd3', 'e2', 'f1', 'f3']
-        else:
-            possible_pos = ['d10', 'd8', 'e9', 'f10', 'f8']
-
-        # If the requested move is not possible
-        if end not in possible_pos:
-            return False
+    def can_move(self, start, end, board):
+        """A move check for the advisor. Takes as a parameter the start square, the end square, and the board.
+        The advisor must stay on the advisor points of its castle and can only move one space diagonally."""
 
-        # If the move is not diagonal and within one space
-        elif abs(start_row - end_row) != 1 or abs(letter_to_num[start_col] - letter_to_num[end_col]) != 1:
+        # If the requested move is not one of the advisor's steps
+        if end not in ADVISOR_MOVES[self._side][start]:
             return False
 
-        # If the space is empty, return True
-        elif board[end_col][end_row] == ' ':
-            return True
-
+        # If the space is empty or holds an enemy, return True
         else:
-            # If blocked by a friendly piece, return False
-            if board[end_col][end_row].get_color() == self.get_color():
-                return False
+            return not self._is_friend(board, end)
 
-            # If an enemy is in spot, return True
-            else:
-                return True
+    def candidate_moves(self, board):
+        """Yields every square the advisor can move to. It moves one point diagonally inside the castle."""
+        for end in ADVISOR_MOVES[self._side][self._square]:
+            if not self._is_friend(board, end):
+                yield end
+
+    def attacks(self, board):
+        """Returns the squares the advisor attacks. They do not depend on any other square."""
+        return _mask(ADVISOR_MOVES[self._side][self._square]), 0
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str('\u001b[41m A \u001b[0m')
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m A \u001b[0m')
 
 
 class General(Pieces):
     """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
-    def __init__(self, color, position):
-        """Initializes the General piece. Updates the piece_type attribute, which is set to the name of the class."""
-        super().__init__(color, position)
-        self._piece_type = 'general'
-
-    def move(self, start, end, board):
-        """A move method for the general. Takes as parameters the starting position, the ending position, and
-        the game board. The general must stay in the castle. It also cannot be in the same column as the enemy
-        general without another piece in-between. """
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
-        letter_to_num = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        blocking_pieces = 0
-
-        # Set possible_moves list based on color
-        if self.get_color() == 'red':
-            possible_moves = ['d1', 'd2', 'd3', 'e1', 'e2', 'e3', 'f1', 'f2', 'f3']
-        else:
-            possible_moves = ['d10', 'd9', 'd8', 'e10', 'e9', 'e8', 'f10', 'f9', 'f8']
-
-        # Check if the requested move would put the general in the line of sight of the enemy general
-        for row in range(len(board[end_col])):
-
-            # Check blocking pieces for red general
-            if self.get_color() == 'red':
-                if board[end_col][row] != ' ' and board[end_col][row].get_piece_type() != 'general' and row > end_row:
-                    blocking_pieces += 1
+    __slots__ = ()
+    _kind = GENERAL
 
-            # Checking blocking pieces for black general
-            else:
-                if board[end_col][row] != ' ' and board[end_col][row].get_piece_type() != 'general' and row < end_row:
-                    blocking_pieces += 1
-
-            # Check if same column as general and then check if there are blocking pieces between them
-            if board[end_col][row] != ' ' and board[end_col][row].get_piece_type() == 'general':
-                if board[end_col][row].get_color() != self.get_color():
-                    if blocking_pieces == 0:
-                        return False
-
-        # Ensure that requested location is in the move list
-        if end not in possible_moves:
-            return False
+    def can_move(self, start, end, board):
+        """A move check for the general. Takes as parameters the starting square, the ending square, and the game
+        board. The general must stay in the castle. It also cannot be in the same column as the enemy general
+        without another piece in-between. """
+        cells = board.cells
 
-        # Ensure that orthogonal move is within one space in any direction
-        elif abs(letter_to_num[start_col] - letter_to_num[end_col]) > 1 or abs(start_row - end_row) > 1:
+        # Ensure that requested location is one orthogonal step inside the castle
+        if end not in GENERAL_MOVES[self._side][start]:
             return False
 
-        # If space is empty, return True
-        elif board[end_col][end_row] == ' ':
-            return True
-
+        # Check if the requested move would put the general in the line of sight of the enemy general. Walk up the
+        # column towards the enemy, ignoring the square the general is leaving
+        if self._side == 0:
+            enemy_general = GENERAL | BLACK
         else:
+            enemy_general = GENERAL
+        for square in RAYS[end][self._side]:
+            if cells[square] != EMPTY and square != start:
+                if cells[square] == enemy_general:
+                    return False
+                break
+
+        # If space is empty or holds an enemy, return True
+        return not self._is_friend(board, end)
+
+    def candidate_moves(self, board):
+        """Yields every square the general can move to. It moves one point orthogonally inside the castle, but not
+        onto a column where it would face the enemy general."""
+        cells = board.cells
+        start = self._square
+        if self._side == 0:
+            enemy_general = GENERAL | BLACK
+        else:
+            enemy_general = GENERAL
+        for end in GENERAL_MOVES[self._side][start]:
+            if self._is_friend(board, end):
+                continue
+            facing = False
+            for square in RAYS[end][self._side]:
+                if cells[square] != EMPTY and square != start:
+                    facing = cells[square] == enemy_general
+                    break
+            if not facing:
+                yield end
 
-            # check if piece is location is friendly
-            if board[end_col][end_row].get_color() == self.get_color():
-                return False
-
-            # If enemy piece, return True
-            else:
-                return True
+    def attacks(self, board):
+        """Returns the squares the general attacks. They do not depend on any other square. Facing the enemy general
+        down an open column is handled by XiangqiGame.general_los, not here."""
+        return _mask(GENERAL_MOVES[self._side][self._square]), 0
 
     def possible_moves(self):
-        if self.get_color() == 'red':
-            return ['d1', 'd2', 'd3', 'e1', 'e2', 'e3', 'f1', 'f2', 'f3']
-        else:
-            return ['d1', 'd9', 'd8', 'e10', 'e9', 'e8', 'f10', 'f9', 'f8']
+        """Returns the names of the points in the general's castle"""
+        return [SQUARE_NAMES[square] for square in range(90) if PALACE[self._side] >> square & 1]
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str('\u001b[41m G \u001b[0m')
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m G \u001b[0m')
 
 
 class Canon(Pieces):
     """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
-    def __init__(self, color, position):
-        """Initializes the Canon piece. Updates the attribute piece_type, which is set to the name of the class."""
-        super().__init__(color, position)
-        self._piece_type = 'canon'
-
-    def move(self, start, end, board):
-        """Attempts to move the canon piece if possible. The canon moves in the same manner as the Rook. However,
-        it needs to jump over one other piece to eliminate an enemy. Takes as a parameters the starting position,
-        the ending position, and the board."""
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
-        jump = False
-        jumped_pieces = 0
-
-        # Check if moving within the same column
-        if start_col == end_col:
-
-            # If the row also does not change, return False
-            if start_row == end_row:
-                return False
-
-            # If moving forward (for red) or backward (for black)
-            elif start_row < end_row:
-
-                # If the new position is empty,
-                if board[end_col][end_row] == ' ':
-
-                    # Checking if piece is blocked on the way to desired location
-                    for index in range(start_row + 1, end_row):
-                        if board[end_col][index] != ' ':
-                            return False
-                    return True
-
-                # Otherwise, check whose piece is there
-                else:
+    __slots__ = ()
+    _kind = CANON
 
-                    # If same team, can't move, return False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Count how many pieces the canon jumps over
-                    else:
-                        for index in range(start_row + 1, end_row):
-                            if board[end_col][index] != ' ':
-                                jump = True
-                                jumped_pieces += 1
-
-                        # If only one, return True
-                        if jump is True and jumped_pieces == 1:
-                            return True
-
-                        # Otherwise, return False
-                        else:
-                            return False
-
-            # If moving backwards (for red) or forwards (for black)
-            elif start_row > end_row:
-
-                # If the new position is empty,
-                if board[end_col][end_row] == ' ':
-
-                    # Checking if piece is blocked on the way to desired location
-                    for index in range(start_row - 1, end_row, -1):
-                        if board[end_col][index] != ' ':
-                            return False
-                    return True
-
-                else:
-                    # Otherwise, check which color the piece is. If same, can't move
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-                    else:
+    def can_move(self, start, end, board):
+        """Checks if the canon piece can move. The canon moves in the same manner as the Rook. However, it needs to
+        jump over one other piece to eliminate an enemy. Takes as a parameters the starting square, the ending
+        square, and the board."""
+        start_row, start_col = divmod(start, 9)
+        end_row, end_col = divmod(end, 9)
+        cells = board.cells
 
-                        # Count number of pieces jumped over
-                        for index in range(start_row - 1, end_row, -1):
-                            if board[end_col][index] != ' ':
-                                jump = True
-                                jumped_pieces += 1
-
-                        # If only one, return True
-                        if jump is True and jumped_pieces == 1:
-                            return True
-
-                        # Otherwise, return False
-                        else:
-                            return False
+        # The canon has to stay in the same column or the same row, and has to move
+        if start == end or (start_col != end_col and start_row != end_row):
+            return False
 
-        # If the piece is moving by staying in the same row (left to right)
+        # Squares are 9 apart along a column and 1 apart along a row
+        if start_col == end_col:
+            step = 9 if end > start else -9
         else:
+            step = 1 if end > start else -1
 
-            # Ensures that rows are different
-            if start_row != end_row:
-                return False
-
-            # If moving to the right
-            elif start_col < end_col:
-
-                # If the position is empty, check if canon is blocked
-                if board[end_col][start_row] == ' ':
-                    for index in board:
-
-                        # Ignore columns to the left of the starting column since we are moving to the right
-                        if index <= start_col:
-                            continue
-
-                        # Ensure that the columns leading up to the desired position are empty
-                        elif index < end_col:
-                            if board[index][end_row] != ' ':
-                                return False
-
-                        # Ignore columns beyond the ending column
-                        elif index > end_col:
-                            break
-
-                    # If not blocked on the way to empty space, return True
-                    return True
-
-                else:
-
-                    # Otherwise, if the occupying piece is a friendly piece, Rook is blocked and returns False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # If it is enemy piece, check if it jumps one piece
-                    else:
-                        for index in board:
-
-                            # Ignore columns to the left of the starting column since we are moving to the right
-                            if index <= start_col:
-                                continue
-
-                            # Count how many pieces the canon jumps over
-                            elif index < end_col:
-                                if board[index][end_row] != ' ':
-                                    jump = True
-                                    jumped_pieces += 1
-                            elif index > end_col:
-                                break
-
-                        # Ensure that canon jumps over one piece
-                        if jump is True and jumped_pieces == 1:
-                            return True
-
-                        # If not, return False
-                        else:
-                            return False
-
-            # If moving to the left
-            elif start_col > end_col:
-
-                # If space is empty
-                if board[end_col][end_row] == ' ':
-                    for index in board:
-
-                        # Ignore columns "greater than" the start column
-                        if index >= start_col:
-                            break
-
-                        # Ignore columns beyond the ending column
-                        elif index <= end_col:
-                            continue
-
-                        # Ensure that path is not blocked by any piece
-                        elif end_col < index < start_col:
-                            if board[index][end_row] != ' ':
-                                return False
-
-                    # If not blocked on the way to empty space, return True
-                    return True
+        # Count how many pieces the canon jumps over
+        jumped_pieces = 0
+        for square in range(start + step, end, step):
+            if cells[square] != EMPTY:
+                jumped_pieces += 1
 
-                else:
+        # If the new position is empty, the path has to be clear
+        if cells[end] == EMPTY:
+            return jumped_pieces == 0
 
-                    # If not, check if it is a friend piece. If so, rook is blocked. return False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
+        # If same team, can't move, return False
+        elif self._is_friend(board, end):
+            return False
 
-                    # When space occupied by enemy piece
+        # An enemy can only be captured by jumping exactly one piece
+        else:
+            return jumped_pieces == 1
+
+    def candidate_moves(self, board):
+        """Yields every square the canon can move to. Walks each of the four rays, yielding empty squares until the
+        first piece (the screen), and then the first piece behind the screen if it is an enemy."""
+        row, col = divmod(self._square, 9)
+        cells = board.cells
+        for col_step, row_step in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            next_col = col + col_step
+            next_row = row + row_step
+            screen = False
+            while 0 <= next_col < 9 and 0 <= next_row < 10:
+                square = next_row * 9 + next_col
+                if not screen:
+                    if cells[square] == EMPTY:
+                        yield square
                     else:
-
-                        # Need to check if canon jumps over a piece
-                        for index in board:
-
-                            # Ignore columns "greater than" the start column
-                            if index >= start_col:
-                                break
-
-                            # Ignore columns beyond the ending column
-                            elif index <= end_col:
-                                continue
-
-                            # Count number of pieces that the canon jumps over
-                            elif end_col < index < start_col:
-                                if board[index][end_row] != ' ':
-                                    jump = True
-                                    jumped_pieces += 1
-
-                        # If canon jumps only one piece, return True
-                        if jump is True and jumped_pieces == 1:
-                            return True
-
-                        # Otherwise return False
-                        else:
-                            return False
+                        screen = True
+                elif cells[square] != EMPTY:
+                    if not self._is_friend(board, square):
+                        yield square
+                    break
+                next_col += col_step
+                next_row += row_step
+
+    def attacks(self, board):
+        """Returns the squares the canon attacks and the squares they depend on. The canon attacks the squares
+        behind the first piece on each ray (the screen) up to and including the next piece, and depends on every
+        square it looks at along the way."""
+        cells = board.cells
+        targets = 0
+        watched = 0
+        for ray in RAYS[self._square]:
+            screen = False
+            for square in ray:
+                watched |= 1 << square
+                if screen:
+                    targets |= 1 << square
+                    if cells[square] != EMPTY:
+                        break
+                elif cells[square] != EMPTY:
+                    screen = True
+        return targets, watched
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str("\u001b[41m C \u001b[0m")
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m C \u001b[0m')
 
 
 class Soldier(Pieces):
     """A subclass of Pieces for the Rook in the Chinese Checkers board game"""
 
+    __slots__ = ('_crossed_river',)
+    _kind = SOLDIER
+
     def __init__(self, color, position):
-        """Initializes the Soldier piece. Adds two new attributes: crossed_river and piece_type. Crossed river
-        indicates if the soldier has crossed the river and will allow it to move sideways. Piece_type is the name
-        of the class."""
+        """Initializes the Soldier piece. Adds a new attribute, crossed_river, which indicates if the soldier has
+        crossed the river and will allow it to move sideways."""
         super().__init__(color, position)
         self._crossed_river = False
-        self._piece_type = 'soldier'
 
     def get_crossed_river(self):
         """A get method for crossed_river attribute"""
         return self._crossed_river
 
-    def move(self, start, end, board):
-        """A move method for the soldier piece on the board. It moves the soldier piece if possible. Takes as a
-        parameter the start position, end position, and the board state. The soldier moves one point forward. never
-        backward. Once it crosses the river, it can also move one point sideways"""
-        start_col = start[0]
-        start_row = int(start[1:]) - 1
-        end_col = end[0]
-        end_row = int(end[1:]) - 1
-        letter_to_num = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f':  6, 'g': 7, 'h': 8, 'i': 9}
-
-        # Checks to see if the soldier can move sideways yet
-        if start_col != end_col and self.get_crossed_river() is False:
-            return False
+    def set_crossed_river(self, crossed):
+        """A set method for crossed_river attribute"""
+        self._crossed_river = crossed
+
+    def can_move(self, start, end, board):
+        """A move check for the soldier piece on the board. Takes as a parameter the start square, end square, and
+        the board state. The soldier moves one point forward. never backward. Once it crosses the river, it can
+        also move one point sideways"""
 
-        # Checks that the requested move is within one space
-        elif abs(start_row - end_row) > 1 or abs(letter_to_num[start_col] - letter_to_num[end_col]) > 1:
+        # Checks that the requested move is one space forward, or sideways once the soldier has crossed the river
+        if end != SOLDIER_FORWARD[self._side][start] and not (self._crossed_river and end in SIDEWAYS[start]):
             return False
 
+        # If blocked by teammate, return False. Otherwise, return True
         else:
-
-            # Makes sure soldier is not moving backwards
-            if self.get_color() == 'red' and start_row > end_row:
-                return False
-            elif self.get_color() == 'black' and start_row < end_row:
-                return False
-
-            # If moving forward
-            if start_col == end_col and start_row != end_row:
-
-                # And position is empty, return True
-                if board[end_col][end_row] == ' ':
-
-                    # If river is crossed, update attribute
-                    if self.get_color() == 'red' and end_row >= 5:
-                        self._crossed_river = True
-                    elif self.get_color() == 'black' and end_row <= 4:
-                        self._crossed_river = True
-                    return True
-
-                else:
-
-                    # If blocked by teammate, return False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # If its an enemy, return True
-                    else:
-
-                        # If river is crossed, update attribute
-                        if self.get_color() == 'red' and end_row >= 5:
-                            self._crossed_river = True
-                        elif self.get_color() == 'black' and end_row <= 4:
-                            self._crossed_river = True
-                        return True
-
-            # if moving sideways
-            elif start_col != end_col and start_row == end_row:
-
-                # And position is empty, return True
-                if board[end_col][start_row] == ' ':
-                    return True
-
-                else:
-
-                    # If blocked by a teammate, return False
-                    if board[end_col][end_row].get_color() == self.get_color():
-                        return False
-
-                    # Otherwise, return True
-                    else:
-                        return True
-
-            # Not moving forwards or sideways
-            else:
-                return False
+            return not self._is_friend(board, end)
+
+    def candidate_moves(self, board):
+        """Yields every square the soldier can move to. It moves one point forward, and one point sideways once it
+        has crossed the river."""
+        forward = SOLDIER_FORWARD[self._side][self._square]
+        if forward is not None and not self._is_friend(board, forward):
+            yield forward
+        if self._crossed_river:
+            for end in SIDEWAYS[self._square]:
+                if not self._is_friend(board, end):
+                    yield end
+
+    def attacks(self, board):
+        """Returns the squares the soldier attacks. They do not depend on any other square."""
+        targets = 0
+        forward = SOLDIER_FORWARD[self._side][self._square]
+        if forward is not None:
+            targets |= 1 << forward
+        if self._crossed_river:
+            targets |= _mask(SIDEWAYS[self._square])
+        return targets, 0
 
     def __repr__(self):
-        if self._color == 'red':
+        if self._side == 0:
             return str('\u001b[41m S \u001b[0m')
-        elif self._color == 'black':
+        else:
             return str('\u001b[42m S \u001b[0m')
 
 
+# The opening position in Xiangqi FEN (see XiangqiGame.from_fen)
+START_FEN = 'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1'
+
+# The piece class for each FEN letter, including the alternative letters E (elephant) and H (knight), and the letter
+# written for each piece code
+FEN_PIECES = {'k': General, 'a': Advisor, 'b': Elephant, 'e': Elephant, 'n': Knight, 'h': Knight, 'r': Rook,
+              'c': Canon, 'p': Soldier}
+FEN_LETTERS = {GENERAL: 'k', ADVISOR: 'a', ELEPHANT: 'b', KNIGHT: 'n', ROOK: 'r', CANON: 'c', SOLDIER: 'p'}
+
+# The order the pieces of a color are listed in
+PIECE_ORDER = {'rook': 0, 'knight': 1, 'elephant': 2, 'advisor': 3, 'general': 4, 'canon': 5, 'soldier': 6}
+
+# The number of times a position must be reached for the repetition to end the game
+REPETITION_LIMIT = 3
+
+
+def parse_fen(fen):
+    """Reads a Xiangqi FEN (see XiangqiGame.from_fen) and returns the (square, letter) pairs of its pieces, the
+    color to move, the plies since the last capture and the move number. Raises ValueError if it is malformed. It
+    only reads the position: unlike from_fen, it does not check that the position could come about in a game."""
+    fields = fen.split()
+    if not fields:
+        raise ValueError('empty FEN')
+    rows = fields[0].split('/')
+    if len(rows) != 10:
+        raise ValueError('FEN must have 10 rows: ' + fen)
+    placement = []
+    generals = {'K': 0, 'k': 0}
+    for index, text in enumerate(rows):
+        row = 9 - index
+        column = 0
+        for letter in text:
+            if letter.isdigit():
+                column += int(letter)
+            elif letter.lower() in FEN_PIECES and column < 9:
+                placement.append((row * 9 + column, letter))
+                if letter in generals:
+                    generals[letter] += 1
+                column += 1
+            else:
+                raise ValueError('bad FEN row ' + repr(text) + ': ' + fen)
+        if column != 9:
+            raise ValueError('FEN row ' + repr(text) + ' does not have 9 points: ' + fen)
+    if generals['K'] != 1 or generals['k'] != 1:
+        raise ValueError('FEN must have one general of each color: ' + fen)
+
+    # The side to move, then two unused fields, the plies since the last capture and the move number
+    if len(fields) < 2 or fields[1] in ('w', 'r'):
+        turn = 'red'
+    elif fields[1] == 'b':
+        turn = 'black'
+    else:
+        raise ValueError('bad side to move ' + repr(fields[1]) + ': ' + fen)
+    try:
+        halfmove = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError('bad move counters: ' + fen)
+    return placement, turn, halfmove, fullmove
+
+
 class XiangqiGame:
     """This initializes the Xiangqi board game by setting up the board. Red pieces are uppercase. Black pieces are
     lowercase. Red goes first."""
 
-    def __init__(self):
-        """Initializes the game. The board is stored in a dictionary by column. Each index in the dictionary is
-        the letter a-i. The game state is initialized to UNFINISHED. And the first player's turn is set to red.
-        Uppercase letters are red pieces. Lowercase letters are black pieces"""
-        R1 = Rook('red', 'a1')
-        R2 = Rook('red', 'i1')
-        K1 = Knight('red', 'b1')
-        K2 = Knight('red', 'h1')
-        E1 = Elephant('red', 'c1')
-        E2 = Elephant('red', 'g1')
-        A1 = Advisor('red', 'd1')
-        A2 = Advisor('red', 'f1')
-        G = General('red', 'e1')
-        C1 = Canon('red', 'b3')
-        C2 = Canon('red', 'h3')
-        S1 = Soldier('red', 'a4')
-        S2 = Soldier('red', 'c4')
-        S3 = Soldier('red', 'e4')
-        S4 = Soldier('red', 'g4')
-        S5 = Soldier('red', 'i4')
-        r1 = Rook('black', 'a10')
-        r2 = Rook('black', 'i10')
-        k1 = Knight('black', 'b10')
-        k2 = Knight('black', 'h10')
-        e1 = Elephant('black', 'c10')
-        e2 = Elephant('black', 'g10')
-        a1 = Advisor('black', 'd10')
-        a2 = Advisor('black', 'f10')
-        g = General('black', 'e10')
-        c1 = Canon('black', 'b8')
-        c2 = Canon('black', 'h8')
-        s1 = Soldier('black', 'a7')
-        s2 = Soldier('black', 'c7')
-        s3 = Soldier('black', 'e7')
-        s4 = Soldier('black', 'g7')
-        s5 = Soldier('black', 'i7')
-
-        self._board = {
-            'a': [R1, ' ', ' ', S1, ' ', ' ', s1, ' ', ' ', r1],
-            'b': [K1, ' ', C1, ' ', ' ', ' ', ' ', c1, ' ', k1],
-            'c': [E1, ' ', ' ', S2, ' ', ' ', s2, ' ', ' ', e1],
-            'd': [A1, ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', a1],
-            'e': [G, ' ', ' ', S3, ' ', ' ', s3, ' ', ' ', g],
-            'f': [A2, ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', a2],
-            'g': [E2, ' ', ' ', S4, ' ', ' ', s4, ' ', ' ', e2],
-            'h': [K2, ' ', C2, ' ', ' ', ' ', ' ', c2, ' ', k2],
-            'i': [R2, ' ', ' ', S5, ' ', ' ', s5, ' ', ' ', r2]
-        }
+    def __init__(self, engine='objects', fen=None):
+        """Initializes the game. The board is a flat array of the 90 points (see Board), which can still be indexed
+        by column letter a-i. The pieces are set up from fen (see from_fen), or in the opening position if it is not
+        given, so the game state is UNFINISHED and the first player's turn is red. Uppercase letters are red pieces.
+        Lowercase letters are black pieces. engine picks how moves and checks are worked out: 'objects' uses the
+        piece classes and looks for checks out from the general, 'bitboard' uses the BitboardEngine in bitboard.py.
+        Both give the same results. The bitboard engine is there to cross-check the piece classes: it is updated on
+        top of the game's own board, so it is the slower of the two."""
+        if fen is None:
+            fen = START_FEN
+        placement, turn, halfmove, fullmove = parse_fen(fen)
+
+        # Create the pieces of each color ordered by type and then square, which for the opening position is the
+        # order they were always listed in
+        red_pieces = []
+        black_pieces = []
+        for square, letter in placement:
+            if letter.isupper():
+                red_pieces.append(FEN_PIECES[letter.lower()]('red', SQUARE_NAMES[square]))
+            else:
+                black_pieces.append(FEN_PIECES[letter]('black', SQUARE_NAMES[square]))
+        for pieces in (red_pieces, black_pieces):
+            pieces.sort(key=lambda piece: (PIECE_ORDER[piece.get_piece_type()], piece.get_square()))
+            for piece in pieces:
+                if piece.get_piece_type() == 'soldier':
+                    # Soldiers never move back, so one standing across the river has crossed it
+                    if piece.get_color() == 'red':
+                        piece.set_crossed_river(piece.get_square() >= 45)
+                    else:
+                        piece.set_crossed_river(piece.get_square() < 45)
+                elif piece.get_piece_type() == 'general':
+                    if piece.get_color() == 'red':
+                        self._red_general = piece
+                    else:
+                        self._black_general = piece
+
         self._game_state = 'UNFINISHED'
-        self._turn = 'red'
-        self._red_pieces_left = [R1, R2, K1, K2, E1, E2, A1, A2, G, C1, C2, S1, S2, S3, S4, S5]
-        self._black_pieces_left = [r1, r2, k1, k2, e1, e2, a1, a2, g, c1, c2, s1, s2, s3, s4, s5]
-        self._red_general = G
-        self._black_general = g
+        self._turn = turn
+        self._red_pieces_left = red_pieces
+        self._black_pieces_left = black_pieces
+        self._history = []
+        self._searcher = None
+        self._parallel_searcher = None
+        self._book = None
+        self._tablebase = None
+        self._legality = None
+        self._legality_key = None
+        self._halfmove_clock = halfmove
+        self._fullmove_number = fullmove
+        self._hash = 0
+        if turn == 'black':
+            self._hash = ZOBRIST_BLACK_TO_MOVE
+        self._score = 0
+        self._board = Board()
+        for piece in self._red_pieces_left + self._black_pieces_left:
+            piece.set_game(self)
+            self._board.place(piece, piece.get_square())
+            self._hash ^= ZOBRIST[piece.get_code()][piece.get_square()]
+            self._score += SQUARE_VALUES[piece.get_code()][piece.get_square()]
+
+        # How many times each position has been reached, by hash, so that repetitions are found in one lookup
+        self._repetitions = {self._hash: 1}
+        self._attacks_key = None
+        if engine == 'objects':
+            self._engine = None
+        elif engine == 'bitboard':
+            from bitboard import BitboardEngine
+            self._engine = BitboardEngine(self._board.cells)
+        else:
+            raise ValueError('unknown engine: ' + str(engine))
+
+        # The player who just moved cannot have left their general in check or facing the enemy general
+        if turn == 'red':
+            enemy = 'black'
+        else:
+            enemy = 'red'
+        if self.general_los():
+            raise ValueError('the generals face each other: ' + fen)
+        if self.is_in_check(enemy):
+            raise ValueError('the side not to move is in check: ' + fen)
+
+        # A position loaded with no legal moves for the player to move is already lost
+        if fen != START_FEN and not self._has_legal_move(turn):
+            if turn == 'red':
+                self._game_state = 'BLACK_WON'
+            else:
+                self._game_state = 'RED_WON'
+
+    @classmethod
+    def from_fen(cls, fen, engine='objects'):
+        """Creates a game from a position in Xiangqi FEN (the WXF/UCCI notation): the ten rows from black's side
+        (row 10) down to red's side, separated by '/', each listing the points from column a to i. A piece is a
+        letter (K general, A advisor, B or E elephant, N or H knight, R rook, C canon, P soldier), uppercase for red
+        and lowercase for black, and a digit counts empty points. The side to move follows ('w' or 'r' for red, 'b'
+        for black), then optionally two unused '-' fields, the plies since the last capture and the move number.
+        Raises ValueError if the position cannot be read, does not have exactly one general of each color, or leaves
+        the side not to move in check or with the generals facing each other."""
+        return cls(engine, fen)
+
+    def to_fen(self):
+        """Returns the position in Xiangqi FEN (see from_fen). Red to move is written as 'w'."""
+        cells = self._board.cells
+        rows = []
+        for row in range(9, -1, -1):
+            text = ''
+            empty = 0
+            for square in range(row * 9, row * 9 + 9):
+                code = cells[square]
+                if code == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                if code & BLACK:
+                    text += FEN_LETTERS[code & ~BLACK]
+                else:
+                    text += FEN_LETTERS[code].upper()
+            if empty:
+                text += str(empty)
+            rows.append(text)
+
+        # The plies since the last capture and the move number carry on from those the game started with
+        halfmove = 0
+        for record in reversed(self._history):
+            if record[2] is not None:
+                break
+            halfmove += 1
+        else:
+            halfmove += self._halfmove_clock
+        plies = len(self._history)
+        if self._history and self._history[0][4] == 'black':
+            plies += 1
+        fullmove = self._fullmove_number + plies // 2
+        if self._turn == 'red':
+            turn = 'w'
+        else:
+            turn = 'b'
+        return '/'.join(rows) + ' ' + turn + ' - - ' + str(halfmove) + ' ' + str(fullmove)
 
     def get_game_state(self):
         """A get method that returns the current game state."""
@@ -909,178 +1097,409 @@ class XiangqiGame:
         """A get method for the black general"""
         return self._black_general
 
+    def get_hash(self):
+        """A get method for the 64-bit Zobrist hash of the position, covering every piece and whose turn it is"""
+        return self._hash
+
+    def evaluate(self):
+        """Returns the static evaluation of the position from the point of view of the player whose turn it is: the
+        material and piece-square values (see SQUARE_VALUES) of their pieces less those of the other player's. It is
+        kept up to date by push() and pop(), so this costs nothing."""
+        if self._turn == 'red':
+            return self._score
+        return -self._score
+
+    def get_book(self):
+        """A get method for the opening book consulted by search(), or None"""
+        return self._book
+
+    def set_book(self, book):
+        """A set method for the opening book (see book.OpeningBook) that search() looks in before searching. None
+        turns the book off."""
+        self._book = book
+
+    def get_tablebase(self):
+        """A get method for the endgame tablebase consulted by the game and its search, or None"""
+        return self._tablebase
+
+    def set_tablebase(self, tablebase):
+        """A set method for the endgame tablebase (see tablebase.Tablebase). Positions it has a table for are looked
+        up instead of searched, and game over is read from it. None turns the tablebase off."""
+        self._tablebase = tablebase
+
+    def get_repetitions(self):
+        """Returns the number of times the current position has been reached in the game"""
+        return self._repetitions.get(self._hash, 0)
+
+    def get_plies(self):
+        """Returns the number of moves played since the game was created, or since its position was loaded"""
+        return len(self._history)
+
     def set_turn(self, color):
         """A set method to set the proper player's turn"""
+        if color != self._turn:
+            self._forget_position()
+            self._hash ^= ZOBRIST_BLACK_TO_MOVE
+            self._repetitions[self._hash] = self._repetitions.get(self._hash, 0) + 1
         self._turn = color
 
     def make_move(self, start, end):
         """A method that moves a piece from a starting position to the ending position. It first checks to make sure
-        the proper player is moving. Then, it moves the piece if possible."""
-        start_column = start[0]
-        start_row = int(start[1:]) - 1
-        end_column = end[0]
-        end_row = int(end[1:]) - 1
+        the proper player is moving. Then, it moves the piece if possible. Positions may be square names such as
+        'e1' or integer square indices."""
+        start = SQUARES.get(start, start)
+        end = SQUARES.get(end, end)
+
+        # Check that both positions are on the board
+        if start not in range(90) or end not in range(90):
+            return False
+
         board = self.get_board()
-        piece = board[start_column][start_row]
-        enemy = board[end_column][end_row]
+        piece = board.get(start)
 
         # Check if game is still going
         if self.get_game_state() != 'UNFINISHED':
             return False
 
         # Check that a piece was selected
-        elif piece == ' ':
+        elif piece is None:
             return False
 
         # Check that it is that piece's turn
         elif self.get_turn() != piece.get_color():
             return False
 
-        else:
-            # Try to make a move with the selected piece
-            move = piece.move(start, end, board)
-
-            # If the .move method returns False, move is invalid, return False
-            if move is False:
-                return False
+        # Try to make a move with the selected piece. If the .move method returns False, move is invalid
+        elif not self._can_move(piece, start, end):
+            return False
 
-            # Otherwise, empty the starting position, move to new position, update positions, and update the game state
-            else:
-                if enemy != ' ':
-                    enemy.update_position('z', 0)
-                board[start_column][start_row] = ' '
-                board[end_column][end_row] = piece
-                piece.update_position(end_column, end_row)
-
-                # Check if move puts general in line of sight of other general or if move puts general in check
-                if self.general_los() or self.is_in_check(piece.get_color()):
-
-                    # Move is then not legal, must go back and return False
-                    if enemy != ' ':
-                        enemy.update_position(end_column, end_row)
-                    board[end_column][end_row] = enemy
-                    board[start_column][start_row] = piece
-                    piece.update_position(start_column, start_row)
-                    return False
+        # Otherwise, make the move
+        self.push((start, end))
 
-                # Otherwise, update game state and return True
-                else:
-                    self.update_game_state()
-                    return True
+        # Check if move puts general in line of sight of other general or if move puts general in check
+        if self.general_los() or self.is_in_check(piece.get_color()):
 
-    def is_in_check(self, color):
-        """A method that checks whether the indicated color's general is in check"""
-        red_general = self.get_red_gen()
-        black_general = self.get_black_gen()
+            # Move is then not legal, must go back and return False
+            self.pop()
+            return False
 
-        # Check color
-        if color.lower() == 'red':
+        # Otherwise, update game state and return True
+        self.update_game_state()
+        return True
 
-            # Check if any black piece has a legal move to eliminate the red general
-            for piece in self.get_black_pieces_left():
-                if piece.get_position() == 'DEAD':
+    def push(self, move):
+        """Plays a move without checking that it is legal, and saves what is needed to take it back with pop(). The
+        move is a (start, end) pair of integer squares or square names. The captured piece is taken off the board
+        and out of its pieces left list, the turn passes to the other player and the hash is updated."""
+        start, end = move
+        start = SQUARES.get(start, start)
+        end = SQUARES.get(end, end)
+        board = self._board
+        piece = board.pieces[start]
+        captured = board.pieces[end]
+        captured_index = None
+        crossed_river = None
+
+        # Take the captured piece out of the game, remembering where it was in its list
+        if captured is not None:
+            if captured.get_side() == 0:
+                pieces_left = self._red_pieces_left
+            else:
+                pieces_left = self._black_pieces_left
+            captured_index = pieces_left.index(captured)
+            del pieces_left[captured_index]
+            captured.set_square(None)
+
+        # A soldier that lands across the river can move sideways from now on
+        if piece.get_code() & 7 == SOLDIER:
+            crossed_river = piece.get_crossed_river()
+            if piece.get_side() == 0 and end >= 45:
+                piece.set_crossed_river(True)
+            elif piece.get_side() == 1 and end < 45:
+                piece.set_crossed_river(True)
+
+        board.clear(start)
+        board.place(piece, end)
+        piece.set_square(end)
+        if self._engine is not None:
+            self._engine.push(start, end)
+        self._history.append((start, end, captured, captured_index, self._turn, crossed_river, self._game_state,
+                              self._hash, self._score))
+
+        # Update the hash and the evaluation for the piece leaving start, the captured piece leaving end, the piece
+        # arriving on end and the change of turn
+        code = board.cells[end]
+        self._hash ^= ZOBRIST[code][start] ^ ZOBRIST[code][end] ^ ZOBRIST_BLACK_TO_MOVE
+        self._score += SQUARE_VALUES[code][end] - SQUARE_VALUES[code][start]
+        if captured is not None:
+            self._hash ^= ZOBRIST[captured.get_code()][end]
+            self._score -= SQUARE_VALUES[captured.get_code()][end]
+        if self._turn == 'red':
+            self._turn = 'black'
+        else:
+            self._turn = 'red'
+        self._repetitions[self._hash] = self._repetitions.get(self._hash, 0) + 1
+
+    def pop(self):
+        """Takes back the last move played with push() or make_move() and returns it as a (start, end) pair of
+        integer squares. The captured piece, the turn, the soldier's crossed_river flag, the game state, the hash and
+        the evaluation are all restored."""
+        start, end, captured, captured_index, turn, crossed_river, game_state, position_hash, score = \
+            self._history.pop()
+        board = self._board
+        piece = board.pieces[end]
+        board.place(piece, start)
+        piece.set_square(start)
+        if crossed_river is not None:
+            piece.set_crossed_river(crossed_river)
+
+        # Put the captured piece back on the board and in its list
+        if captured is None:
+            board.clear(end)
+        else:
+            board.place(captured, end)
+            captured.set_square(end)
+            if captured.get_side() == 0:
+                self._red_pieces_left.insert(captured_index, captured)
+            else:
+                self._black_pieces_left.insert(captured_index, captured)
+
+        if self._engine is not None:
+            self._engine.pop()
+        self._forget_position()
+        self._turn = turn
+        self._game_state = game_state
+        self._hash = position_hash
+        self._score = score
+        return start, end
+
+    def _forget_position(self):
+        """Takes one count of the current position out of the repetition counts"""
+        count = self._repetitions[self._hash] - 1
+        if count:
+            self._repetitions[self._hash] = count
+        else:
+            del self._repetitions[self._hash]
+
+    def reset(self):
+        """Takes back every move played, returning the game to the position it was created with. The same piece
+        objects are reused, so one game can replay many recorded games one after another."""
+        while self._history:
+            self.pop()
+
+    def _can_move(self, piece, start, end):
+        """Checks whether the piece can move from start to end, using the bitboard engine if there is one"""
+        if self._engine is not None:
+            return self._engine.can_move(start, end)
+        return piece.can_move(start, end, self._board)
+
+    def _destinations(self, piece):
+        """Returns the squares the piece could move to (see Pieces.candidate_moves), using the bitboard engine if
+        there is one"""
+        if self._engine is not None:
+            return self._engine.destination_squares(piece.get_square())
+        return piece.candidate_moves(self._board)
+
+    def _attack_map(self):
+        """Returns the squares each color attacks, as a dict of bitmasks keyed by color (see Pieces.attacks). It is
+        worked out from the pieces only when asked for, and kept until the position changes. Checks and legal moves
+        do not need it (see checkers and _find_legality), so making moves never does."""
+        if self._attacks_key != self._hash:
+            board = self._board
+            self._attacked = {'red': 0, 'black': 0}
+            for color, pieces in (('red', self._red_pieces_left), ('black', self._black_pieces_left)):
+                for piece in pieces:
+                    self._attacked[color] |= piece.attacks(board)[0]
+            self._attacks_key = self._hash
+        return self._attacked
+
+    def checkers(self, color):
+        """Returns the bitmask of the enemy pieces giving check to the color's general. Rather than asking every
+        enemy piece, it looks out from the general: along its rank and file for a rook as the first piece or a canon
+        as the second, at the squares a knight could jump from with an empty leg and at the squares a soldier could
+        step from. The cost is the same however many pieces are on the board."""
+        side = SIDES[color]
+        enemy = (side ^ 1) << 3
+        if side == 0:
+            general_square = self._red_general.get_square()
+        else:
+            general_square = self._black_general.get_square()
+        cells = self._board.cells
+        found = 0
+        for ray in RAYS[general_square]:
+            screened = False
+            for square in ray:
+                code = cells[square]
+                if code == EMPTY:
                     continue
-                result = piece.move(piece.get_position(), red_general.get_position(), self.get_board())
-
-                # If a piece has a legal move to the general, then it is in check
-                if result is True:
-                    return True
-
-            # Otherwise, return False
-            return False
+                if screened:
+                    if code == CANON | enemy:
+                        found |= 1 << square
+                    break
+                if code == ROOK | enemy:
+                    found |= 1 << square
+                    break
+                screened = True
+        for origin, leg in KNIGHT_ORIGINS[general_square]:
+            if cells[origin] == KNIGHT | enemy and cells[leg] == EMPTY:
+                found |= 1 << origin
+        for origin in SOLDIER_ORIGINS[side ^ 1][general_square]:
+            if cells[origin] == SOLDIER | enemy:
+                found |= 1 << origin
+        return found
 
+    def is_in_check(self, color):
+        """A method that checks whether the indicated color's general is in check (see checkers)"""
+        if self._engine is not None:
+            return self._engine.in_check(color.lower())
+        return self.checkers(color.lower()) != 0
+
+    def is_attacked(self, square, color):
+        """Returns True if any piece of the given color attacks the square (a square name or integer index)"""
+        if self._engine is not None:
+            return self._engine.attacked(color) >> SQUARES.get(square, square) & 1 == 1
+        return self._attack_map()[color] >> SQUARES.get(square, square) & 1 == 1
+
+    def pinned_pieces(self, color):
+        """Returns the pieces of the given color that may not be safe to move off their square because they shield
+        their own general, as found by _find_legality: the only piece between a rook and the general, either piece
+        between a canon and the general, a piece on the leg of a knight aiming at the general and the only piece
+        between the two generals."""
+        if color == 'red':
+            pieces = self._red_pieces_left
         else:
+            pieces = self._black_pieces_left
+        pinned = self._get_legality(color)[0]
+        return [piece for piece in pieces if pinned >> piece.get_square() & 1]
 
-            # Check if any red piece has a legal move to the black general
-            for piece in self.get_red_pieces_left():
-                if piece.get_position() == 'DEAD':
+    def update_game_state(self):
+        """A method that updates the game state based on the board. It is called after a move has been made, when it
+        is already the other player's turn. The player to move has lost if they have no legal move, which is found
+        out by stopping at their first legal move. The pieces' possible moves are worked out later, when asked
+        for. With a tablebase (see set_tablebase) holding the position, the player to move has lost exactly when it
+        says they are mated now. A position reached for the REPETITION_LIMIT time ends the game as decided by
+        repetition_result()."""
+        found = None
+        if self._tablebase is not None:
+            found = self._tablebase.probe(self)
+        if found is not None:
+            has_legal_move = found != ('LOSS', 0)
+        else:
+            has_legal_move = self._has_legal_move(self.get_turn())
+
+        # If black has no legal moves available, Red wins
+        if not has_legal_move and self.get_turn() == 'black':
+            self._game_state = 'RED_WON'
+
+        # If red has no legal moves available, black wins
+        elif not has_legal_move:
+            self._game_state = 'BLACK_WON'
+
+        # The position has come round too many times, so the game ends by the repetition rules
+        elif self._repetitions[self._hash] >= REPETITION_LIMIT:
+            self._game_state = self.repetition_result()
+
+    def repetition_result(self):
+        """Decides a game whose current position has been reached before, by the Asian rules on repetition. The
+        moves since the position was last reached are taken back and replayed to see what each player did in the
+        cycle. A player who gave check with every move (perpetual check) loses, unless both did. Otherwise a player
+        whose every move made a new threat against the same enemy piece (perpetual chase) loses, unless both did. A
+        threat that stood before the move is not a chase, so leaving a piece attacked while shuffling is not. Any other
+        repetition is a draw. Returns 'RED_WON', 'BLACK_WON' or 'DRAW'. The cost is only that of the cycle's
+        moves, and nothing is spent on positions that do not repeat."""
+        position_hash = self._hash
+        cycle = []
+        while self._history:
+            cycle.append(self.pop())
+            if self._hash == position_hash:
+                break
+
+        checks = {'red': True, 'black': True}
+        chased = {'red': None, 'black': None}
+        for move in reversed(cycle):
+            color = self._turn
+            if color == 'red':
+                enemy = 'black'
+            else:
+                enemy = 'red'
+            threatened = self._chased_pieces(color)
+            self.push(move)
+            checks[color] = checks[color] and self.is_in_check(enemy)
+
+            # Only the threats the move itself made count towards a chase
+            threatened = self._chased_pieces(color) - threatened
+            if chased[color] is None:
+                chased[color] = threatened
+            else:
+                chased[color] &= threatened
+
+        # A perpetual check or chase by one player loses for that player
+        for rule in (checks, {color: bool(pieces) for color, pieces in chased.items()}):
+            if rule['red'] and not rule['black']:
+                return 'BLACK_WON'
+            if rule['black'] and not rule['red']:
+                return 'RED_WON'
+        return 'DRAW'
+
+    def _chased_pieces(self, color):
+        """Returns the set of enemy pieces the color threatens to win: pieces other than the general and soldiers
+        still on their own side that a rook, knight, canon, elephant or advisor of the color could capture, when
+        they are unprotected or worth more than the attacker. Threats by the general and soldiers are allowed by
+        the rules and are not counted."""
+        if color == 'red':
+            pieces = self._red_pieces_left
+            enemy = 'black'
+        else:
+            pieces = self._black_pieces_left
+            enemy = 'red'
+        board = self._board
+        chased = set()
+        for piece in pieces:
+            if piece.get_code() & 7 in (GENERAL, SOLDIER):
+                continue
+            for end in self._destinations(piece):
+                target = board.get(end)
+                if target is None or target.get_code() & 7 == GENERAL:
                     continue
-                result = piece.move(piece.get_position(), black_general.get_position(), self.get_board())
+                if target.get_code() & 7 == SOLDIER and not target.get_crossed_river():
+                    continue
+                if not self.is_attacked(end, enemy) or \
+                        PIECE_VALUES[target.get_code() & 7] > PIECE_VALUES[piece.get_code() & 7]:
+                    chased.add(target)
+        return chased
 
-                # If a piece has a legal move to the general, it is in check
-                if result is True:
+    def _has_legal_move(self, color):
+        """Returns True as soon as a legal move is found for the color, whether or not it is in check"""
+        if color == 'red':
+            pieces = self._red_pieces_left
+        else:
+            pieces = self._black_pieces_left
+        legality = self._get_legality(color)
+        for piece in pieces:
+            start = piece.get_square()
+            for end in self._destinations(piece):
+                if self._is_legal(piece, start, end, legality):
                     return True
-
-            # Otherwise, return False
-            return False
-
-    def update_game_state(self):
-        """A method that updates the game state based on the board"""
-
-        # Remove any pieces that were eliminate from the game from piece lists
-        for el in self.get_red_pieces_left():
-            if el.get_position() == 'DEAD':
-                self._red_pieces_left.remove(el)
-        for el in self.get_black_pieces_left():
-            if el.get_position() == 'DEAD':
-                self._black_pieces_left.remove(el)
-
-        # Update all possible moves
-        self.all_poss_moves()
-
-        # If red just went, check if black has any legal moves
-        if self.get_turn() == 'red':
-
-            # Change whose turn it is
-            self.set_turn('black')
-            possible_moves = 0
-            for piece in self.get_black_pieces_left():
-
-                # Check if any black piece has any legal moves (whether in check or not)
-                move_list = piece.get_possible_moves()
-
-                # If there is, increase possible_moves by 1
-                if len(move_list) > 0:
-                    possible_moves += 1
-                    break
-
-            # If no legal moves available, Red wins
-            if possible_moves == 0:
-                self._game_state = 'RED_WON'
-
-        # If black just went, check if red has any legal moves
-        elif self.get_turn() == 'black':
-
-            # Change whose turn it is
-            self.set_turn('red')
-            possible_moves = 0
-            for piece in self.get_red_pieces_left():
-
-                # Check if any black piece has any legal moves (whether in check or not)
-                move_list = piece.get_possible_moves()
-
-                # If there is, increase possible_moves by 1
-                if len(move_list) > 0:
-                    possible_moves += 1
-                    break
-
-            # If no legal moves available, black wins
-            if possible_moves == 0:
-                self._game_state = 'BLACK_WON'
+        return False
 
     def general_los(self):
         """A method that checks if the generals have line of sight of each other."""
-        red_general = self.get_red_gen()
-        black_general = self.get_black_gen()
-
-        red_gen_pos = red_general.get_position()
-        black_gen_pos = black_general.get_position()
-
-        # If in same column
-        if red_gen_pos[0] == black_gen_pos[0]:
-            board = self.get_board()
-            piece_in_middle = False
-            # Check if other pieces block line of sight
-            for row in range(len(board[red_gen_pos[0]])):
-                if int(red_gen_pos[1:])-1 < row < int(black_gen_pos[1:])-1 and board[red_gen_pos[0]][row] != ' ':
-                    piece_in_middle = True
-                    break
-            return not piece_in_middle
+        if self._engine is not None:
+            return self._engine.generals_facing()
+        red_square = self.get_red_gen().get_square()
+        black_square = self.get_black_gen().get_square()
 
-        # If not in same column, no line of sight
-        else:
+        # If a general has been captured or they are not in same column, no line of sight
+        if red_square is None or black_square is None or red_square % 9 != black_square % 9:
             return False
 
+        # Check if other pieces block line of sight
+        cells = self.get_board().cells
+        for square in range(red_square + 9, black_square, 9):
+            if cells[square] != EMPTY:
+                return False
+        return True
+
     def stalemate(self, color):
         """Checks to see if the color was put in stalemate by checking if they have any legal moves. This should
         only be used when not in check."""
@@ -1089,13 +1508,13 @@ class XiangqiGame:
         else:
             piece_list = self.get_black_pieces_left()
 
-        # For every piece left, get their possible move list and check their lengths
+        # For every piece left, check whether any square it could reach is a legal move
         for piece in piece_list:
-            moves = piece.get_possible_moves()
+            for end in self._destinations(piece):
 
-            # If any move list has one entry, then there is no stalemate, return False
-            if len(moves) > 0:
-                return False
+                # If any piece has a legal move, then there is no stalemate, return False
+                if self.legal_move(piece.get_square(), end):
+                    return False
 
         # Otherwise, return True
         return True
@@ -1104,82 +1523,224 @@ class XiangqiGame:
         """A method that is almost identical to the make_move method. However, every move made is undone and it does
         not update the game state. This checks if a move made is legal and returns True if it is and False if it
         isn't. Either way, it resets the board"""
-        start_column = start[0]
-        start_row = int(start[1:]) - 1
-        end_column = end[0]
-        end_row = int(end[1:]) - 1
+        start = SQUARES.get(start, start)
+        end = SQUARES.get(end, end)
         board = self.get_board()
-        piece = board[start_column][start_row]
-        enemy = board[end_column][end_row]
+        piece = board.get(start)
 
         # Check if game is still going
         if self.get_game_state() != 'UNFINISHED':
             return False
 
         # Check that a piece was selected
-        elif piece == ' ':
+        elif piece is None:
             return False
 
-        else:
-            # Try to make a move with the selected piece
-            move = piece.move(start, end, board)
-
-            # If the .move method returns False, move is invalid, return False
-            if move is False:
-                return False
-
-            # Otherwise, empty the starting position, move to new position, update positions, and update the game state
-            else:
-                board[start_column][start_row] = ' '
-                board[end_column][end_row] = piece
-                piece.update_position(end_column, end_row)
-
-                # Check if move puts general in line of sight of other general or if move puts general in check
-                if self.general_los() or self.is_in_check(piece.get_color()):
-
-                    # Still in check, undo move and return False
-                    board[end_column][end_row] = enemy
-                    board[start_column][start_row] = piece
-                    piece.update_position(start_column, start_row)
-                    return False
+        # Try to make a move with the selected piece. If the .move method returns False, move is invalid
+        elif not self._can_move(piece, start, end):
+            return False
 
-                # Otherwise, move is legal. Undo move and return True
-                else:
-                    board[end_column][end_row] = enemy
-                    board[start_column][start_row] = piece
-                    piece.update_position(start_column, start_row)
-                    return True
+        # Check if the move puts general in line of sight of other general or puts general in check, making the move
+        # and undoing it only when the position's pins and checks do not settle it
+        return self._is_legal(piece, start, end, self._get_legality(piece.get_color()))
 
     def all_poss_moves(self):
-        """A method that updates all possible moves for all of the pieces left in the game"""
-        possible_col = 'abcdefghi'
-        check_pos = ''
-
-        # For every piece left, check if they have a legal move to anywhere on the board
-        # Save every possible move to a list, then update the piece's attribute. Then reset and do the next piece
-        for piece in self.get_black_pieces_left():
-            moves = []
-            for letter in possible_col:
-                for index in range(1, 11):
-                    check_pos += letter + str(index)
-                    result = self.legal_move(piece.get_position(), check_pos)
-
-                    if result:
-                        moves += [check_pos]
-                    check_pos = ''
-            piece.set_possible_moves(moves)
-
-        for piece in self.get_red_pieces_left():
-            moves = []
-            for letter in possible_col:
-                for index in range(1, 11):
-                    check_pos += letter + str(index)
-                    result = self.legal_move(piece.get_position(), check_pos)
-
-                    if result:
-                        moves += [check_pos]
-                    check_pos = ''
-            piece.set_possible_moves(moves)
+        """A method that updates all possible moves for all of the pieces left in the game. Pieces work these out
+        for themselves when asked (see Pieces.get_possible_moves), so this is only needed to fill in every list at
+        once."""
+        for piece in self.get_black_pieces_left() + self.get_red_pieces_left():
+            piece.set_possible_moves(self.legal_destinations(piece))
+
+    def legal_destinations(self, piece):
+        """Returns the names of the squares the piece can legally move to, whoever's turn it is"""
+        start = piece.get_square()
+        if start is None:
+            return []
+        color = piece.get_color()
+        legality = self._get_legality(color)
+        return [SQUARE_NAMES[end] for end in self._destinations(piece) if self._is_legal(piece, start, end, legality)]
+
+    def _get_legality(self, color):
+        """Returns what decides the legality of the color's moves in the current position (see _find_legality),
+        working it out only once per position"""
+        key = (self._hash, color)
+        if key != self._legality_key:
+            self._legality = self._find_legality(color)
+            self._legality_key = key
+        return self._legality
+
+    def _find_legality(self, color):
+        """Looks out from the color's general along its rank and file and at the knights and soldiers next to it,
+        and returns three bitmasks that let most moves be judged without playing them:
+        pinned: the color's pieces that may not be safe to move away: the only piece between a rook and the general,
+        either piece between a canon and the general, a piece on the leg of a knight aiming at the general, and the
+        only piece between the two generals.
+        screens: the empty squares between the general and a canon with nothing between them, where a piece would
+        give the canon a screen.
+        evasions: None when the general is not in check. Otherwise the squares a move by a piece other than the
+        general has to land on to get out of check: the checking piece and the squares that block it, or
+        ALL_SQUARES if the check is from a canon or from two pieces."""
+        side = SIDES[color]
+        enemy = (side ^ 1) << 3
+        general = GENERAL | side << 3
+        if side == 0:
+            general_square = self.get_red_gen().get_square()
+        else:
+            general_square = self.get_black_gen().get_square()
+        cells = self._board.cells
+        pinned = 0
+        screens = 0
+        evasions = 0
+        checkers = 0
+        canon_check = False
+
+        # Along each ray, the first three pieces decide every rook, canon and flying general line through the square
+        for ray in RAYS[general_square]:
+            found = []
+            between = 0
+            for square in ray:
+                code = cells[square]
+                if code == EMPTY:
+                    if not found:
+                        between |= 1 << square
+                    continue
+                found.append(square)
+                if len(found) == 3:
+                    break
+            codes = [cells[square] for square in found] + [EMPTY, EMPTY, EMPTY]
+            first, second, third = codes[:3]
+            if first == ROOK | enemy:
+                checkers += 1
+                evasions |= between | 1 << found[0]
+            elif first == CANON | enemy:
+                screens |= between
+            elif first != EMPTY and first & BLACK == general & BLACK and second in (ROOK | enemy, GENERAL | enemy):
+                pinned |= 1 << found[0]
+            if second == CANON | enemy:
+                checkers += 1
+                canon_check = True
+            elif third == CANON | enemy:
+                for square in found[:2]:
+                    if cells[square] & BLACK == general & BLACK:
+                        pinned |= 1 << square
+
+        # Knights aim at the general over a leg next to them, and soldiers attack it from the squares next to it
+        for origin, leg in KNIGHT_ORIGINS[general_square]:
+            if cells[origin] == KNIGHT | enemy:
+                if cells[leg] == EMPTY:
+                    checkers += 1
+                    evasions |= 1 << origin | 1 << leg
+                elif cells[leg] & BLACK == general & BLACK:
+                    pinned |= 1 << leg
+        for square in (general_square + 9, general_square - 9, general_square + 1, general_square - 1):
+            if 0 <= square < 90 and cells[square] == SOLDIER | enemy \
+                    and self._board.pieces[square].attacks(self._board)[0] >> general_square & 1:
+                checkers += 1
+                evasions |= 1 << square
+
+        if not checkers:
+            evasions = None
+        elif checkers > 1 or canon_check:
+            evasions = ALL_SQUARES
+        return pinned, screens, evasions
+
+    def _is_legal(self, piece, start, end, legality):
+        """Returns True if the piece may move from start to end, which it can by its movement rules. The legality of
+        the position (see _find_legality) settles most moves at once. General moves, moves of pinned pieces, moves
+        onto a canon's line and moves out of check are played and taken back to be sure."""
+        pinned, screens, evasions = legality
+        if piece.get_code() & 7 != GENERAL:
+            # A move that does not deal with the check cannot be legal
+            if evasions is not None and not evasions >> end & 1:
+                return False
+            if evasions is None and not pinned >> start & 1 and not screens >> end & 1:
+                return True
+        color = piece.get_color()
+        self.push((start, end))
+        legal = not self.general_los() and not self.is_in_check(color)
+        self.pop()
+        return legal
+
+    def pseudo_legal_moves(self):
+        """Returns every move the player whose turn it is could make by the pieces' movement rules, as (start, end)
+        pairs of integer squares. It does not check whether a move leaves their general in check or facing the
+        other general."""
+        if self._turn == 'red':
+            pieces = self._red_pieces_left
+        else:
+            pieces = self._black_pieces_left
+        return [(piece.get_square(), end) for piece in pieces for end in self._destinations(piece)]
+
+    def legal_moves(self):
+        """Returns every legal move for the player whose turn it is, as (start, end) pairs of integer squares. There
+        are none once the game is over."""
+        if self._game_state != 'UNFINISHED':
+            return []
+        return self._generate_legal_moves()
+
+    def _generate_legal_moves(self):
+        """Returns every legal move for the player whose turn it is, whatever the game state"""
+        if self._turn == 'red':
+            pieces = self._red_pieces_left
+        else:
+            pieces = self._black_pieces_left
+        legality = self._get_legality(self._turn)
+        return [(piece.get_square(), end) for piece in pieces for end in self._destinations(piece)
+                if self._is_legal(piece, piece.get_square(), end, legality)]
+
+    def perft(self, depth):
+        """Counts the positions reachable from this one in exactly depth legal moves. It is the standard check of
+        move generation: the counts for a position are known, so a wrong count means a move is generated that
+        should not be, or the other way round. The game state is not looked at, so a position with no legal moves
+        simply counts nothing below it."""
+        if depth == 0:
+            return 1
+        moves = self._generate_legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.push(move)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
+
+    def divide(self, depth):
+        """Returns perft(depth) split by the first move, as a dict from (start, end) pairs of square names to the
+        number of positions reached after that move. Comparing it against another move generator shows which move
+        a wrong count comes from."""
+        counts = {}
+        for start, end in self._generate_legal_moves():
+            self.push((start, end))
+            counts[(SQUARE_NAMES[start], SQUARE_NAMES[end])] = self.perft(depth - 1)
+            self.pop()
+        return counts
+
+    def search(self, depth=None, time_ms=None, nodes=None, workers=None):
+        """Searches for the best move for the player whose turn it is and returns a SearchResult (see search.py)
+        holding the move, its score, the depth reached, the principal variation and the nodes searched. The search
+        deepens one ply at a time until it reaches depth, runs out of time_ms milliseconds or has searched the
+        given number of nodes. The transposition table is kept between searches of the same game. If workers is
+        more than 1, the root moves are searched in that many worker processes sharing one transposition table
+        (see search.ParallelSearcher), and the node budget applies to each root move. If the game has an opening
+        book (see set_book) with a move for the position, that move is returned without searching, at depth 0."""
+        if self._book is not None:
+            move = self._book.choose(self)
+            if move is not None:
+                from search import SearchResult
+                move = (SQUARE_NAMES[move[0]], SQUARE_NAMES[move[1]])
+                return SearchResult(move, 0, 0, [move], 0)
+        if workers is not None and workers > 1:
+            if self._parallel_searcher is None or self._parallel_searcher.get_workers() != workers:
+                from search import ParallelSearcher
+                if self._parallel_searcher is not None:
+                    self._parallel_searcher.close()
+                self._parallel_searcher = ParallelSearcher(workers)
+            return self._parallel_searcher.search(self.to_fen(), depth, time_ms, nodes)
+        if self._searcher is None:
+            from search import Searcher
+            self._searcher = Searcher(self)
+        return self._searcher.search(depth, time_ms, nodes)
 
     def __repr__(self):
         """When the board is printed. Red squares are red pieces. Green squares are black piecs. Blue line is
@@ -1214,6 +1775,85 @@ class XiangqiGame:
 
 
 
+# Positions for perft in Xiangqi FEN, with their known node counts by depth. The start position counts are the
+# published ones, the others were counted by both engines and agree
+PERFT_POSITIONS = [
+    ('start', START_FEN, {1: 44, 2: 1920, 3: 79666, 4: 3290240, 5: 133312995}),
+    ('central canon', 'rnbakabr1/9/1c4nc1/p1p1p1p1p/9/9/P1P1P1P1P/1C2C1N2/9/RNBAKAB1R w - - 4 3',
+     {1: 34, 2: 1307, 3: 45366}),
+    ('canon exchange', 'r1bakabr1/9/2n1c2c1/p1p1p1p1p/9/9/P1P1P1P1P/2N1C4/9/R1BAKABNR w - - 4 4',
+     {1: 27, 2: 867, 3: 24154}),
+    ('rooks out', '1nbakabn1/3r1r3/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/3R1R3/1NBAKABN1 w - - 8 5',
+     {1: 60, 2: 3512, 3: 198048}),
+    ('soldiers across', 'rnbakabnr/9/1c5c1/p2P4p/4p4/4P4/P5p1P/1C5C1/9/RNBAKABNR b - - 3 5',
+     {1: 45, 2: 1996, 3: 84494}),
+    ('rook check', '3k5/9/4b4/9/9/9/9/4B4/4A4/2R1K1r2 w - - 0 1', {1: 2, 2: 24, 3: 390}),
+    ('knight and canon', '2bak4/4a4/4b4/p3N3p/9/2c6/P3n3P/4B4/4A4/3AK1B2 w - - 0 1', {1: 16, 2: 463, 3: 7405}),
+    ('attack', 'r1ba1a3/4kn3/2n1b4/pNp1p1p1p/4c4/6P2/P1P2R2P/1CcC5/9/2BAKAB2 w - - 0 1',
+     {1: 38, 2: 1128, 3: 43929}),
+]
+
+
+def run_perft(depth, engine='objects', names=None, divide=False):
+    """Runs perft to the given depth on the bundled positions (or only the named ones) and prints the node count,
+    the time taken and the nodes per second of each. Counts that differ from the known ones are marked. Returns
+    True if every known count matched."""
+    all_matched = True
+    total_nodes = 0
+    total_time = 0
+    for name, fen, known in PERFT_POSITIONS:
+        if names and name not in names:
+            continue
+        game = XiangqiGame.from_fen(fen, engine)
+        began = time.perf_counter()
+        if divide:
+            counts = game.divide(depth)
+            nodes = sum(counts.values())
+        else:
+            nodes = game.perft(depth)
+        elapsed = time.perf_counter() - began
+        total_nodes += nodes
+        total_time += elapsed
+
+        # Compare against the known count, if there is one for this depth
+        if depth not in known:
+            verdict = ''
+        elif known[depth] == nodes:
+            verdict = 'ok'
+        else:
+            verdict = 'MISMATCH, expected ' + str(known[depth])
+            all_matched = False
+        print('%-16s depth %d  %10d nodes  %8.2fs  %9.0f nps  %s' % (name, depth, nodes, elapsed,
+                                                                       nodes / max(elapsed, 1e-9), verdict))
+        if divide:
+            for (start, end), count in sorted(counts.items()):
+                print('    %s%s: %d' % (start, end, count))
+    print('%-16s depth %d  %10d nodes  %8.2fs  %9.0f nps' % ('total', depth, total_nodes, total_time,
+                                                             total_nodes / max(total_time, 1e-9)))
+    return all_matched
+
+
+def cli(argv=None):
+    """Reads the command line. With no command, or 'play', the interactive game is started. The 'perft' command
+    runs the perft benchmark, exiting with status 1 if any count is wrong."""
+    parser = argparse.ArgumentParser(description='Play XiangQi, or check and time move generation with perft.')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('play', help='play a game in the terminal (the default)')
+    perft = commands.add_parser('perft', help='count the positions reachable from the bundled positions')
+    perft.add_argument('depth', type=int, nargs='?', default=3, help='number of plies to look ahead (default 3)')
+    perft.add_argument('--engine', choices=('objects', 'bitboard'), default='objects',
+                       help='move generator to use (default objects, the faster; bitboard cross-checks it)')
+    perft.add_argument('--position', action='append', choices=[name for name, fen, known in PERFT_POSITIONS],
+                       help='only run this bundled position, may be given more than once')
+    perft.add_argument('--divide', action='store_true', help='also print the count below every first move')
+    args = parser.parse_args(argv)
+    if args.command == 'perft':
+        if not run_perft(args.depth, args.engine, args.position, args.divide):
+            sys.exit(1)
+    else:
+        main()
+
+
 def main():
     game = XiangqiGame()
     print('Hello! Welcome to XiangQi (Chinese Chess)! Red player goes first.')
@@ -1236,9 +1876,12 @@ def main():
 
     if game.get_game_state() == 'RED_WON':
         print('Red wins!', end=' ')
+    elif game.get_game_state() == 'DRAW':
+        print('The game is drawn by repetition.', end=' ')
     else:
         print('Black wins!', end=' ')
     print('Hope you enjoyed playing!')
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    cli()
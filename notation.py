@@ -0,0 +1,268 @@
+# Description: Reading and writing moves of a XiangqiGame in the common notations. ICCS gives both points as a column
+# letter and a row number from 0 (red's side) to 9, like 'h2-e2'. WXF names the piece, its file, a direction and a
+# file or distance, like 'C2.5'. Chinese notation is WXF written in characters, like '炮二平五'. The game's own
+# coordinates are square names with rows 1 to 10, like 'h3-e3'.
+
+import re
+
+from game import SQUARES, SQUARE_NAMES, COLUMNS, EMPTY, GENERAL, ADVISOR, ELEPHANT, KNIGHT, ROOK, CANON, SOLDIER, \
+    BLACK
+
+NOTATIONS = ('iccs', 'wxf', 'chinese', 'coord')
+
+# Piece letters used by WXF, with the alternatives B (elephant) and N (knight), and the letter written for each type
+WXF_PIECES = {'K': GENERAL, 'A': ADVISOR, 'E': ELEPHANT, 'B': ELEPHANT, 'H': KNIGHT, 'N': KNIGHT, 'R': ROOK,
+              'C': CANON, 'P': SOLDIER}
+WXF_LETTERS = {GENERAL: 'K', ADVISOR: 'A', ELEPHANT: 'E', KNIGHT: 'H', ROOK: 'R', CANON: 'C', SOLDIER: 'P'}
+
+# The characters of Chinese notation and the WXF letters they stand for. Pieces have a character for each color and
+# traditional forms, red writes files with Chinese numerals and black with digits, usually full width
+CHINESE_PIECES = {'车': 'R', '車': 'R', '俥': 'R', '马': 'H', '馬': 'H', '傌': 'H',
+                  '相': 'E', '象': 'E', '仕': 'A', '士': 'A', '帅': 'K', '帥': 'K',
+                  '将': 'K', '將': 'K', '炮': 'C', '砲': 'C', '包': 'C', '兵': 'P', '卒': 'P'}
+CHINESE_OPERATORS = {'进': '+', '進': '+', '退': '-', '平': '.', '前': '+', '后': '-', '後': '-'}
+CHINESE_NUMBERS = {}
+_NUMERALS = '一二三四五六七八九'
+_FULL_WIDTH = '１２３４５６７８９'
+for _number, (_numeral, _full_width) in enumerate(zip(_NUMERALS, _FULL_WIDTH), 1):
+    CHINESE_NUMBERS[_numeral] = CHINESE_NUMBERS[_full_width] = CHINESE_NUMBERS[str(_number)] = str(_number)
+del _number, _numeral, _full_width
+_CHINESE_LETTERS = {'red': dict(zip('RHEAKCP', '车马相仕帅炮兵')),
+                    'black': dict(zip('RHEAKCP', '车马象士将炮卒'))}
+
+_ICCS = re.compile(r'^([a-i])([0-9])-?([a-i])([0-9])$')
+_COORD = re.compile(r'^([a-i])(10|[1-9])-?([a-i])(10|[1-9])$')
+_WXF_FILE = re.compile(r'^([KAEBHNRCP])([1-9])([+\-.=])([1-9])$')
+_WXF_TANDEM_BEFORE = re.compile(r'^([+\-])([KAEBHNRCP])([+\-.=])([1-9])$')
+_WXF_TANDEM_AFTER = re.compile(r'^([KAEBHNRCP])([+\-])([+\-.=])([1-9])$')
+
+
+def parse_iccs(text):
+    """Reads an ICCS move such as 'h2-e2' or 'h2e2' and returns it as a (start, end) pair of integer squares"""
+    match = _ICCS.match(text.strip().lower())
+    if match is None:
+        raise ValueError('not an ICCS move: ' + repr(text))
+    start_col, start_row, end_col, end_row = match.groups()
+    return int(start_row) * 9 + COLUMNS.index(start_col), int(end_row) * 9 + COLUMNS.index(end_col)
+
+
+def to_iccs(move):
+    """Writes a (start, end) pair of integer squares as an ICCS move such as 'h2-e2'"""
+    start, end = move
+    return COLUMNS[start % 9] + str(start // 9) + '-' + COLUMNS[end % 9] + str(end // 9)
+
+
+def parse_coord(text):
+    """Reads a move written with the game's square names, such as 'h3-e3' or 'h3e3', and returns it as a (start,
+    end) pair of integer squares"""
+    match = _COORD.match(text.strip().lower())
+    if match is None:
+        raise ValueError('not a coordinate move: ' + repr(text))
+    start_col, start_row, end_col, end_row = match.groups()
+    return SQUARES[start_col + start_row], SQUARES[end_col + end_row]
+
+
+def to_coord(move):
+    """Writes a (start, end) pair of integer squares with the game's square names, such as 'h3-e3'"""
+    return SQUARE_NAMES[move[0]] + '-' + SQUARE_NAMES[move[1]]
+
+
+def _file_column(file, color):
+    """Returns the column of a WXF file. Files are counted from each player's right, so red's file 1 is column i
+    and black's file 1 is column a"""
+    if color == 'red':
+        return 9 - file
+    return file - 1
+
+
+def _column_file(column, color):
+    """Returns the WXF file of a column for the color (see _file_column)"""
+    if color == 'red':
+        return 9 - column
+    return column + 1
+
+
+def _forward(color):
+    """Returns the change in row of one step forward for the color"""
+    if color == 'red':
+        return 1
+    return -1
+
+
+def _wxf_destination(kind, start, operator, number, color):
+    """Works out the square a WXF move of a piece of the given type from start goes to, or None if it leaves the
+    board. Pieces that move in straight lines give the distance for forward and backward moves, pieces that move
+    diagonally give the file they end up on."""
+    row, column = divmod(start, 9)
+    forward = _forward(color)
+    if operator in '.=':
+        if kind in (ADVISOR, ELEPHANT, KNIGHT):
+            return None
+        end_row, end_column = row, _file_column(number, color)
+    else:
+        if operator == '-':
+            forward = -forward
+        if kind in (GENERAL, ROOK, CANON, SOLDIER):
+            end_row, end_column = row + forward * number, column
+        else:
+            end_column = _file_column(number, color)
+            step = abs(end_column - column)
+            if kind == ADVISOR:
+                rows = 1
+            elif kind == ELEPHANT:
+                rows = 2
+            elif step == 1:
+                rows = 2
+            else:
+                rows = 1
+            end_row = row + forward * rows
+    if 0 <= end_row < 10 and 0 <= end_column < 9:
+        return end_row * 9 + end_column
+    return None
+
+
+def _tandem(pieces, color, front):
+    """Picks the front or rear piece among pieces of one type sharing a file (the front one being nearest the
+    enemy), or None if no file holds more than one of them"""
+    by_column = {}
+    for square in pieces:
+        by_column.setdefault(square % 9, []).append(square)
+    files = [squares for squares in by_column.values() if len(squares) > 1]
+    if len(files) != 1:
+        return None
+    squares = sorted(files[0], reverse=(color == 'red'))
+    if front:
+        return squares[0]
+    return squares[-1]
+
+
+def parse_wxf(game, text):
+    """Reads a WXF move such as 'C2.5', 'H8+7' or '+R-2' for the player whose turn it is in the game, and returns it
+    as a (start, end) pair of integer squares. The piece is found on the board, so the move must be read before it
+    is played. Raises ValueError if the move does not name exactly one legal piece move."""
+    color = game.get_turn()
+    code = text.strip().upper()
+    cells = game.get_board().cells
+    move = _WXF_FILE.match(code)
+    if move is not None:
+        letter, file, operator, number = move.groups()
+    else:
+        move = _WXF_TANDEM_BEFORE.match(code)
+        if move is not None:
+            tandem, letter, operator, number = move.groups()
+        else:
+            move = _WXF_TANDEM_AFTER.match(code)
+            if move is None:
+                raise ValueError('not a WXF move: ' + repr(text))
+            letter, tandem, operator, number = move.groups()
+        file = None
+    kind = WXF_PIECES[letter]
+    piece_code = kind
+    if color == 'black':
+        piece_code |= BLACK
+    pieces = [square for square in range(90) if cells[square] == piece_code]
+
+    # Find the piece that moves, by its file or by being the front or rear one of two on a file
+    if file is not None:
+        column = _file_column(int(file), color)
+        starts = [square for square in pieces if square % 9 == column]
+    else:
+        start = _tandem(pieces, color, tandem == '+')
+        starts = [] if start is None else [start]
+
+    # Keep the pieces that can actually make the move, which settles which advisor or elephant is meant
+    moves = []
+    for start in starts:
+        end = _wxf_destination(kind, start, operator, int(number), color)
+        if end is not None and game.get_board().get(start).can_move(start, end, game.get_board()):
+            moves.append((start, end))
+    if len(moves) != 1:
+        raise ValueError('WXF move does not name one move: ' + repr(text))
+    return moves[0]
+
+
+def to_wxf(game, move):
+    """Writes a (start, end) pair of integer squares as a WXF move for the game, before the move is played"""
+    start, end = move
+    cells = game.get_board().cells
+    code = cells[start]
+    if code == EMPTY:
+        raise ValueError('no piece on ' + SQUARE_NAMES[start])
+    kind = code & ~BLACK
+    if code & BLACK:
+        color = 'black'
+    else:
+        color = 'red'
+    letter = WXF_LETTERS[kind]
+
+    # Two pieces of a type on one file are told apart as the front and rear one
+    column = start % 9
+    same_file = [square for square in range(column, 90, 9) if cells[square] == code]
+    if len(same_file) == 2 and kind not in (ADVISOR, ELEPHANT):
+        if _tandem(same_file, color, True) == start:
+            piece = '+' + letter
+        else:
+            piece = '-' + letter
+    else:
+        piece = letter + str(_column_file(column, color))
+
+    # Moves along a row give the file they end on, others go forward or back by rows or to a file
+    rows = (end // 9 - start // 9) * _forward(color)
+    if rows == 0:
+        return piece + '.' + str(_column_file(end % 9, color))
+    if rows > 0:
+        operator = '+'
+    else:
+        operator = '-'
+    if kind in (ADVISOR, ELEPHANT, KNIGHT):
+        return piece + operator + str(_column_file(end % 9, color))
+    return piece + operator + str(abs(rows))
+
+
+def parse_chinese(game, text):
+    """Reads a move in Chinese notation such as '炮二平五', '马８进７' or '前车退二' for the player whose
+    turn it is in the game, and returns it as a (start, end) pair of integer squares. It is read as the WXF move it
+    spells out (see parse_wxf). Raises ValueError if the move cannot be read."""
+    characters = text.strip()
+    if len(characters) != 4:
+        raise ValueError('not a Chinese move: ' + repr(text))
+    try:
+        if characters[0] in '前后後':
+            code = CHINESE_OPERATORS[characters[0]] + CHINESE_PIECES[characters[1]]
+        else:
+            code = CHINESE_PIECES[characters[0]] + CHINESE_NUMBERS[characters[1]]
+        code += CHINESE_OPERATORS[characters[2]] + CHINESE_NUMBERS[characters[3]]
+    except KeyError:
+        raise ValueError('not a Chinese move: ' + repr(text))
+    return parse_wxf(game, code)
+
+
+def to_chinese(game, move):
+    """Writes a (start, end) pair of integer squares as a move in Chinese notation for the game, before the move is
+    played, with Chinese numerals for red and full width digits for black"""
+    code = to_wxf(game, move)
+    if game.get_board().cells[move[0]] & BLACK:
+        color = 'black'
+        numbers = _FULL_WIDTH
+    else:
+        color = 'red'
+        numbers = _NUMERALS
+    if code[0] in '+-':
+        text = '前后'['+-'.index(code[0])] + _CHINESE_LETTERS[color][code[1]]
+    else:
+        text = _CHINESE_LETTERS[color][code[0]] + numbers[int(code[1]) - 1]
+    return text + '进退平'['+-.'.index(code[2])] + numbers[int(code[3]) - 1]
+
+
+def parse_move(game, text, notation='iccs'):
+    """Reads a move in the given notation ('iccs', 'wxf', 'chinese' or 'coord') for the game and returns it as a
+    (start, end) pair of integer squares. Raises ValueError if the move cannot be read."""
+    if notation == 'iccs':
+        return parse_iccs(text)
+    elif notation == 'wxf':
+        return parse_wxf(game, text)
+    elif notation == 'chinese':
+        return parse_chinese(game, text)
+    elif notation == 'coord':
+        return parse_coord(text)
+    raise ValueError('unknown notation: ' + str(notation))
@@ -0,0 +1,162 @@
+# Description: Streams games out of Xiangqi PGN archives. Files may be gzip-compressed and as big as they like: games
+# are read one at a time and handed out as soon as they are complete, with their moves in ICCS, WXF or Chinese
+# notation read against a XiangqiGame when asked for.
+
+import argparse
+import gzip
+import io
+import re
+
+from game import XiangqiGame, START_FEN
+from notation import NOTATIONS, parse_move, to_iccs
+
+# The notation a game's Format header names, for reading its moves when none is given
+FORMAT_NOTATIONS = {'iccs': 'iccs', 'wxf': 'wxf', 'chinese': 'chinese'}
+
+_HEADER = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]\s*$')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+
+def _open(source, encoding):
+    """Returns a text stream for source, a path or a file object opened in text or binary mode, and a function that
+    lets go of it when reading is done. Paths and binary streams starting with the gzip magic number are
+    decompressed. Files opened here are closed, and a file object given by the caller is left open."""
+    if isinstance(source, io.TextIOBase):
+        return source, lambda: None
+    owned = None
+    if not hasattr(source, 'read'):
+        source = owned = open(source, 'rb')
+    buffered = source
+    if not hasattr(source, 'peek'):
+        buffered = io.BufferedReader(source)
+    binary = buffered
+    if buffered.peek(2)[:2] == b'\x1f\x8b':
+        binary = gzip.GzipFile(fileobj=buffered)
+    text = io.TextIOWrapper(binary, encoding=encoding, errors='replace')
+
+    def release():
+        # Detaching the wrappers stops them closing the stream under them, and GzipFile never closes its file
+        text.detach()
+        if binary is not buffered:
+            binary.close()
+        if buffered is not source:
+            buffered.detach()
+        if owned is not None:
+            owned.close()
+    return text, release
+
+
+def _tokens(text, state):
+    """Yields the move text tokens of a line, leaving out comments, variations and annotations. state holds the
+    brace and parenthesis depth carried from one line to the next."""
+    token = ''
+    for character in text:
+        if state['brace']:
+            if character == '}':
+                state['brace'] = False
+            continue
+        if character == ';' and not state['parens']:
+            break
+        if character == '{':
+            state['brace'] = True
+        elif character == '(':
+            state['parens'] += 1
+        elif character == ')':
+            state['parens'] = max(state['parens'] - 1, 0)
+        elif not state['parens'] and not character.isspace():
+            token += character
+            continue
+        if token:
+            yield token
+            token = ''
+    if token:
+        yield token
+
+
+def read_pgn(source, encoding='utf-8'):
+    """Yields a (headers, moves) pair for every game in a PGN archive, where headers is a dict of the tag pairs and
+    moves the list of move text tokens, without move numbers, comments, variations, annotations or the result.
+    source is a path or a file object, gzip-compressed or not. Only one game is held in memory at a time."""
+    stream, release = _open(source, encoding)
+    headers = {}
+    moves = []
+    state = {'brace': False, 'parens': 0}
+    try:
+        for line in stream:
+            line = line.strip()
+            if not state['brace'] and not state['parens']:
+                header = _HEADER.match(line)
+                if header is not None:
+                    # A header after move text starts the next game
+                    if moves:
+                        yield headers, moves
+                        headers = {}
+                        moves = []
+                    headers[header.group(1)] = header.group(2).replace('\\"', '"')
+                    continue
+            for token in _tokens(line, state):
+                if token in RESULTS:
+                    yield headers, moves
+                    headers = {}
+                    moves = []
+                    continue
+                token = _MOVE_NUMBER.sub('', token)
+                if token and not token.startswith('$') and token not in ('!', '?', '!!', '??', '!?', '?!'):
+                    moves.append(token)
+        if moves or headers:
+            yield headers, moves
+    finally:
+        release()
+
+
+def resolve_games(games, notation=None, engine='objects'):
+    """Reads the moves of every (headers, moves) pair from read_pgn into (start, end) pairs of integer squares,
+    playing them through a XiangqiGame set up from the FEN header or the opening position, and yields (headers,
+    moves) pairs in turn. The notation is taken from each game's Format header when not given, and is ICCS if there
+    is none. A game whose moves stop at one that cannot be read or played keeps the moves before it, and its
+    headers get an 'Error' entry saying why. Games without a FEN header can go to book.build_book as (moves,
+    headers.get('Result')), which counts a result it does not know as a draw. Games with one cannot, as the book
+    plays every game from the opening position."""
+    game = XiangqiGame(engine)
+    for headers, texts in games:
+        fen = headers.get('FEN', START_FEN)
+        if fen == START_FEN:
+            game.reset()
+            current = game
+        else:
+            current = XiangqiGame(engine, fen)
+        game_notation = notation
+        if game_notation is None:
+            game_notation = FORMAT_NOTATIONS.get(headers.get('Format', '').lower(), 'iccs')
+        moves = []
+        for ply, text in enumerate(texts):
+            try:
+                move = parse_move(current, text, game_notation)
+            except ValueError as reason:
+                headers['Error'] = 'ply %d: %s' % (ply + 1, reason)
+                break
+            if not current.make_move(*move):
+                headers['Error'] = 'ply %d: illegal move: %s' % (ply + 1, text)
+                break
+            moves.append(move)
+        yield headers, moves
+
+
+def cli(argv=None):
+    """Converts a PGN archive to one game per line in ICCS notation, the format replay.py and book.py read. A game
+    with an unreadable or illegal move is written up to that move, and a warning line starting with '#' follows."""
+    parser = argparse.ArgumentParser(description='Convert a XiangQi PGN archive to one game per line of ICCS moves.')
+    parser.add_argument('path', help='PGN file, which may be gzip-compressed')
+    parser.add_argument('--notation', choices=NOTATIONS, default=None,
+                        help='notation of the moves (default from each game\'s Format header, or iccs)')
+    parser.add_argument('--encoding', default='utf-8', help='text encoding of the file (default utf-8)')
+    args = parser.parse_args(argv)
+    for index, (headers, moves) in enumerate(resolve_games(read_pgn(args.path, args.encoding), args.notation)):
+        print(' '.join(to_iccs(move) for move in moves))
+        if 'Error' in headers:
+            print('# game %d: %s' % (index + 1, headers['Error']))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,262 @@
+# Description: A compact binary format for collections of XiangqiGame games. Every move takes two bytes, its start and
+# end squares, every position a fixed record of 46 bytes, and an index of game offsets at the end of the file lets a
+# reader memory-map it and go straight to any game to replay it with make_move.
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from game import XiangqiGame, START_FEN, EMPTY, BLACK, FEN_LETTERS
+from notation import NOTATIONS, parse_move, to_iccs
+from replay import read_games, split_moves
+
+# The file starts with a header of the magic number, the format version, the number of games and the offset of the
+# index, little-endian. The index is one 8-byte offset per game, and it is written last so games can be streamed
+HEADER = struct.Struct('<4sHHQQ')
+MAGIC = b'XQGF'
+VERSION = 1
+
+# A position is the 90 board cells two to a byte, the lower square in the low nibble, then the side to move (0 red,
+# 1 black)
+POSITION_SIZE = 46
+
+# A game is its starting position, its result and the number of moves, then the moves as start and end square bytes
+GAME = struct.Struct('<%dsBH' % POSITION_SIZE)
+MAX_MOVES = 0xFFFF
+
+# Results as they are stored, 0 being unknown
+RESULTS = (None, '1-0', '0-1', '1/2-1/2')
+
+# A game read back from a file: the FEN it starts from, its result (None if unknown) and its moves as (start, end)
+# pairs of integer squares
+GameRecord = namedtuple('GameRecord', ['fen', 'result', 'moves'])
+
+
+def pack_position(game):
+    """Packs the game's position, the board and the side to move, into a record of POSITION_SIZE bytes. The move
+    counters are not kept."""
+    cells = game.get_board().cells
+    record = bytearray(POSITION_SIZE)
+    for square in range(0, 90, 2):
+        record[square // 2] = cells[square] | cells[square + 1] << 4
+    if game.get_turn() == 'black':
+        record[45] = 1
+    return bytes(record)
+
+
+def unpack_position(record, offset=0):
+    """Reads a position packed by pack_position from record, any bytes-like object, at offset and returns it as a
+    FEN (see XiangqiGame.from_fen)"""
+    rows = []
+    for row in range(9, -1, -1):
+        text = ''
+        empty = 0
+        for square in range(row * 9, row * 9 + 9):
+            code = record[offset + square // 2] >> (square % 2 * 4) & 0xF
+            if code == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            letter = FEN_LETTERS[code & ~BLACK]
+            if not code & BLACK:
+                letter = letter.upper()
+            text += letter
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    if record[offset + 45]:
+        turn = 'b'
+    else:
+        turn = 'w'
+    return '/'.join(rows) + ' ' + turn + ' - - 0 1'
+
+
+START_POSITION = pack_position(XiangqiGame())
+
+
+class GameWriter:
+    """Writes games to a file in the binary format one at a time, so a collection of any size can be converted
+    without holding it in memory. Only the index, 8 bytes a game, is kept until the file is closed."""
+
+    def __init__(self, path):
+        """Creates the file at path, replacing any file already there"""
+        self._file = open(path, 'wb')
+        self._offsets = array('Q')
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+    def __len__(self):
+        """Returns the number of games written so far"""
+        return len(self._offsets)
+
+    def add(self, moves, result=None, fen=None):
+        """Writes a game of moves, (start, end) pairs of integer squares, played from fen or the opening position.
+        result is '1-0', '0-1', '1/2-1/2' or None, and '*' counts as None. The moves are not checked. Raises
+        ValueError for a result it does not know or a game of more than MAX_MOVES moves."""
+        if result == '*':
+            result = None
+        if result not in RESULTS:
+            raise ValueError('unknown result: ' + str(result))
+        if len(moves) > MAX_MOVES:
+            raise ValueError('too many moves: ' + str(len(moves)))
+        if fen is None or fen == START_FEN:
+            position = START_POSITION
+        else:
+            position = pack_position(XiangqiGame(fen=fen))
+        packed = bytearray(2 * len(moves))
+        packed[0::2] = bytes(move[0] for move in moves)
+        packed[1::2] = bytes(move[1] for move in moves)
+        self._offsets.append(self._file.tell())
+        self._file.write(GAME.pack(position, RESULTS.index(result), len(moves)))
+        self._file.write(packed)
+
+    def close(self):
+        """Writes the index and the header and closes the file"""
+        if self._file.closed:
+            return
+        index = self._file.tell()
+        offsets = self._offsets
+        if sys.byteorder == 'big':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        offsets.tofile(self._file)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, len(self._offsets), index))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+class GameFile:
+    """A file of games in the binary format (see GameWriter) opened for reading. The file is memory-mapped, so
+    opening it reads nothing but the header, and any game can be read or replayed by its number."""
+
+    def __init__(self, path):
+        """Opens the games file at path. Raises ValueError if it is not one."""
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError('not a games file: ' + str(path))
+        self._view = memoryview(self._map)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError('not a games file: ' + str(path))
+        magic, version, unused, self._games, self._index = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION or self._index + 8 * self._games > len(self._map):
+            self.close()
+            raise ValueError('not a games file: ' + str(path))
+
+    def __len__(self):
+        """Returns the number of games in the file"""
+        return self._games
+
+    def close(self):
+        """Closes the games file"""
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def _offset(self, number):
+        """Returns where game number starts in the file. Raises IndexError if there is no such game."""
+        if number < 0:
+            number += self._games
+        if not 0 <= number < self._games:
+            raise IndexError('no game ' + str(number))
+        return struct.unpack_from('<Q', self._view, self._index + 8 * number)[0]
+
+    def get_fen(self, number):
+        """Returns the FEN game number starts from"""
+        return unpack_position(self._view, self._offset(number))
+
+    def get_result(self, number):
+        """Returns the result of game number, '1-0', '0-1', '1/2-1/2' or None"""
+        return RESULTS[self._view[self._offset(number) + POSITION_SIZE]]
+
+    def get_moves(self, number):
+        """Returns the moves of game number as a list of (start, end) pairs of integer squares"""
+        offset = self._offset(number)
+        count = GAME.unpack_from(self._view, offset)[2]
+        moves = self._view[offset + GAME.size:offset + GAME.size + 2 * count]
+        pairs = list(zip(moves[0::2], moves[1::2]))
+        moves.release()
+        return pairs
+
+    def __getitem__(self, number):
+        """Returns game number as a GameRecord"""
+        return GameRecord(self.get_fen(number), self.get_result(number), self.get_moves(number))
+
+    def __iter__(self):
+        """Yields every game in the file as a GameRecord, in order"""
+        for number in range(self._games):
+            yield self[number]
+
+    def replay(self, number, game=None, engine='objects'):
+        """Plays game number through a XiangqiGame with make_move and returns the game. game is reused when given
+        and it starts from the right position, after reset, or else a new one is made. Stops at the first move
+        make_move refuses, which a file written from checked games never holds."""
+        fen = self.get_fen(number)
+        if game is not None:
+            game.reset()
+        if game is None or unpack_position(pack_position(game)) != fen:
+            game = XiangqiGame(engine, fen)
+        for start, end in self.get_moves(number):
+            if not game.make_move(start, end):
+                break
+        return game
+
+
+def cli(argv=None):
+    """Packs a file of games, one per line, into the binary format, or prints a game from a packed file in ICCS"""
+    parser = argparse.ArgumentParser(description='Pack XiangQi games into a binary file or read them back.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='pack a file of games, one per line')
+    pack.add_argument('games', help='file with one game per line')
+    pack.add_argument('output', help='games file to write')
+    pack.add_argument('--notation', choices=NOTATIONS, default='iccs',
+                      help='notation of the moves (default iccs)')
+    show = commands.add_parser('show', help='print a game from a games file')
+    show.add_argument('path', help='games file to read')
+    show.add_argument('number', type=int, help='number of the game, counting from 0')
+    args = parser.parse_args(argv)
+    if args.command == 'pack':
+        game = XiangqiGame()
+        with GameWriter(args.output) as writer:
+            # Moves are read and checked as they are played, so a game is cut short at its first bad move
+            for line in read_games(args.games):
+                game.reset()
+                moves = []
+                for text in split_moves(line):
+                    try:
+                        move = parse_move(game, text, args.notation)
+                    except ValueError:
+                        break
+                    if not game.make_move(*move):
+                        break
+                    moves.append(move)
+                writer.add(moves)
+            print(len(writer), 'games')
+    else:
+        with GameFile(args.path) as games:
+            record = games[args.number]
+            print(record.fen)
+            print(' '.join(to_iccs(move) for move in record.moves), record.result or '*')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,149 @@
+# Description: Replays recorded games through a XiangqiGame in bulk, checking every move and reporting how each game
+# ended, without going through the interactive main().
+
+import argparse
+import multiprocessing
+import re
+import sys
+from collections import namedtuple
+
+from game import XiangqiGame
+from notation import NOTATIONS, parse_move
+
+# The result of replaying one game. index is the game's position in the input, state its final game state and plies
+# the number of moves played. illegal_ply is the index of the first move that could not be read or played (None if
+# every move was played) and error says why. fens and hashes hold the position after every ply played, when asked
+# for, and are None otherwise
+ReplayResult = namedtuple('ReplayResult', ['index', 'state', 'plies', 'illegal_ply', 'error', 'fens', 'hashes'])
+
+_MOVE_NUMBER = re.compile(r'^\d+\.+$')
+
+# The game and replay options of a worker process, set up once per process by _start_worker
+_worker_game = None
+_worker_options = None
+
+
+def split_moves(moves):
+    """Turns a game's moves given as one string into a list, dropping move numbers such as '12.'. Lists are
+    returned unchanged."""
+    if isinstance(moves, str):
+        return [move for move in moves.split() if not _MOVE_NUMBER.match(move)]
+    return moves
+
+
+def replay_game(game, moves, notation='iccs', fens=False, hashes=False, index=0):
+    """Plays the moves through the game from its current position and returns a ReplayResult. Moves are strings in
+    the given notation (see notation.parse_move) or (start, end) pairs. Replay stops at the first move that cannot
+    be read or is not legal, including any move after the game has ended."""
+    ply_fens = [] if fens else None
+    ply_hashes = [] if hashes else None
+    illegal_ply = None
+    error = None
+    plies = 0
+    for ply, move in enumerate(split_moves(moves)):
+        text = move
+        try:
+            if isinstance(move, str):
+                move = parse_move(game, move, notation)
+        except ValueError as reason:
+            illegal_ply, error = ply, str(reason)
+            break
+        if not game.make_move(*move):
+            illegal_ply, error = ply, 'illegal move: ' + str(text)
+            break
+        plies += 1
+        if fens:
+            ply_fens.append(game.to_fen())
+        if hashes:
+            ply_hashes.append(game.get_hash())
+    return ReplayResult(index, game.get_game_state(), plies, illegal_ply, error, ply_fens, ply_hashes)
+
+
+def replay_games(games, notation='iccs', fens=False, hashes=False, engine='objects', fen=None):
+    """Replays every game in the iterable games, each a list or string of moves (see replay_game), and yields a
+    ReplayResult for each one in order as soon as it is done. Every game starts from fen, or the opening position,
+    and a single XiangqiGame is reset between games rather than creating new pieces each time."""
+    game = XiangqiGame(engine, fen)
+    for index, moves in enumerate(games):
+        game.reset()
+        yield replay_game(game, moves, notation, fens, hashes, index)
+
+
+def _start_worker(engine, fen, notation, fens, hashes):
+    """Sets up the XiangqiGame a worker process replays all of its games with"""
+    global _worker_game, _worker_options
+    _worker_game = XiangqiGame(engine, fen)
+    _worker_options = (engine, fen, notation, fens, hashes)
+
+
+def _replay_in_worker(job):
+    """Replays one (index, moves) job in a worker process. A game that raises is reported as an error at the ply it
+    reached, and the worker's game is rebuilt in case it was left half way through a move."""
+    global _worker_game
+    index, moves = job
+    engine, fen, notation, fens, hashes = _worker_options
+    game = _worker_game
+    game.reset()
+    try:
+        return replay_game(game, moves, notation, fens, hashes, index)
+    except Exception as reason:
+        plies = game.get_plies()
+        _worker_game = XiangqiGame(engine, fen)
+        return ReplayResult(index, None, plies, plies, type(reason).__name__ + ': ' + str(reason), None, None)
+
+
+def parallel_replay(games, workers=None, chunksize=64, notation='iccs', fens=False, hashes=False, engine='objects',
+                    fen=None):
+    """Replays the games like replay_games, but shared out between a pool of worker processes (as many as there are
+    CPUs unless workers is given), each with its own XiangqiGame. Games are handed out chunksize at a time and the
+    results are yielded in the order of the input. A game that raises an exception yields a result with its state
+    set to None and the exception as its error, and the other games carry on."""
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    with multiprocessing.Pool(workers, _start_worker, (engine, fen, notation, fens, hashes)) as pool:
+        for result in pool.imap(_replay_in_worker, enumerate(games), chunksize):
+            yield result
+
+
+def read_games(path):
+    """Yields the games in a text file, one game per line with its moves separated by spaces. Blank lines and lines
+    starting with '#' are skipped."""
+    with open(path) as games:
+        for line in games:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def cli(argv=None):
+    """Replays a file of games, one per line, and prints a line for each game: its number, final state and plies
+    played, followed by the first illegal ply and why if there is one. Exits with status 1 if any game had an
+    illegal move."""
+    parser = argparse.ArgumentParser(description='Replay and check a file of recorded XiangQi games.')
+    parser.add_argument('path', help='file with one game per line')
+    parser.add_argument('--notation', choices=NOTATIONS, default='iccs',
+                        help='notation of the moves (default iccs)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default one per CPU, 1 to replay in this process)')
+    parser.add_argument('--chunksize', type=int, default=64, help='games handed to a worker at a time (default 64)')
+    parser.add_argument('--engine', choices=('objects', 'bitboard'), default='objects',
+                        help='move generator to use (default objects)')
+    args = parser.parse_args(argv)
+    games = read_games(args.path)
+    if args.workers == 1:
+        results = replay_games(games, args.notation, engine=args.engine)
+    else:
+        results = parallel_replay(games, args.workers, args.chunksize, args.notation, engine=args.engine)
+    all_legal = True
+    for result in results:
+        line = '%d %s %d' % (result.index + 1, result.state, result.plies)
+        if result.illegal_ply is not None:
+            all_legal = False
+            line += ' illegal at ply %d: %s' % (result.illegal_ply + 1, result.error)
+        print(line)
+    if not all_legal:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli()
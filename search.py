@@ -0,0 +1,388 @@
+# Description: An alpha-beta search for XiangqiGame. Negamax with iterative deepening, a transposition table,
+# quiescence search over captures and move ordering by MVV-LVA, killer moves and the history heuristic. Searches can
+# also be split across worker processes sharing one transposition table.
+
+import multiprocessing
+import time
+import weakref
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from game import EMPTY, SQUARE_NAMES, XiangqiGame
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE = 30000
+INFINITY = 32000
+MAX_PLY = 64
+DEFAULT_DEPTH = 4
+
+# Values used to order captures: most valuable victim first, then least valuable attacker. The general is the
+# attacker of last resort
+ORDER_VALUES = [0, 1000, 2, 2, 4, 9, 5, 1, 0, 1000, 2, 2, 4, 9, 5, 1]
+
+SearchResult = namedtuple('SearchResult', ['move', 'score', 'depth', 'pv', 'nodes'])
+
+
+class _Stop(Exception):
+    """Raised inside the search when the time or node budget runs out"""
+
+
+class Searcher:
+    """Searches a XiangqiGame for the best move. The game is searched in place with push() and pop(), and is left
+    exactly as it was found. The transposition table, killer moves and history scores persist between searches."""
+
+    def __init__(self, game, table_mb=16, table=None):
+        """Initializes the searcher for the game with a transposition table of table_mb megabytes, or the given
+        table"""
+        self._game = game
+        if table is None:
+            table = TranspositionTable(table_mb)
+        self._table = table
+        self._killers = [[None, None] for ply in range(MAX_PLY + 1)]
+        self._history = [[0] * 90 for code in range(16)]
+        self._pv = [[] for ply in range(MAX_PLY + 1)]
+        self._nodes = 0
+        self._node_limit = None
+        self._deadline = None
+
+    def get_table(self):
+        """A get method for the transposition table"""
+        return self._table
+
+    def search(self, depth=None, time_ms=None, nodes=None):
+        """Searches the game one ply deeper at a time until depth is reached, time_ms milliseconds have passed or
+        nodes positions have been searched, and returns a SearchResult. If no limit is given, it searches to
+        DEFAULT_DEPTH. The first iteration always finishes; when the budget runs out in the middle of a later one,
+        the result of the last finished iteration is returned. Moves are given as (start, end) pairs of square
+        names."""
+        game = self._game
+        if depth is None:
+            if time_ms is None and nodes is None:
+                depth = DEFAULT_DEPTH
+            else:
+                depth = MAX_PLY
+        depth = min(depth, MAX_PLY)
+        if time_ms is None:
+            deadline = None
+        else:
+            deadline = time.perf_counter() + time_ms / 1000
+        self._nodes = 0
+        self._node_limit = None
+        self._deadline = None
+        self._table.new_search()
+        self._killers = [[None, None] for ply in range(MAX_PLY + 1)]
+        for scores in self._history:
+            for square in range(90):
+                scores[square] >>= 2
+
+        result = SearchResult(None, 0, 0, [], 0)
+        if game.get_game_state() != 'UNFINISHED':
+            return result
+        for iteration in range(1, depth + 1):
+            try:
+                score = self._negamax(iteration, -INFINITY, INFINITY, 0)
+            except _Stop:
+                break
+            pv = [(SQUARE_NAMES[start], SQUARE_NAMES[end]) for start, end in self._pv[0]]
+            move = pv[0] if pv else None
+            result = SearchResult(move, score, iteration, pv, self._nodes)
+
+            # The first iteration always finishes so that there is a move to return, the budget applies after it
+            self._node_limit = nodes
+            self._deadline = deadline
+
+            # No need to look deeper once there are no moves or a forced mate has been found
+            if move is None or abs(score) >= MATE - MAX_PLY:
+                break
+        return result._replace(nodes=self._nodes)
+
+    def search_move(self, move, depth, time_ms=None, nodes=None):
+        """Searches the position after the root move, a (start, end) pair of integer squares, as part of a depth
+        ply search of the game. Returns the score for the player making the move, the principal variation starting
+        with the move, the nodes searched and whether the search finished within its budget."""
+        game = self._game
+        self._nodes = 0
+        self._node_limit = nodes
+        if time_ms is None:
+            self._deadline = None
+        else:
+            self._deadline = time.perf_counter() + time_ms / 1000
+        game.push(move)
+        try:
+            score = -self._negamax(depth - 1, -INFINITY, INFINITY, 1)
+        except _Stop:
+            return 0, [move], self._nodes, False
+        finally:
+            game.pop()
+        return score, [move] + self._pv[1], self._nodes, True
+
+    def _count(self):
+        """Counts a node and stops the search if it has gone over its budget"""
+        self._nodes += 1
+        if self._node_limit is not None and self._nodes >= self._node_limit:
+            raise _Stop()
+        if self._deadline is not None and self._nodes & 1023 == 0 and time.perf_counter() >= self._deadline:
+            raise _Stop()
+
+    def _negamax(self, depth, alpha, beta, ply):
+        """Returns the score of the position for the player to move, searching depth plies ahead within the window
+        alpha to beta. The principal variation found is left in self._pv[ply]."""
+        self._pv[ply] = []
+        game = self._game
+
+        # A position in the endgame tablebase has its exact score, counting the plies to mate from the root
+        tablebase = game.get_tablebase()
+        if tablebase is not None and ply > 0:
+            found = tablebase.probe(game)
+            if found is not None:
+                result, distance = found
+                if result == 'WIN':
+                    return MATE - ply - distance
+                elif result == 'LOSS':
+                    return -MATE + ply + distance
+                return 0
+
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(alpha, beta, ply)
+        self._count()
+        key = game.get_hash()
+
+        # Use the transposition table's score if it was searched deeply enough, and its best move either way
+        entry = self._table.probe(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry.move
+            if entry.depth >= depth and ply > 0:
+                score = _from_table(entry.score, ply)
+                if entry.bound == EXACT or (entry.bound == LOWER and score >= beta) \
+                        or (entry.bound == UPPER and score <= alpha):
+                    return score
+
+        color = game.get_turn()
+        cells = game.get_board().cells
+
+        # Look one ply further when in check so that forced sequences are not cut short
+        if game.is_in_check(color):
+            depth += 1
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        legal = 0
+        for move in self._order(game.pseudo_legal_moves(), table_move, ply):
+            game.push(move)
+            if game.general_los() or game.is_in_check(color):
+                game.pop()
+                continue
+            legal += 1
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.pop()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if score >= beta:
+                        # Remember quiet moves that cause cutoffs for ordering sibling and later positions
+                        if cells[move[1]] == EMPTY:
+                            killers = self._killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self._history[cells[move[0]]][move[1]] += depth * depth
+                        break
+
+        # With no legal moves the player to move has lost, sooner losses being worse
+        if legal == 0:
+            return -MATE + ply
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self._table.store(key, depth, _to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def _quiescence(self, alpha, beta, ply):
+        """Searches only captures until the position is quiet, so that the search never stops in the middle of an
+        exchange. The player to move may also stand pat on the current evaluation."""
+        self._count()
+        game = self._game
+        stand_pat = game.evaluate()
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        color = game.get_turn()
+        cells = game.get_board().cells
+        captures = [move for move in game.pseudo_legal_moves() if cells[move[1]] != EMPTY]
+        for move in self._order(captures, None, ply):
+            game.push(move)
+            if game.general_los() or game.is_in_check(color):
+                game.pop()
+                continue
+            try:
+                score = -self._quiescence(-beta, -alpha, ply + 1)
+            finally:
+                game.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _order(self, moves, table_move, ply):
+        """Sorts moves so the most promising are searched first: the transposition table's move, then captures by
+        MVV-LVA, then the killer moves of this ply, then the rest by history score"""
+        cells = self._game.get_board().cells
+        killers = self._killers[min(ply, MAX_PLY)]
+        history = self._history
+        keyed = []
+        for move in moves:
+            start, end = move
+            if move == table_move:
+                key = 1 << 30
+            elif cells[end] != EMPTY:
+                key = (1 << 24) + ORDER_VALUES[cells[end]] * 16 - ORDER_VALUES[cells[start]]
+            elif move == killers[0]:
+                key = (1 << 23) + 1
+            elif move == killers[1]:
+                key = 1 << 23
+            else:
+                key = min(history[cells[start]][end], (1 << 23) - 1)
+            keyed.append((key, move))
+        keyed.sort(reverse=True)
+        return [move for key, move in keyed]
+
+
+def _to_table(score, ply):
+    """Turns a mate score relative to this ply into one relative to the position, for the transposition table"""
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    """Turns a mate score from the transposition table back into one relative to this ply"""
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+# The worker side of ParallelSearcher: the shared memory holding the transposition table, and the searcher for the
+# position the worker was last asked about
+_worker_memory = None
+_worker_table = None
+_worker_searcher = None
+_worker_fen = None
+
+
+def _start_worker(memory_name):
+    """Attaches a worker process to the shared transposition table"""
+    global _worker_memory, _worker_table
+    _worker_memory = shared_memory.SharedMemory(memory_name)
+    _worker_table = TranspositionTable(buffer=_worker_memory.buf)
+
+
+def _search_root_move(job):
+    """Searches one root move in a worker process. The job is the position as FEN, the move, the depth, the wall
+    clock time to stop at (or None) and a node budget (or None)."""
+    global _worker_searcher, _worker_fen
+    fen, move, depth, deadline, nodes = job
+    if fen != _worker_fen:
+        _worker_searcher = Searcher(XiangqiGame.from_fen(fen), table=_worker_table)
+        _worker_table.new_search()
+        _worker_fen = fen
+    time_ms = None
+    if deadline is not None:
+        time_ms = max(0, (deadline - time.time()) * 1000)
+    score, pv, searched, finished = _worker_searcher.search_move(move, depth, time_ms, nodes)
+    return move, score, pv, searched, finished
+
+
+def _shut_down(pool, memory):
+    """Stops the worker processes and frees the shared transposition table"""
+    pool.terminate()
+    pool.join()
+    memory.close()
+    memory.unlink()
+
+
+class ParallelSearcher:
+    """Searches positions with a pool of worker processes. At each depth of iterative deepening the legal moves of
+    the root position are shared out between the workers, best first by the previous depth's scores, and the best
+    of their results is kept. Positions are sent to the workers as FEN, and every worker reads and writes one
+    transposition table held in shared memory, so the workers profit from each other's results."""
+
+    def __init__(self, workers=None, table_mb=64):
+        """Initializes the searcher with workers processes (one per CPU if not given) and a shared transposition
+        table of table_mb megabytes. close() stops the workers; otherwise they stop when the searcher is deleted."""
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self._workers = workers
+        self._memory = shared_memory.SharedMemory(create=True, size=TranspositionTable.bytes_needed(table_mb))
+        self._pool = multiprocessing.Pool(workers, _start_worker, (self._memory.name,))
+        self._finalizer = weakref.finalize(self, _shut_down, self._pool, self._memory)
+
+    def get_workers(self):
+        """A get method for the number of worker processes"""
+        return self._workers
+
+    def close(self):
+        """Stops the worker processes and frees the shared transposition table"""
+        self._finalizer()
+
+    def search(self, fen, depth=None, time_ms=None, nodes=None):
+        """Searches the position given as FEN like Searcher.search and returns a SearchResult. The node budget
+        applies to the search of each root move."""
+        if depth is None:
+            if time_ms is None and nodes is None:
+                depth = DEFAULT_DEPTH
+            else:
+                depth = MAX_PLY
+        depth = min(depth, MAX_PLY)
+        if time_ms is None:
+            deadline = None
+        else:
+            deadline = time.time() + time_ms / 1000
+
+        result = SearchResult(None, 0, 0, [], 0)
+        game = XiangqiGame.from_fen(fen)
+        moves = game.legal_moves()
+        if not moves:
+            return result
+        searched = 0
+        for iteration in range(1, depth + 1):
+            # The first iteration always finishes so that there is a move to return, the budget applies after it
+            jobs = [(fen, move, iteration, deadline if iteration > 1 else None, nodes if iteration > 1 else None)
+                    for move in moves]
+            scores = {}
+            finished = True
+            best = None
+            for move, score, pv, move_nodes, move_finished in self._pool.imap(_search_root_move, jobs):
+                searched += move_nodes
+                finished = finished and move_finished
+                scores[move] = score
+                if best is None or score > best[0]:
+                    best = (score, pv)
+            if not finished:
+                break
+            score, pv = best
+            pv = [(SQUARE_NAMES[start], SQUARE_NAMES[end]) for start, end in pv]
+            result = SearchResult(pv[0], score, iteration, pv, searched)
+
+            # Search the best moves first at the next depth, and stop once a forced mate has been found
+            moves.sort(key=lambda move: scores[move], reverse=True)
+            if abs(score) >= MATE - MAX_PLY:
+                break
+        return result._replace(nodes=searched)
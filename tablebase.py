@@ -0,0 +1,393 @@
+# Description: Endgame tablebases for XiangqiGame. For a small set of pieces, every position is solved by retrograde
+# analysis and stored on disk as win, draw or loss for the side to move with the distance to mate, and the stored
+# tables are memory-mapped for probing.
+
+import argparse
+import mmap
+import os
+import struct
+from array import array
+from itertools import product
+
+from bitboard import BitboardEngine, PALACE, ADVISOR_POINTS, ELEPHANT_POINTS, squares
+from game import GENERAL, ADVISOR, ELEPHANT, KNIGHT, ROOK, CANON, SOLDIER, BLACK
+
+# Results stored for a position, from the point of view of the side to move. Positions that cannot arise (two pieces
+# on one point, the generals facing, or the side that just moved in check) are INVALID. A position left unsolved
+# after the analysis is a DRAW
+DRAW = 0
+WIN = 1
+LOSS = 2
+INVALID = 3
+RESULT_NAMES = {DRAW: 'DRAW', WIN: 'WIN', LOSS: 'LOSS'}
+
+# Letters naming the pieces of a material set, in the order they are listed. A set is written as the red pieces, a
+# dash and the black pieces, each side starting with its general, like 'KR-KAA'
+MATERIAL_LETTERS = {'K': GENERAL, 'A': ADVISOR, 'B': ELEPHANT, 'N': KNIGHT, 'R': ROOK, 'C': CANON, 'P': SOLDIER}
+MATERIAL_ORDER = 'KABNRCP'
+_CODE_LETTERS = {kind: letter for letter, kind in MATERIAL_LETTERS.items()}
+
+# A table file is a header (magic, version, length of the material name) and the name, then one little-endian
+# 16-bit entry for every position: the result in the top two bits and the distance to mate in plies below
+HEADER = struct.Struct('<4sHH')
+MAGIC = b'XQTB'
+VERSION = 1
+MAX_DISTANCE = (1 << 14) - 1
+
+
+def _soldier_points(side):
+    """Returns the bitmask of every point a soldier of the side (0 red, 1 black) can ever stand on: the columns it
+    starts on in the two rows before the river, and anywhere across it"""
+    points = 0
+    for square in range(90):
+        row, column = divmod(square, 9)
+        if side == 1:
+            row = 9 - row
+        if row >= 5 or (row in (3, 4) and column % 2 == 0):
+            points |= 1 << square
+    return points
+
+
+def _points(code):
+    """Returns the sorted list of points a piece with the code can stand on"""
+    kind = code & 7
+    side = code >> 3
+    if kind == GENERAL:
+        mask = PALACE[side]
+    elif kind == ADVISOR:
+        mask = ADVISOR_POINTS[side]
+    elif kind == ELEPHANT:
+        mask = ELEPHANT_POINTS[side]
+    elif kind == SOLDIER:
+        mask = _soldier_points(side)
+    else:
+        mask = (1 << 90) - 1
+    return list(squares(mask))
+
+
+def normalize_material(name):
+    """Returns the material name written in the standard way, with each side's pieces in MATERIAL_ORDER, or raises
+    ValueError if it is not a valid material set"""
+    sides = name.upper().split('-')
+    if len(sides) != 2:
+        raise ValueError('material must be red pieces, a dash and black pieces, like KR-KAA: ' + repr(name))
+    for side in sides:
+        if side.count('K') != 1 or any(letter not in MATERIAL_LETTERS for letter in side):
+            raise ValueError('each side needs one K and only the letters ' + MATERIAL_ORDER + ': ' + repr(name))
+    return '-'.join(''.join(sorted(side, key=MATERIAL_ORDER.index)) for side in sides)
+
+
+def material_of(game):
+    """Returns the material name (see normalize_material) of the pieces left in the game"""
+    sides = []
+    for pieces in (game.get_red_pieces_left(), game.get_black_pieces_left()):
+        letters = [_CODE_LETTERS[piece.get_code() & 7] for piece in pieces]
+        sides.append(''.join(sorted(letters, key=MATERIAL_ORDER.index)))
+    return '-'.join(sides)
+
+
+class Material:
+    """A material set and the numbering of its positions. Every piece gets a slot, and a position's index is made
+    from the index of each piece's point among the points it can stand on, with the side to move as the last
+    digit."""
+
+    def __init__(self, name):
+        """Initializes the numbering for the material name (see normalize_material)"""
+        self.name = normalize_material(name)
+        red, black = self.name.split('-')
+        self.codes = [MATERIAL_LETTERS[letter] for letter in red]
+        self.codes += [MATERIAL_LETTERS[letter] | BLACK for letter in black]
+        self.points = [_points(code) for code in self.codes]
+        self.point_index = [{square: index for index, square in enumerate(points)} for points in self.points]
+        self.strides = []
+        stride = 2
+        for points in reversed(self.points):
+            self.strides.insert(0, stride)
+            stride *= len(points)
+        self.size = stride
+
+    def without(self, slot):
+        """Returns the material left after the piece in the slot is captured"""
+        red, black = self.name.split('-')
+        if slot < len(red):
+            red = red[:slot] + red[slot + 1:]
+        else:
+            slot -= len(red)
+            black = black[:slot] + black[slot + 1:]
+        return Material(red + '-' + black)
+
+    def index(self, slot_squares, side):
+        """Returns the index of the position with the pieces of each slot on slot_squares and the side to move (0
+        red, 1 black), or None if a piece stands where this material never puts it"""
+        index = side
+        for slot, square in enumerate(slot_squares):
+            point = self.point_index[slot].get(square)
+            if point is None:
+                return None
+            index += point * self.strides[slot]
+        return index
+
+    def slot_squares(self, game):
+        """Returns the squares of the game's pieces in slot order, pieces of the same kind by square"""
+        by_code = {}
+        for piece in game.get_red_pieces_left() + game.get_black_pieces_left():
+            by_code.setdefault(piece.get_code(), []).append(piece.get_square())
+        for found in by_code.values():
+            found.sort()
+        return [by_code[code].pop(0) for code in self.codes]
+
+
+def table_path(directory, name):
+    """Returns the file a table is stored in"""
+    return os.path.join(directory, normalize_material(name) + '.xtb')
+
+
+def _solve(material, subtables):
+    """Solves every position of the material and returns its entries (see HEADER). subtables maps the material
+    left after each possible capture to its entries."""
+    size = material.size
+    engine = BitboardEngine(bytes(90))
+    slots = len(material.codes)
+    results = bytearray(size)
+    distances = array('H', bytes(2 * size))
+    remaining = array('H', bytes(2 * size))
+
+    # Moves between positions of this material, kept as parent lists for each child (filled in two passes)
+    edges = array('I')
+    wins = {}
+    decrements = {}
+    losses = []
+
+    # Walk every placement of the pieces and both sides to move, generating the legal moves of each position
+    captured_material = {slot: material.without(slot) for slot in range(slots)
+                         if material.codes[slot] & 7 != GENERAL}
+    colors = ('red', 'black')
+    for points in product(*[range(len(points)) for points in material.points]):
+        slot_squares = [material.points[slot][point] for slot, point in enumerate(points)]
+        base = sum(point * stride for point, stride in zip(points, material.strides))
+        if len(set(slot_squares)) < slots:
+            results[base] = results[base + 1] = INVALID
+            continue
+        for slot, square in enumerate(slot_squares):
+            engine.place(square, material.codes[slot])
+        slot_of = {square: slot for slot, square in enumerate(slot_squares)}
+        facing = engine.generals_facing()
+        for side in (0, 1):
+            index = base + side
+            color = colors[side]
+            if facing or engine.in_check(colors[side ^ 1]):
+                results[index] = INVALID
+                continue
+            legal = 0
+            for start, end in engine.moves(color):
+                engine.push(start, end)
+                if engine.generals_facing() or engine.in_check(color):
+                    engine.pop()
+                    continue
+                engine.pop()
+                legal += 1
+                moved = slot_of[start]
+                if end in slot_of:
+                    # A capture leads to a smaller material, whose result is already known
+                    captured = slot_of[end]
+                    after = list(slot_squares)
+                    after[moved] = end
+                    del after[captured]
+                    child_material = captured_material[captured]
+                    entry = subtables[child_material.name][child_material.index(after, side ^ 1)]
+                    child_result, child_distance = entry >> 14, entry & MAX_DISTANCE
+                    if child_result == LOSS:
+                        wins.setdefault(child_distance + 1, []).append(index)
+                    elif child_result == WIN:
+                        decrements.setdefault(child_distance + 1, []).append(index)
+                else:
+                    child = (index ^ 1) + (material.point_index[moved][end] - points[moved]) * material.strides[moved]
+                    edges.append(child)
+                    edges.append(index)
+            remaining[index] = legal
+
+            # With no legal move the side to move has lost, whether in check or not
+            if legal == 0:
+                losses.append(index)
+        for square in slot_squares:
+            engine.clear(square)
+
+    # Group the parents of every child position
+    starts = array('I', bytes(4 * (size + 1)))
+    for position in range(0, len(edges), 2):
+        starts[edges[position] + 1] += 1
+    for index in range(size):
+        starts[index + 1] += starts[index]
+    parents = array('I', bytes(4 * (len(edges) // 2)))
+    filled = array('I', starts)
+    for position in range(0, len(edges), 2):
+        child = edges[position]
+        parents[filled[child]] = edges[position + 1]
+        filled[child] += 1
+    del edges, filled
+
+    # Settle positions in order of distance to mate. A position is won at distance n by its first move to a
+    # position lost at n - 1, and lost at distance n when its last move to a position won by the opponent is seen
+    # at n - 1, so each layer only needs the events queued by the one before it
+    settled = losses
+    distance = 0
+    while settled or wins or decrements:
+        if distance > MAX_DISTANCE:
+            raise ValueError('distance to mate too long to store in ' + material.name)
+        for index in settled:
+            results[index] = LOSS
+            distances[index] = distance
+            for position in range(starts[index], starts[index + 1]):
+                wins.setdefault(distance + 1, []).append(parents[position])
+        settled = []
+        for index in wins.pop(distance + 1, []):
+            if results[index] == DRAW:
+                results[index] = WIN
+                distances[index] = distance + 1
+                for position in range(starts[index], starts[index + 1]):
+                    decrements.setdefault(distance + 2, []).append(parents[position])
+        for index in decrements.pop(distance + 2, []):
+            if results[index] == DRAW:
+                remaining[index] -= 1
+                if remaining[index] == 0:
+                    settled.append(index)
+        distance += 2
+
+    entries = array('H', bytes(2 * size))
+    for index in range(size):
+        if results[index] != DRAW:
+            entries[index] = results[index] << 14 | distances[index]
+    return entries
+
+
+def build_tablebase(name, directory, rebuild=False):
+    """Builds the table of the material name in directory, first building the tables of every material a capture
+    can lead to. Tables already in the directory are reused unless rebuild is True. Returns the table's entries."""
+    material = Material(name)
+    path = table_path(directory, material.name)
+    if not rebuild and os.path.exists(path):
+        with open(path, 'rb') as table:
+            return _read_entries(table.read())
+    subtables = {}
+    for slot, code in enumerate(material.codes):
+        if code & 7 != GENERAL:
+            smaller = material.without(slot)
+            if smaller.name not in subtables:
+                subtables[smaller.name] = build_tablebase(smaller.name, directory, rebuild)
+    entries = _solve(material, subtables)
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as table:
+        encoded = material.name.encode('ascii')
+        table.write(HEADER.pack(MAGIC, VERSION, len(encoded)) + encoded)
+        if entries.itemsize != 2 or struct.pack('=H', 1) != struct.pack('<H', 1):
+            entries = array('H', entries)
+            entries.byteswap()
+        table.write(entries.tobytes())
+    return entries
+
+
+def _read_entries(data):
+    """Returns the entries of a table file's contents"""
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a tablebase file')
+    entries = array('H', data[HEADER.size + length:])
+    if struct.pack('=H', 1) != struct.pack('<H', 1):
+        entries.byteswap()
+    return entries
+
+
+def _read_material(path):
+    """Returns the Material named in the header of the table file at path"""
+    with open(path, 'rb') as table:
+        header = table.read(HEADER.size)
+        if len(header) == HEADER.size:
+            magic, version, length = HEADER.unpack(header)
+            if magic == MAGIC and version == VERSION:
+                return Material(table.read(length).decode('ascii'))
+    raise ValueError('not a tablebase file: ' + path)
+
+
+class Tablebase:
+    """The tables in a directory, opened for probing. Each table is memory-mapped the first time a position with its
+    material is probed, so probing reads only the entries asked for."""
+
+    def __init__(self, directory):
+        """Opens the tables in directory"""
+        self._directory = directory
+        self._tables = {}
+
+        # Positions with more pieces than the biggest table are turned away without working out their material
+        self._most_pieces = 0
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.xtb'):
+                material = _read_material(os.path.join(directory, file_name))
+                self._most_pieces = max(self._most_pieces, len(material.codes))
+
+    def close(self):
+        """Closes every table opened so far"""
+        for table in self._tables.values():
+            if table is not None:
+                table[1].close()
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def _table(self, name):
+        """Returns the material, mapped file and offset of the first entry of a table, or None if there is none"""
+        if name not in self._tables:
+            path = table_path(self._directory, name)
+            if not os.path.exists(path):
+                self._tables[name] = None
+            else:
+                with open(path, 'rb') as table:
+                    mapped = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, length = HEADER.unpack_from(mapped)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError('not a tablebase file: ' + path)
+                self._tables[name] = (Material(name), mapped, HEADER.size + length)
+        return self._tables[name]
+
+    def probe(self, game):
+        """Looks up the game's position. Returns a (result, distance) pair where result is 'WIN', 'DRAW' or 'LOSS'
+        for the player whose turn it is and distance is the number of plies to mate with best play, or None if
+        there is no table for the material left."""
+        if len(game.get_red_pieces_left()) + len(game.get_black_pieces_left()) > self._most_pieces:
+            return None
+        table = self._table(material_of(game))
+        if table is None:
+            return None
+        material, mapped, offset = table
+        side = 0 if game.get_turn() == 'red' else 1
+        index = material.index(material.slot_squares(game), side)
+        if index is None:
+            return None
+        entry = struct.unpack_from('<H', mapped, offset + 2 * index)[0]
+        result = entry >> 14
+        if result == INVALID:
+            return None
+        return RESULT_NAMES[result], entry & MAX_DISTANCE
+
+
+def cli(argv=None):
+    """Builds the tables of the material sets given on the command line"""
+    parser = argparse.ArgumentParser(description='Build XiangQi endgame tablebases.')
+    parser.add_argument('material', nargs='+', help='material sets such as KR-KAA (red pieces, dash, black pieces)')
+    parser.add_argument('--directory', default='tablebases', help='directory for the tables (default tablebases)')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild tables that already exist')
+    args = parser.parse_args(argv)
+    for name in args.material:
+        entries = build_tablebase(name, args.directory, args.rebuild)
+        counts = {result: 0 for result in (WIN, DRAW, LOSS, INVALID)}
+        for entry in entries:
+            counts[entry >> 14] += 1
+        print('%s: %d wins, %d draws, %d losses, %d invalid' % (normalize_material(name), counts[WIN], counts[DRAW],
+                                                                 counts[LOSS], counts[INVALID]))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,75 @@
+# Description: Tests for the batch features in batch.py, checked position by position against XiangqiGame.
+
+import random
+
+import pytest
+
+from game import XiangqiGame, PERFT_POSITIONS
+
+np = pytest.importorskip('numpy')
+batch = pytest.importorskip('batch')
+
+
+def _sample_games():
+    """Returns games at positions along seeded random games from the bundled positions, with both sides to move,
+    and two positions in check"""
+    chooser = random.Random(16)
+    games = []
+    for name, fen, known in PERFT_POSITIONS:
+        game = XiangqiGame.from_fen(fen)
+        for ply in range(40):
+            if ply % 8 == 0:
+                games.append(XiangqiGame.from_fen(game.to_fen()))
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.make_move(*chooser.choice(moves))
+    # Red in check from a rook along the bottom rank and from a knight
+    for fen in ('3k5/9/9/9/9/9/9/9/9/3r1K3 w - - 0 1', '3k5/9/9/9/9/9/9/3n5/9/4K4 w - - 0 1'):
+        games.append(XiangqiGame.from_fen(fen))
+    return games
+
+
+def _moves_of(game, color):
+    """Counts the moves the color could make by the pieces' movement rules"""
+    turn = game.get_turn()
+    game.set_turn(color)
+    count = len(game.pseudo_legal_moves())
+    game.set_turn(turn)
+    return count
+
+
+def test_features_match_games():
+    """Evaluations, move counts and check flags are those XiangqiGame gives, from FEN and from position_bytes"""
+    games = _sample_games()
+    from_fen = batch.decode_positions([game.to_fen() for game in games])
+    from_bytes = batch.decode_positions([batch.position_bytes(game) for game in games])
+    assert np.array_equal(from_fen[0], from_bytes[0]) and np.array_equal(from_fen[1], from_bytes[1])
+    features = batch.batch_features(*from_fen, chunk_size=7)
+    for index, game in enumerate(games):
+        assert features.evaluation[index] == game.evaluate()
+        assert features.red_mobility[index] == _moves_of(game, 'red')
+        assert features.black_mobility[index] == _moves_of(game, 'black')
+        assert features.red_in_check[index] == game.is_in_check('red')
+        assert features.black_in_check[index] == game.is_in_check('black')
+
+
+def test_planes():
+    """Each plane marks exactly the points holding its piece code"""
+    games = _sample_games()
+    planes, side = batch.encode_positions([game.to_fen() for game in games])
+    assert planes.shape == (len(games), 14, 10, 9)
+    for index, game in enumerate(games):
+        cells = game.get_board().cells
+        for plane, code in enumerate(batch.PLANE_CODES):
+            marked = [square for square in range(90) if planes[index, plane, square // 9, square % 9]]
+            assert marked == [square for square in range(90) if cells[square] == code]
+        assert side[index] == (game.get_turn() == 'black')
+
+
+def test_empty_batch_and_bad_bytes():
+    """An empty batch gives empty features, and a compact position of the wrong length is refused"""
+    cells, side = batch.decode_positions([])
+    assert len(batch.batch_features(cells, side).evaluation) == 0
+    with pytest.raises(ValueError):
+        batch.decode_positions([bytes(90)])
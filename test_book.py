@@ -0,0 +1,43 @@
+# Description: Tests for the opening book in book.py. A book is built from a few games and looked into.
+
+import random
+
+from book import build_book, OpeningBook, cli
+from game import XiangqiGame
+from notation import parse_iccs
+
+GAMES = [('h2e2 h9g7 h0g2', '1-0'), ('h2-e2 h9-g7', '1-0'), ('b2e2 h9g7', '0-1'), ('h2e2 b9c7', '1/2')]
+
+
+def _book(tmp_path):
+    """Builds the book of GAMES and returns its path"""
+    path = str(tmp_path / 'opening.book')
+    assert build_book(GAMES, path) == 6
+    return path
+
+
+def test_lookups(tmp_path):
+    """Moves come back with their weights and game counts, a win counting twice a draw and an unknown result as a
+    draw, and a position not in the book has no moves"""
+    game = XiangqiGame()
+    with OpeningBook(_book(tmp_path)) as book:
+        assert len(book) == 6
+        assert sorted(book.moves(game.get_hash())) == [(parse_iccs('b2e2'), 0, 1), (parse_iccs('h2e2'), 5, 3)]
+        game.make_move(*parse_iccs('h2e2'))
+        assert sorted(book.moves(game.get_hash())) == [(parse_iccs('b9c7'), 1, 1), (parse_iccs('h9g7'), 0, 2)]
+        game.make_move(*parse_iccs('b9c7'))
+        assert book.moves(game.get_hash()) == []
+        assert book.choose(game) is None
+
+
+def test_choose(tmp_path):
+    """A move is picked among the book moves by weight, so one that only lost is never picked"""
+    with OpeningBook(_book(tmp_path)) as book:
+        chooser = random.Random(17)
+        assert {book.choose(XiangqiGame(), chooser) for number in range(20)} == {parse_iccs('h2e2')}
+
+
+def test_show(tmp_path, capsys):
+    """The show command lists the moves in ICCS"""
+    cli(['show', _book(tmp_path)])
+    assert sorted(capsys.readouterr().out.splitlines()) == ['b2-e2 0 1', 'h2-e2 5 3']
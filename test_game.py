@@ -0,0 +1,169 @@
+# Description: Tests for game.py. Perft counts are checked against the known values in PERFT_POSITIONS and the
+# legality filter against trying every move, with both engines, along with FEN reading and repetitions.
+
+import random
+
+import pytest
+
+from game import XiangqiGame, PERFT_POSITIONS
+
+ENGINES = ('objects', 'bitboard')
+KNOWN = {name: (fen, known) for name, fen, known in PERFT_POSITIONS}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', ['start', 'rook check', 'knight and canon'])
+def test_perft(engine, name):
+    """Counts the positions reached in three plies and compares them with the known counts"""
+    fen, known = KNOWN[name]
+    game = XiangqiGame.from_fen(fen, engine)
+    for depth in (1, 2, 3):
+        assert game.perft(depth) == known[depth]
+    assert game.to_fen() == XiangqiGame.from_fen(fen).to_fen()
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_divide_sums_to_perft(engine):
+    """The counts divide gives for each move add up to perft"""
+    fen, known = KNOWN['knight and canon']
+    game = XiangqiGame.from_fen(fen, engine)
+    assert sum(game.divide(2).values()) == known[2]
+
+
+def _brute_force_moves(game):
+    """Returns the legal moves of the game found by playing every pseudo-legal move and taking it back"""
+    color = game.get_turn()
+    moves = []
+    for move in game.pseudo_legal_moves():
+        game.push(move)
+        if not game.general_los() and not game.is_in_check(color):
+            moves.append(move)
+        game.pop()
+    return sorted(moves)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', ['start', 'rook check', 'attack'])
+def test_legal_moves_match_brute_force(engine, name):
+    """Along seeded random games, legal_moves (which uses pins and checks) agrees with trying every move, and the
+    two engines generate the same pseudo-legal moves"""
+    fen = KNOWN[name][0]
+    chooser = random.Random(name)
+    for number in range(3):
+        game = XiangqiGame.from_fen(fen, engine)
+        other = XiangqiGame.from_fen(fen, ENGINES[engine == ENGINES[0]])
+        for ply in range(80):
+            if game.get_game_state() != 'UNFINISHED':
+                break
+            legal = _brute_force_moves(game)
+            assert sorted(game.legal_moves()) == legal, game.to_fen()
+            assert sorted(game.pseudo_legal_moves()) == sorted(other.pseudo_legal_moves()), game.to_fen()
+            assert game.is_in_check(game.get_turn()) == other.is_in_check(other.get_turn()), game.to_fen()
+            if not legal:
+                break
+
+            # Prefer captures, which reach the pins and checks a quiet game rarely does
+            captures = [move for move in legal if game.get_board().cells[move[1]]]
+            if captures and chooser.random() < 0.5:
+                move = chooser.choice(captures)
+            else:
+                move = chooser.choice(legal)
+            assert game.make_move(*move) and other.make_move(*move)
+
+
+def test_facing_general_moves_left_out():
+    """A general never steps onto an open column facing the enemy general, in either engine's move list"""
+    fen = 'r1bk1abnr/4a4/n6c1/6p2/p3p3p/2P3P1P/P3P4/N5C2/3cK2CR/R1BA1ABN1 w - - 1 13'
+    for engine in ENGINES:
+        moves = XiangqiGame.from_fen(fen, engine).pseudo_legal_moves()
+        assert (13, 12) not in moves
+
+
+def _repeat(fen, cycle, engine):
+    """Plays the cycle of moves, given as 'start-end' square names, until the game ends and returns its state"""
+    game = XiangqiGame(engine, fen)
+    for move in cycle * 3:
+        if game.get_game_state() != 'UNFINISHED':
+            break
+        assert game.make_move(*move.split('-'))
+    return game.get_game_state()
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('fen, cycle, state', [
+    # Both sides bring their knights out and back
+    (None, ['h1-g3', 'h10-g8', 'g3-h1', 'g8-h10'], 'DRAW'),
+    # The rook's attack on the knight stands before the generals start shuffling, so it is not a chase
+    ('4k4/9/n8/9/9/9/9/R8/9/3K5 w - - 0 1', ['d1-d2', 'e10-e9', 'd2-d1', 'e9-e10'], 'DRAW'),
+    # Red checks with every move
+    ('3k5/7R1/9/9/9/9/9/9/9/4K4 w - - 0 1', ['h9-h10', 'd10-d9', 'h10-h9', 'd9-d10'], 'BLACK_WON'),
+    # Red's rook follows the unprotected canon, attacking it again with every move
+    ('3k5/9/9/9/1c7/9/9/9/R8/4K4 w - - 0 1', ['a2-b2', 'b6-a6', 'b2-a2', 'a6-b6'], 'BLACK_WON'),
+])
+def test_repetition(engine, fen, cycle, state):
+    """A position reached the third time ends the game by the perpetual check and chase rules"""
+    assert _repeat(fen, cycle, engine) == state
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_fen_round_trip(engine):
+    """A FEN read in is written back out unchanged"""
+    for name, fen, known in PERFT_POSITIONS:
+        assert XiangqiGame.from_fen(fen, engine).to_fen() == fen
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('fen', [
+    # No black general, and two red ones
+    '9/9/9/9/9/9/9/9/9/4K4 w - - 0 1',
+    '4k4/9/9/9/9/9/9/9/9/3KK4 w - - 0 1',
+    # Rows too short or too long, and a letter that is not a piece
+    '4k4/9/9/9/9/9/9/9/9/4K3 w - - 0 1',
+    '4k4/9/9/9/9/9/9/9/9/4K5 w - - 0 1',
+    '4k4/9/9/9/9/9/9/9/9/4KX3 w - - 0 1',
+    # Black to move could never have left red able to take its general, nor the generals facing
+    '4k4/9/9/9/9/9/9/9/9/4RK3 w - - 0 1',
+    '4k4/9/9/9/9/9/9/9/9/4K4 w - - 0 1',
+    '4k4/9/9/9/9/9/9/9/9/4K4 b - - 0 1',
+])
+def test_bad_fens(engine, fen):
+    """Positions that cannot be read or could not have come about in a game raise ValueError"""
+    with pytest.raises(ValueError):
+        XiangqiGame.from_fen(fen, engine)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('fen, pinned', [
+    # A knight alone between a rook and the general
+    ('3k5/9/9/9/4r4/9/9/9/4N4/4K4 w - - 0 1', ['e2']),
+    # Both pieces between a canon and the general, and an advisor on the leg of a knight aiming at the general
+    ('3k5/9/4c4/9/9/9/4P4/5n3/4AA3/4K4 w - - 0 1', ['e2', 'e4', 'f2']),
+    # The only piece between the two generals
+    ('4k4/9/9/9/9/9/9/9/4A4/4K4 w - - 0 1', ['e2']),
+    ('rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1', []),
+])
+def test_pinned_pieces(engine, fen, pinned):
+    """The pieces shielding their general are the ones the legality filter finds"""
+    game = XiangqiGame.from_fen(fen, engine)
+    assert sorted(piece.get_position() for piece in game.pinned_pieces('red')) == pinned
+    assert game.pinned_pieces('black') == []
+
+
+def test_attacked_squares_agree():
+    """Along a seeded random game, both engines find the same squares attacked by each color, and every capture
+    the player to move could make is onto a square they attack"""
+    chooser = random.Random(4)
+    game = XiangqiGame('objects')
+    other = XiangqiGame('bitboard')
+    for ply in range(60):
+        attacked = {}
+        for color in ('red', 'black'):
+            attacked[color] = {square for square in range(90) if game.is_attacked(square, color)}
+            assert attacked[color] == {square for square in range(90) if other.is_attacked(square, color)}
+        captures = {end for start, end in game.pseudo_legal_moves() if game.get_board().cells[end]}
+        assert captures <= attacked[game.get_turn()]
+        moves = game.legal_moves()
+        if not moves:
+            break
+        move = chooser.choice(moves)
+        assert game.make_move(*move) and other.make_move(*move)
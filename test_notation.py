@@ -0,0 +1,45 @@
+# Description: Tests for reading and writing moves in notation.py. Moves of seeded random games are written in every
+# notation and read back.
+
+import random
+
+import pytest
+
+from game import XiangqiGame
+from notation import NOTATIONS, parse_move, to_iccs, to_coord, to_wxf, to_chinese
+
+WRITERS = {'iccs': lambda game, move: to_iccs(move), 'coord': lambda game, move: to_coord(move), 'wxf': to_wxf,
+           'chinese': to_chinese}
+
+
+def test_opening_moves():
+    """The central canon and the knight reply read the same in every notation"""
+    game = XiangqiGame()
+    for notation, text in (('iccs', 'h2-e2'), ('coord', 'h3-e3'), ('wxf', 'C2.5'), ('chinese', '炮二平五')):
+        assert parse_move(game, text, notation) == (25, 22)
+    assert game.make_move(25, 22)
+    for notation, text in (('iccs', 'h9g7'), ('wxf', 'H8+7'), ('chinese', '马８进７'), ('chinese', '馬8進7')):
+        assert parse_move(game, text, notation) == (88, 69)
+
+
+@pytest.mark.parametrize('notation', NOTATIONS)
+def test_round_trip(notation):
+    """Every move of a few random games is read back as the move that was written"""
+    chooser = random.Random(notation)
+    for number in range(4):
+        game = XiangqiGame()
+        for ply in range(120):
+            moves = game.legal_moves()
+            if not moves or game.get_game_state() != 'UNFINISHED':
+                break
+            for move in moves:
+                assert parse_move(game, WRITERS[notation](game, move), notation) == move
+            game.make_move(*chooser.choice(moves))
+
+
+@pytest.mark.parametrize('notation, text', [('iccs', 'j2-e2'), ('coord', 'h0-e3'), ('wxf', 'C3.5'),
+                                            ('chinese', '炮二平'), ('chinese', '车二平五'), ('xyz', 'h2-e2')])
+def test_bad_moves(notation, text):
+    """Moves that cannot be read, or name no piece that can make them, raise ValueError"""
+    with pytest.raises(ValueError):
+        parse_move(XiangqiGame(), text, notation)
@@ -0,0 +1,70 @@
+# Description: Tests for streaming games out of PGN archives with pgn.py.
+
+import gzip
+import io
+
+from pgn import read_pgn, resolve_games
+
+ARCHIVE = '''[Event "first"]
+[Format "WXF"]
+[Result "1-0"]
+
+1. C2.5 {the central canon; a comment
+running over two lines (with brackets)} H8+7 $1
+2. H2+3 (2. R1.2 R9+1 (2... C8.5) 3. C8.6) R9.8 ; the rest of the line is a comment 3. R1.2
+3. R1.2 1-0
+
+[Event "second"]
+[Result "*"]
+1. h2e2 h9g7 *
+[Event "third"]
+[Format "Chinese"]
+1. 炮二平五 马８进７ 2. 马二进三 Z9.9 3. 车一平二
+[Event "fourth"]
+[FEN "3k5/9/9/9/9/9/9/9/4R4/4K4 w - - 0 1"]
+1. e1-f1 d9-d8 1/2-1/2
+'''
+
+MOVES = [(25, 22), (88, 69), (7, 24), (89, 88), (8, 7)]
+
+
+def _games(source):
+    """Returns the games of an archive with their moves read"""
+    return list(resolve_games(read_pgn(source)))
+
+
+def test_headers_and_move_text():
+    """Headers are read and move numbers, comments, variations and annotations are left out of the moves"""
+    games = list(read_pgn(io.StringIO(ARCHIVE)))
+    assert [headers['Event'] for headers, moves in games] == ['first', 'second', 'third', 'fourth']
+    assert games[0][0]['Result'] == '1-0'
+    assert games[0][1] == ['C2.5', 'H8+7', 'H2+3', 'R9.8', 'R1.2']
+    assert games[1][1] == ['h2e2', 'h9g7']
+
+
+def test_resolve_moves():
+    """Moves are read in the notation the Format header names, or ICCS, from the FEN header's position if there is
+    one, and a game stops at its first move that cannot be read"""
+    games = _games(io.StringIO(ARCHIVE))
+    assert games[0] == (games[0][0], MOVES)
+    assert 'Error' not in games[0][0]
+    assert games[1][1] == MOVES[:2]
+    assert games[2][1] == MOVES[:3]
+    assert games[2][0]['Error'].startswith('ply 4:')
+    assert games[3][1] == [(13, 14), (84, 75)]
+
+
+def test_files_and_gzip(tmp_path):
+    """Paths, binary and text files and gzip-compressed archives give the same games, and a file given by the
+    caller is left open"""
+    plain = tmp_path / 'games.pgn'
+    plain.write_text(ARCHIVE, encoding='utf-8')
+    packed = tmp_path / 'games.pgn.gz'
+    packed.write_bytes(gzip.compress(ARCHIVE.encode('utf-8')))
+    expected = _games(io.StringIO(ARCHIVE))
+    assert _games(str(plain)) == expected
+    assert _games(str(packed)) == expected
+    with open(packed, 'rb') as archive:
+        assert _games(archive) == expected
+        assert not archive.closed
+    assert _games(io.BytesIO(gzip.compress(ARCHIVE.encode('utf-8')))) == expected
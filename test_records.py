@@ -0,0 +1,76 @@
+# Description: Tests for the binary game format in records.py. Seeded random games are written and read back.
+
+import random
+
+import pytest
+
+from game import XiangqiGame, START_FEN
+from records import GameWriter, GameFile, pack_position, unpack_position, POSITION_SIZE
+
+FENS = [START_FEN, '3k5/9/9/9/9/9/9/9/4R4/4K4 w - - 0 1',
+        'rnbakabnr/9/1c5c1/p2P4p/4p4/4P4/P5p1P/1C5C1/9/RNBAKABNR b - - 3 5']
+
+
+def _random_games(count):
+    """Returns (fen, moves, result, final position) tuples of seeded random games"""
+    chooser = random.Random(25)
+    games = []
+    for number in range(count):
+        fen = FENS[number % len(FENS)]
+        game = XiangqiGame.from_fen(fen)
+        moves = []
+        for ply in range(chooser.randint(0, 100)):
+            legal = game.legal_moves()
+            if not legal or game.get_game_state() != 'UNFINISHED':
+                break
+            moves.append(chooser.choice(legal))
+            game.make_move(*moves[-1])
+        result = chooser.choice([None, '1-0', '0-1', '1/2-1/2'])
+        games.append((fen, moves, result, game.to_fen().split()[:2]))
+    return games
+
+
+def test_position_round_trip():
+    """A packed position is POSITION_SIZE bytes and reads back as the same board and side to move"""
+    for fen in FENS:
+        record = pack_position(XiangqiGame.from_fen(fen))
+        assert len(record) == POSITION_SIZE
+        assert unpack_position(record).split()[:2] == fen.split()[:2]
+
+
+def test_games_round_trip(tmp_path):
+    """Games written with GameWriter are read back by number, in any order, and replay to the same position"""
+    path = str(tmp_path / 'games.xqg')
+    games = _random_games(30)
+    with GameWriter(path) as writer:
+        for fen, moves, result, final in games:
+            writer.add(moves, result, fen)
+    with GameFile(path) as records:
+        assert len(records) == len(games)
+        game = XiangqiGame()
+        for number in random.Random(1).sample(range(len(games)), len(games)):
+            fen, moves, result, final = games[number]
+            record = records[number]
+            assert record.moves == moves
+            assert record.result == result
+            assert record.fen.split()[:2] == fen.split()[:2]
+            assert records.replay(number, game).to_fen().split()[:2] == final
+        assert records[-1].moves == games[-1][1]
+        with pytest.raises(IndexError):
+            records[len(games)]
+
+
+def test_empty_and_bad_files(tmp_path):
+    """A file with no games opens empty, and one that is not a games file raises ValueError"""
+    path = str(tmp_path / 'empty.xqg')
+    GameWriter(path).close()
+    with GameFile(path) as records:
+        assert len(records) == 0
+        assert list(records) == []
+    with GameWriter(str(tmp_path / 'other.xqg')) as writer:
+        with pytest.raises(ValueError):
+            writer.add([], '2-0')
+    bad = tmp_path / 'bad.xqg'
+    bad.write_bytes(b'not a games file at all, not even close')
+    with pytest.raises(ValueError):
+        GameFile(str(bad))
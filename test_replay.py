@@ -0,0 +1,86 @@
+# Description: Tests for replay.py. Games are replayed one by one and checked against playing them with make_move,
+# games with a bad move report the ply it was at instead of raising, and a pool of workers gives the same results.
+
+import random
+
+import pytest
+
+from game import XiangqiGame
+from notation import parse_move, to_iccs
+from replay import parallel_replay, replay_game, replay_games, split_moves
+
+
+def _random_games(count, plies, seed):
+    """Returns count seeded random games of up to plies moves each, as strings of ICCS moves"""
+    chooser = random.Random(seed)
+    game = XiangqiGame()
+    games = []
+    for number in range(count):
+        game.reset()
+        moves = []
+        for ply in range(plies):
+            legal = game.legal_moves()
+            if not legal or game.get_game_state() != 'UNFINISHED':
+                break
+            move = chooser.choice(legal)
+            game.make_move(*move)
+            moves.append(to_iccs(move))
+        games.append(' '.join(moves))
+    return games
+
+
+# Games with a move that is not legal and one that cannot be read
+BAD_GAMES = ['h2e2 h9g7 a0a5', '1. h2e2 h9g7 2. zz99']
+
+
+def test_split_moves():
+    """Move numbers are left out of a string of moves, and a list is returned as it is"""
+    assert split_moves('1. h2e2 h9g7 2. h0g2') == ['h2e2', 'h9g7', 'h0g2']
+    moves = [(1, 2)]
+    assert split_moves(moves) is moves
+
+
+@pytest.mark.parametrize('engine', ('objects', 'bitboard'))
+def test_replay_matches_make_move(engine):
+    """Every game replays to the same positions and state as playing its moves with make_move"""
+    games = _random_games(6, 60, 12)
+    for result, moves in zip(replay_games(games, fens=True, hashes=True, engine=engine), games):
+        game = XiangqiGame(engine)
+        fens = []
+        for move in moves.split():
+            assert game.make_move(*parse_move(game, move, 'iccs'))
+            fens.append(game.to_fen())
+        assert result.plies == len(fens) and result.fens == fens
+        assert result.illegal_ply is None and result.error is None
+        assert result.state == game.get_game_state()
+        assert result.hashes[-1] == game.get_hash()
+
+
+def test_bad_moves_reported():
+    """A game with a bad move keeps the plies before it and says which ply it was, and the next game still plays"""
+    results = list(replay_games(BAD_GAMES + ['h2e2']))
+    assert [(result.index, result.plies, result.illegal_ply) for result in results[:2]] == [(0, 2, 2), (1, 2, 2)]
+    assert results[0].error == 'illegal move: a0a5'
+    assert 'zz99' in results[1].error
+    assert results[2].illegal_ply is None and results[2].plies == 1
+    assert results[2].fens is None and results[2].hashes is None
+
+
+def test_replay_game_from_position():
+    """replay_game plays on from the game's current position, and no move is legal once the game is over"""
+    # The rook on b8 leaves the black general no move
+    game = XiangqiGame(fen='3k5/9/9/9/9/9/9/9/RR7/4K4 w - - 0 1')
+    result = replay_game(game, ['b1b8', 'd9d8'], index=5)
+    assert (result.index, result.state, result.plies, result.illegal_ply) == (5, 'RED_WON', 1, 1)
+    assert result.error == 'illegal move: d9d8'
+
+
+def test_parallel_replay_matches_serial():
+    """Replaying in worker processes gives the same results in the same order as replaying in this one, bad games
+    included, whatever the chunk size"""
+    games = _random_games(8, 40, 13)
+    games[3:3] = BAD_GAMES
+    serial = list(replay_games(games, fens=True, hashes=True))
+    for chunksize in (1, 3):
+        assert list(parallel_replay(games, 2, chunksize, fens=True, hashes=True)) == serial
+    assert [result.illegal_ply for result in serial[3:5]] == [2, 2]
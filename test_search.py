@@ -0,0 +1,81 @@
+# Description: Tests for the searches in search.py.
+
+import pytest
+
+from game import XiangqiGame, SQUARE_NAMES, PERFT_POSITIONS
+from search import Searcher, ParallelSearcher, MATE, MAX_PLY
+
+# Red mates at once with the rook
+MATE_IN_ONE = '3k5/9/9/9/9/9/9/9/9/4K3R w - - 0 1'
+POSITIONS = [fen for name, fen, known in PERFT_POSITIONS if name in ('start', 'attack', 'knight and canon')]
+
+
+def _names(game):
+    """Returns the legal moves of the game as (start, end) pairs of square names, the way searches give them"""
+    return [(SQUARE_NAMES[start], SQUARE_NAMES[end]) for start, end in game.legal_moves()]
+
+
+def _assert_mates(fen, result):
+    """Checks that the result's move mates at once from the position and is scored as a mate"""
+    assert result.score >= MATE - MAX_PLY
+    game = XiangqiGame.from_fen(fen)
+    assert game.make_move(*result.move)
+    assert game.get_game_state() == 'RED_WON'
+
+
+def test_mate_in_one():
+    """The search finds the mate in one"""
+    game = XiangqiGame.from_fen(MATE_IN_ONE)
+    _assert_mates(MATE_IN_ONE, Searcher(game).search(depth=3))
+
+
+def test_parallel_mate_in_one():
+    """The parallel search finds the mate in one"""
+    searcher = ParallelSearcher(workers=2, table_mb=1)
+    try:
+        _assert_mates(MATE_IN_ONE, searcher.search(MATE_IN_ONE, depth=3))
+    finally:
+        searcher.close()
+
+
+def test_parallel_every_depth_gives_a_legal_move():
+    """Each depth of the parallel search returns a legal move starting its principal variation"""
+    fen = POSITIONS[0]
+    legal = _names(XiangqiGame.from_fen(fen))
+    searcher = ParallelSearcher(workers=2, table_mb=1)
+    try:
+        for depth in range(1, 3):
+            result = searcher.search(fen, depth=depth)
+            assert result.depth == depth
+            assert result.move in legal
+            assert result.pv[0] == result.move
+    finally:
+        searcher.close()
+
+
+@pytest.mark.parametrize('fen', POSITIONS)
+def test_every_depth_gives_a_legal_move(fen):
+    """Each depth of iterative deepening returns a legal move, reached at that depth, starting its principal
+    variation"""
+    game = XiangqiGame.from_fen(fen)
+    legal = _names(game)
+    searcher = Searcher(game, table_mb=1)
+    for depth in range(1, 4):
+        result = searcher.search(depth=depth)
+        assert result.depth == depth
+        assert result.move in legal
+        assert result.pv[0] == result.move
+
+
+@pytest.mark.parametrize('fen', POSITIONS)
+def test_search_leaves_the_game_as_it_was(fen):
+    """After a search, and after one cut short by its node budget, the game is exactly where it was"""
+    game = XiangqiGame.from_fen(fen)
+    game.make_move(*game.legal_moves()[0])
+    before = (game.to_fen(), game.get_hash(), game.get_plies(), game.get_repetitions(), game.get_turn(),
+              game.get_game_state(), sorted(game.legal_moves()))
+    searcher = Searcher(game, table_mb=1)
+    for limits in ({'depth': 3}, {'nodes': 500}):
+        searcher.search(**limits)
+        assert (game.to_fen(), game.get_hash(), game.get_plies(), game.get_repetitions(), game.get_turn(),
+                game.get_game_state(), sorted(game.legal_moves())) == before
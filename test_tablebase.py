@@ -0,0 +1,105 @@
+# Description: Tests for tablebase.py. The rook against a bare general is solved, and every probed result is checked
+# against the results of the positions one move on.
+
+import random
+
+import pytest
+
+from game import XiangqiGame, FEN_LETTERS, BLACK, START_FEN
+from tablebase import Tablebase, Material, build_tablebase, INVALID, MAX_DISTANCE, RESULT_NAMES
+
+
+@pytest.fixture(scope='module')
+def tables(tmp_path_factory):
+    """Builds the rook against a bare general, and the bare generals it leads to, and opens them"""
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    entries = build_tablebase('KR-K', directory)
+    with Tablebase(directory) as tablebase:
+        yield directory, entries, tablebase
+
+
+def _fen(material, index):
+    """Returns the FEN of the position with the index in the material's numbering"""
+    side = index % 2
+    cells = [0] * 90
+    for slot in range(len(material.codes)):
+        point = index // material.strides[slot] % len(material.points[slot])
+        cells[material.points[slot][point]] = material.codes[slot]
+    rows = []
+    for row in range(9, -1, -1):
+        text = ''
+        empty = 0
+        for code in cells[row * 9:row * 9 + 9]:
+            if code == 0:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            letter = FEN_LETTERS[code & 7]
+            text += letter if code & BLACK else letter.upper()
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    return '/'.join(rows) + (' w' if side == 0 else ' b') + ' - - 0 1'
+
+
+def test_results_match_lookahead(tables):
+    """A position is lost if every move leads to a win for the opponent (or there is none), won if some move
+    leads to a loss for them, and drawn otherwise, with the distances one more than those of the best moves"""
+    directory, entries, tablebase = tables
+    material = Material('KR-K')
+    chooser = random.Random(18)
+    checked = 0
+    while checked < 200:
+        index = chooser.randrange(material.size)
+        if entries[index] >> 14 == INVALID:
+            continue
+        game = XiangqiGame(fen=_fen(material, index))
+        found = tablebase.probe(game)
+        after = []
+        for move in game.legal_moves():
+            game.push(move)
+            after.append(tablebase.probe(game))
+            game.pop()
+        if not after:
+            expected = ('LOSS', 0)
+        elif any(result == 'LOSS' for result, distance in after):
+            expected = ('WIN', min(distance for result, distance in after if result == 'LOSS') + 1)
+        elif all(result == 'WIN' for result, distance in after):
+            expected = ('LOSS', max(distance for result, distance in after) + 1)
+        else:
+            expected = ('DRAW', 0)
+        assert found == expected, game.to_fen()
+        checked += 1
+
+
+def test_build_open_probe(tables):
+    """A table built again is read back from its file unchanged, probes give the entries it was built with, and
+    material with more pieces than any table is turned away"""
+    directory, entries, tablebase = tables
+    assert build_tablebase('KR-K', directory) == entries
+    material = Material('KR-K')
+    for index in random.Random(1).sample(range(material.size), 300):
+        if entries[index] >> 14 == INVALID:
+            continue
+        game = XiangqiGame(fen=_fen(material, index))
+        assert tablebase.probe(game) == (RESULT_NAMES[entries[index] >> 14], entries[index] & MAX_DISTANCE)
+    assert tablebase.probe(XiangqiGame(fen='4k4/9/9/9/9/9/9/9/9/3K5 w - - 0 1')) == ('DRAW', 0)
+    assert tablebase.probe(XiangqiGame(fen=START_FEN)) is None
+
+
+def test_mate_in_one(tables):
+    """The winning move of a mate in one leaves the bare general mated, and the game over"""
+    directory, entries, tablebase = tables
+    game = XiangqiGame(fen='3k5/9/9/9/9/9/9/9/9/4K3R w - - 0 1')
+    assert tablebase.probe(game) == ('WIN', 1)
+    for move in game.legal_moves():
+        game.push(move)
+        mated = tablebase.probe(game) == ('LOSS', 0)
+        game.pop()
+        if mated:
+            break
+    assert mated
+    assert game.make_move(*move)
+    assert game.get_game_state() == 'RED_WON'
@@ -0,0 +1,69 @@
+# Description: Tests for the transposition table in transposition.py.
+
+import pytest
+
+from transposition import TranspositionTable, Entry, EXACT, LOWER, UPPER, BUCKET_ENTRIES, SCORE_OFFSET
+
+
+def _same_bucket(table, count):
+    """Returns count different hashes that all map to the first bucket of the table"""
+    buckets = len(table) // BUCKET_ENTRIES
+    return [(number + 1) * buckets for number in range(count)]
+
+
+def test_store_and_probe():
+    """What is stored comes back for the same hash only, with scores clamped to 16 bits"""
+    table = TranspositionTable(1)
+    table.store(12345, 7, -250, LOWER, (25, 22))
+    table.store(67890, 3, 10 ** 6, UPPER)
+    table.store(424242, 0, 0, EXACT, (1, 2))
+    assert table.probe(12345) == Entry(7, -250, LOWER, (25, 22))
+    assert table.probe(67890) == Entry(3, SCORE_OFFSET - 1, UPPER, None)
+    assert table.probe(424242) == Entry(0, 0, EXACT, (1, 2))
+    assert table.probe(54321) is None
+
+
+def test_keeps_best_move():
+    """A new result for a position without a best move keeps the move stored before"""
+    table = TranspositionTable(1)
+    table.store(99, 2, 5, EXACT, (10, 19))
+    table.store(99, 4, 8, UPPER)
+    assert table.probe(99) == Entry(4, 8, UPPER, (10, 19))
+
+
+def test_depth_preferred_replacement():
+    """A shallower result goes to the always-replace slot and leaves the deeper one alone, until a new search makes
+    the deep one stale"""
+    table = TranspositionTable(1)
+    deep, shallow, newer, later = _same_bucket(table, 4)
+    table.store(deep, 9, 1, EXACT)
+    table.store(shallow, 2, 2, EXACT)
+    assert table.probe(deep).depth == 9 and table.probe(shallow).depth == 2
+    table.store(newer, 1, 3, EXACT)
+    assert table.probe(deep).depth == 9 and table.probe(newer).depth == 1
+    assert table.probe(shallow) is None
+    table.new_search()
+    table.store(later, 1, 4, EXACT)
+    assert table.probe(deep) is None
+    assert table.probe(later) == Entry(1, 4, EXACT, None)
+
+
+def test_clear():
+    """Clearing leaves nothing to find"""
+    table = TranspositionTable(1)
+    for key in range(1, 500):
+        table.store(key * 7919, key % 20, key, EXACT, (1, 2))
+    assert table.hashfull() > 0
+    table.clear()
+    assert table.hashfull() == 0
+    assert all(table.probe(key * 7919) is None for key in range(1, 500))
+
+
+def test_shared_buffer():
+    """A table can live in a buffer it is given, and a buffer too small for one bucket is refused"""
+    buffer = bytearray(TranspositionTable.bytes_needed(0.01))
+    table = TranspositionTable(buffer=buffer)
+    table.store(31337, 5, 12, LOWER, (4, 13))
+    assert TranspositionTable(buffer=buffer).probe(31337) == Entry(5, 12, LOWER, (4, 13))
+    with pytest.raises(ValueError):
+        TranspositionTable(buffer=bytearray(31))
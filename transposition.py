@@ -0,0 +1,140 @@
+# Description: A fixed-size transposition table for searching XiangqiGame positions, keyed by XiangqiGame.get_hash().
+
+from array import array
+from collections import namedtuple
+
+# Bound types stored with a score. EXACT scores are exact, LOWER scores failed high (the real score is at least
+# this) and UPPER scores failed low (the real score is at most this)
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+ENTRY_BYTES = 16
+BUCKET_ENTRIES = 2
+SCORE_OFFSET = 1 << 15
+
+Entry = namedtuple('Entry', ['depth', 'score', 'bound', 'move'])
+
+
+def pack_move(move):
+    """Packs a (start, end) pair of integer squares into 16 bits, start in the high byte. None packs to 0, which is
+    never a real move because start and end always differ"""
+    if move is None:
+        return 0
+    return move[0] << 8 | move[1]
+
+
+def unpack_move(packed):
+    """Turns a move packed by pack_move back into a (start, end) pair, or None for 0"""
+    if packed == 0:
+        return None
+    return packed >> 8, packed & 0xFF
+
+
+class TranspositionTable:
+    """A transposition table held in one preallocated array of 64-bit words, so its memory never grows. Every entry
+    is two words: the position hash XORed with the data, and the data itself. The data packs the best move (16
+    bits), the score (16 bits), the depth (8 bits), the bound type (2 bits) and the search generation (6 bits).
+    Storing the hash XORed with the data means an entry torn by a concurrent writer simply fails to match.
+
+    Entries come in buckets of two. The first slot is depth-preferred: it is only replaced by a search at least as
+    deep, or once its entry is from an older search. The second slot is always replaced, so recent positions are
+    never lost."""
+
+    def __init__(self, size_mb=16, buffer=None):
+        """Initializes a table using about size_mb megabytes. The bucket count is rounded down to a power of two so
+        a hash maps to its bucket with a mask. If a buffer (for example shared memory) is given, the table lives
+        in it instead of a new array, and size_mb is ignored. Raises ValueError if the buffer cannot hold a single
+        bucket."""
+        if buffer is not None:
+            view = memoryview(buffer).cast('B')
+            if len(view) < ENTRY_BYTES * BUCKET_ENTRIES:
+                raise ValueError('buffer of %d bytes is smaller than one bucket of %d bytes'
+                                 % (len(view), ENTRY_BYTES * BUCKET_ENTRIES))
+            words = view[:len(view) - len(view) % 8].cast('Q')
+            buckets = len(words) // (2 * BUCKET_ENTRIES)
+        else:
+            buckets = max(1, int(size_mb * (1 << 20)) // (ENTRY_BYTES * BUCKET_ENTRIES))
+        self._buckets = 1 << (buckets.bit_length() - 1)
+        self._mask = self._buckets - 1
+        if buffer is not None:
+            self._words = words
+        else:
+            self._words = array('Q', bytes(self._buckets * BUCKET_ENTRIES * ENTRY_BYTES))
+        self._generation = 0
+
+    @staticmethod
+    def bytes_needed(size_mb):
+        """Returns the size of the buffer a table of size_mb megabytes uses"""
+        buckets = max(1, int(size_mb * (1 << 20)) // (ENTRY_BYTES * BUCKET_ENTRIES))
+        return (1 << (buckets.bit_length() - 1)) * BUCKET_ENTRIES * ENTRY_BYTES
+
+    def __len__(self):
+        """Returns the number of entries the table can hold"""
+        return self._buckets * BUCKET_ENTRIES
+
+    def new_search(self):
+        """Starts a new search generation. Entries from earlier searches become the first to be replaced"""
+        self._generation = (self._generation + 1) & 0x3F
+
+    def clear(self):
+        """Empties the table, zeroing its words in one copy rather than one at a time"""
+        view = memoryview(self._words).cast('B')
+        view[:] = bytes(len(view))
+        view.release()
+        self._generation = 0
+
+    def probe(self, key):
+        """Returns the Entry stored for the hash, or None"""
+        words = self._words
+        index = (key & self._mask) * (2 * BUCKET_ENTRIES)
+        for slot in range(index, index + 2 * BUCKET_ENTRIES, 2):
+            data = words[slot + 1]
+            if words[slot] ^ data == key and data != 0:
+                return Entry((data >> 32) & 0xFF, ((data >> 16) & 0xFFFF) - SCORE_OFFSET, (data >> 40) & 0x3,
+                             unpack_move(data & 0xFFFF))
+        return None
+
+    def store(self, key, depth, score, bound, move=None):
+        """Stores a search result for the hash. depth is the remaining depth searched, score is clamped to 16 bits
+        and move is the best (start, end) move found, if any. If the position already has an entry with a best move
+        and this result has none, the old move is kept"""
+        words = self._words
+        index = (key & self._mask) * (2 * BUCKET_ENTRIES)
+        packed_move = pack_move(move)
+        depth = max(0, min(depth, 0xFF))
+        score = max(-SCORE_OFFSET, min(score, SCORE_OFFSET - 1))
+
+        # Reuse the slot that already holds this position, keeping its best move if this result has none
+        slot = None
+        for candidate in range(index, index + 2 * BUCKET_ENTRIES, 2):
+            if words[candidate] ^ words[candidate + 1] == key:
+                slot = candidate
+                if packed_move == 0:
+                    packed_move = words[candidate + 1] & 0xFFFF
+                break
+
+        # Otherwise replace the depth-preferred slot if it is shallower or stale, or else the always-replace slot
+        if slot is None:
+            old = words[index + 1]
+            if old == 0 or depth >= (old >> 32) & 0xFF or (old >> 42) & 0x3F != self._generation:
+                slot = index
+            else:
+                slot = index + 2
+        elif slot == index and depth < (words[index + 1] >> 32) & 0xFF \
+                and (words[index + 1] >> 42) & 0x3F == self._generation:
+            slot = index + 2
+
+        data = packed_move | (score + SCORE_OFFSET) << 16 | depth << 32 | bound << 40 | self._generation << 42
+        words[slot] = key ^ data
+        words[slot + 1] = data
+
+    def hashfull(self):
+        """Returns how full the table is, in entries per thousand, from a sample of its first buckets"""
+        words = self._words
+        sample = min(len(self), 1000)
+        used = 0
+        for slot in range(0, sample * 2, 2):
+            if words[slot + 1] != 0 and (words[slot + 1] >> 42) & 0x3F == self._generation:
+                used += 1
+        return used * 1000 // sample